@@ -0,0 +1,91 @@
+# benchmark_pcap_parse.py
+# Packets/sec comparison of the scapy and native PCAP parsing paths
+#
+# Usage:
+#   python benchmark_pcap_parse.py <capture.pcap|pcapng> [--repeat N]
+#   python benchmark_pcap_parse.py --generate 50000
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pcap_analysis
+
+
+def _generate_capture(count: int, path: str) -> None:
+    """
+    Write a synthetic Ethernet/IPv4 capture with mixed TCP/UDP/ICMP traffic.
+    """
+    from scapy.all import Ether, IP, TCP, UDP, ICMP, Raw, PcapWriter
+
+    rng = random.Random(42)
+    writer = PcapWriter(path, sync=False)
+    for i in range(count):
+        ip = IP(src=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", dst=f"192.168.1.{rng.randint(1, 254)}")
+        roll = rng.random()
+        if roll < 0.6:
+            l4 = TCP(sport=rng.randint(1024, 65535), dport=rng.choice([22, 80, 443, 3389]))
+        elif roll < 0.9:
+            l4 = UDP(sport=rng.randint(1024, 65535), dport=rng.choice([53, 123, 161]))
+        else:
+            l4 = ICMP()
+        pkt = Ether() / ip / l4 / Raw(b"\x00" * rng.randint(0, 512))
+        pkt.time = 1_700_000_000 + i * 0.001
+        writer.write(pkt)
+    writer.close()
+
+
+def _time_parse(path: str, native: bool, repeat: int):
+    best = None
+    packets = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        packets = pcap_analysis.parse_pcap(path, native=native)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return packets, best
+
+
+def _strip_timestamps(packets):
+    return [{k: v for k, v in p.items() if k != "timestamp"} for p in packets]
+
+
+def run_benchmark(path: str, repeat: int = 3) -> None:
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"Capture: {path} ({size_mb:.1f} MB)")
+
+    scapy_packets, scapy_time = _time_parse(path, native=False, repeat=repeat)
+    native_packets, native_time = _time_parse(path, native=True, repeat=repeat)
+
+    for label, packets, elapsed in (
+        ("scapy ", scapy_packets, scapy_time),
+        ("native", native_packets, native_time),
+    ):
+        rate = len(packets) / elapsed if elapsed else float("inf")
+        print(f"  {label}: {len(packets):>9} packets in {elapsed:8.3f}s -> {rate:>12,.0f} packets/sec")
+
+    if native_time:
+        print(f"  speedup: {scapy_time / native_time:.1f}x")
+
+    identical = _strip_timestamps(scapy_packets) == _strip_timestamps(native_packets)
+    print(f"  identical output: {identical}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PCAP parsing paths")
+    parser.add_argument("capture", nargs="?", help="pcap / pcapng file to parse")
+    parser.add_argument("--generate", type=int, default=20000,
+                        help="synthetic packet count when no capture is given")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.capture:
+        run_benchmark(args.capture, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            capture_path = os.path.join(tmp, "synthetic.pcap")
+            print(f"Generating {args.generate} synthetic packets...")
+            _generate_capture(args.generate, capture_path)
+            run_benchmark(capture_path, args.repeat)
@@ -0,0 +1,396 @@
+# capture_store.py
+# Content-addressed capture storage with per-client quotas and LRU eviction for H-SAFE
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Optional
+
+import pcap_index
+
+
+# =========================
+# LIMITS
+# =========================
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Total bytes of stored captures (least recently used dropped first)
+MAX_STORE_BYTES = _env_int("HSAFE_CAPTURE_STORE_BYTES", 2 * 1024 * 1024 * 1024)
+
+# Bytes and number of captures one client may keep referenced
+CLIENT_QUOTA_BYTES = _env_int("HSAFE_CAPTURE_CLIENT_BYTES", 512 * 1024 * 1024)
+CLIENT_MAX_CAPTURES = _env_int("HSAFE_CAPTURE_CLIENT_MAX", 10)
+
+_CAPTURE_SUFFIX = ".pcap"
+_COPY_SIZE = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    capture_id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    client_id TEXT NOT NULL,
+    capture_id TEXT NOT NULL,
+    name TEXT,
+    added_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (client_id, capture_id)
+);
+CREATE INDEX IF NOT EXISTS refs_capture ON refs (capture_id);
+"""
+
+
+class CaptureNotFound(KeyError):
+    """
+    Raised for a capture id that is not (or no longer) stored for a client.
+    """
+
+
+class QuotaExceeded(ValueError):
+    """
+    Raised when a capture alone is larger than a client quota or the store.
+    """
+
+
+# =========================
+# UPLOAD WRITER
+# =========================
+
+class CaptureWriter:
+    """
+    Spools an upload into the store directory while hashing it; commit it
+    with CaptureStore.add(). Close (or use as a context manager) to drop
+    an uncommitted spool file.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, f"upload.{os.getpid()}.{threading.get_ident()}.{id(self):x}.part")
+        self.size = 0
+        self._sha = hashlib.sha256()
+        self._file = open(self.path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._sha.update(data)
+        self.size += len(data)
+
+    def copy_from(self, source: BinaryIO) -> None:
+        for block in iter(lambda: source.read(_COPY_SIZE), b""):
+            self.write(block)
+
+    @property
+    def digest(self) -> str:
+        return self._sha.hexdigest()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# =========================
+# CAPTURE STORE
+# =========================
+
+class CaptureStore:
+    """
+    Uploaded captures, one immutable file per distinct content (capture id
+    = SHA-256 of the bytes), referenced by the clients that uploaded them.
+
+    Uploading bytes that are already stored adds a reference instead of
+    rewriting the file, so captures being analyzed never change under a
+    reader. Each client keeps at most client_max_captures /
+    client_quota_bytes of references (its least recently used dropped
+    first); a capture without references is deleted. Beyond max_bytes the
+    least recently used captures of any client are deleted, except those
+    leased by a running analysis.
+
+    Metadata lives in SQLite next to the files: safe from threads and
+    several server processes (leases are per process).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = MAX_STORE_BYTES,
+        client_quota_bytes: int = CLIENT_QUOTA_BYTES,
+        client_max_captures: int = CLIENT_MAX_CAPTURES
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.client_quota_bytes = client_quota_bytes
+        self.client_max_captures = client_max_captures
+        self._leases: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stats = {"uploads": 0, "deduplicated": 0, "evicted": 0}
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(os.path.join(self.directory, "captures.sqlite3"), timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def path(self, capture_id: str) -> str:
+        return os.path.join(self.directory, capture_id + _CAPTURE_SUFFIX)
+
+    def writer(self) -> CaptureWriter:
+        return CaptureWriter(self.directory)
+
+    # -------------------------
+    # INGEST
+    # -------------------------
+
+    def add(self, writer: CaptureWriter, client_id: str, name: Optional[str] = None) -> Dict:
+        """
+        Commit a spooled upload for client_id. Returns the capture's
+        description, with deduplicated=True when the bytes were stored already.
+        """
+        writer._file.close()
+        if writer.size > min(self.client_quota_bytes, self.max_bytes):
+            raise QuotaExceeded(
+                f"Capture of {writer.size} bytes exceeds the storage quota of "
+                f"{min(self.client_quota_bytes, self.max_bytes)} bytes"
+            )
+
+        capture_id = writer.digest
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                # Taken before the file is placed, so no eviction can remove it in between
+                db.execute("BEGIN IMMEDIATE")
+                deduplicated = os.path.exists(self.path(capture_id))
+                if deduplicated:
+                    writer.close()
+                else:
+                    os.replace(writer.path, self.path(capture_id))
+                db.execute(
+                    "INSERT INTO captures VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (capture_id) DO UPDATE SET last_used = excluded.last_used",
+                    (capture_id, writer.size, now, now)
+                )
+                db.execute(
+                    "INSERT INTO refs VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (client_id, capture_id) DO UPDATE SET name = COALESCE(excluded.name, refs.name), last_used = excluded.last_used",
+                    (client_id, capture_id, name, now, now)
+                )
+            self._enforce_client_quota(db, client_id, keep=capture_id)
+            self._enforce_store_cap(db, keep=capture_id)
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["uploads"] += 1
+            self._stats["deduplicated"] += deduplicated
+        return {
+            "capture_id": capture_id,
+            "size": writer.size,
+            "name": name,
+            "deduplicated": deduplicated
+        }
+
+    def add_file(self, source: BinaryIO, client_id: str, name: Optional[str] = None) -> Dict:
+        with self.writer() as writer:
+            writer.copy_from(source)
+            return self.add(writer, client_id, name)
+
+    # -------------------------
+    # LOOKUP / LEASES
+    # -------------------------
+
+    def resolve(self, client_id: str, capture_id: Optional[str] = None) -> str:
+        """
+        Capture id of client_id's capture_id, or of its most recently used
+        capture. Marks it used; raises CaptureNotFound.
+        """
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                if capture_id is None:
+                    row = db.execute(
+                        "SELECT capture_id FROM refs WHERE client_id = ? ORDER BY last_used DESC LIMIT 1",
+                        (client_id,)
+                    ).fetchone()
+                else:
+                    row = db.execute(
+                        "SELECT capture_id FROM refs WHERE client_id = ? AND capture_id = ?",
+                        (client_id, capture_id)
+                    ).fetchone()
+                if row is None or not os.path.exists(self.path(row[0])):
+                    raise CaptureNotFound(capture_id)
+                db.execute(
+                    "UPDATE refs SET last_used = ? WHERE client_id = ? AND capture_id = ?", (now, client_id, row[0])
+                )
+                db.execute("UPDATE captures SET last_used = ? WHERE capture_id = ?", (now, row[0]))
+        finally:
+            db.close()
+        return row[0]
+
+    @contextmanager
+    def lease(self, capture_id: str):
+        """
+        Keep capture_id from being evicted for the duration of the block
+        (yields its path).
+        """
+        with self._lock:
+            self._leases[capture_id] += 1
+        try:
+            if not os.path.exists(self.path(capture_id)):
+                raise CaptureNotFound(capture_id)
+            yield self.path(capture_id)
+        finally:
+            with self._lock:
+                self._leases[capture_id] -= 1
+                if not self._leases[capture_id]:
+                    del self._leases[capture_id]
+
+    def list_captures(self, client_id: str) -> List[Dict]:
+        db = self._connect()
+        try:
+            rows = db.execute(
+                "SELECT r.capture_id, r.name, c.size, r.added_at, r.last_used FROM refs r"
+                " JOIN captures c ON c.capture_id = r.capture_id"
+                " WHERE r.client_id = ? ORDER BY r.last_used DESC",
+                (client_id,)
+            ).fetchall()
+        finally:
+            db.close()
+        return [
+            {"capture_id": capture_id, "name": name, "size": size, "added_at": added_at, "last_used": last_used}
+            for capture_id, name, size, added_at, last_used in rows
+        ]
+
+    # -------------------------
+    # REMOVAL / EVICTION
+    # -------------------------
+
+    def release(self, client_id: str, capture_id: Optional[str] = None) -> int:
+        """
+        Drop client_id's reference to capture_id (all of its references
+        if None). Returns the number of references dropped.
+        """
+        db = self._connect()
+        try:
+            with db:
+                if capture_id is None:
+                    captures = [row[0] for row in db.execute(
+                        "SELECT capture_id FROM refs WHERE client_id = ?", (client_id,)
+                    )]
+                else:
+                    captures = [capture_id]
+                dropped = 0
+                for capture in captures:
+                    dropped += db.execute(
+                        "DELETE FROM refs WHERE client_id = ? AND capture_id = ?", (client_id, capture)
+                    ).rowcount
+            self._collect(db, captures)
+        finally:
+            db.close()
+        return dropped
+
+    def _leased(self, capture_id: str) -> bool:
+        with self._lock:
+            return capture_id in self._leases
+
+    def _delete_capture(self, db: sqlite3.Connection, capture_id: str) -> None:
+        with db:
+            # Files go inside the transaction, so a concurrent add() of the same bytes waits for it
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM refs WHERE capture_id = ?", (capture_id,))
+            db.execute("DELETE FROM captures WHERE capture_id = ?", (capture_id,))
+            # Readers that already opened the file keep reading it
+            path = self.path(capture_id)
+            for file_path in (path, pcap_index.index_path_for(path)):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+    def _collect(self, db: sqlite3.Connection, captures: List[str]) -> None:
+        """
+        Delete the given captures that no client references any more.
+        """
+        for capture_id in captures:
+            referenced = db.execute("SELECT 1 FROM refs WHERE capture_id = ?", (capture_id,)).fetchone()
+            if referenced is None and not self._leased(capture_id):
+                self._delete_capture(db, capture_id)
+
+    def _enforce_client_quota(self, db: sqlite3.Connection, client_id: str, keep: str) -> None:
+        rows = db.execute(
+            "SELECT r.capture_id, c.size FROM refs r JOIN captures c ON c.capture_id = r.capture_id"
+            " WHERE r.client_id = ? ORDER BY r.last_used DESC",
+            (client_id,)
+        ).fetchall()
+        count, total = len(rows), sum(size for _, size in rows)
+        dropped = []
+        # Oldest first
+        for capture_id, size in reversed(rows):
+            if count <= self.client_max_captures and total <= self.client_quota_bytes:
+                break
+            if capture_id == keep:
+                continue
+            with db:
+                db.execute("DELETE FROM refs WHERE client_id = ? AND capture_id = ?", (client_id, capture_id))
+            dropped.append(capture_id)
+            count -= 1
+            total -= size
+        self._collect(db, dropped)
+
+    def _enforce_store_cap(self, db: sqlite3.Connection, keep: str) -> None:
+        # Captures left unreferenced while leased go first
+        self._collect(db, [row[0] for row in db.execute(
+            "SELECT capture_id FROM captures WHERE capture_id NOT IN (SELECT capture_id FROM refs)"
+        )])
+        rows = db.execute("SELECT capture_id, size FROM captures ORDER BY last_used").fetchall()
+        total = sum(size for _, size in rows)
+        for capture_id, size in rows:
+            if total <= self.max_bytes:
+                break
+            if capture_id == keep or self._leased(capture_id):
+                continue
+            self._delete_capture(db, capture_id)
+            total -= size
+            with self._lock:
+                self._stats["evicted"] += 1
+
+    def stats(self) -> Dict:
+        db = self._connect()
+        try:
+            captures, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM captures").fetchone()
+            clients = db.execute("SELECT COUNT(DISTINCT client_id) FROM refs").fetchone()[0]
+        finally:
+            db.close()
+        with self._lock:
+            return {
+                **self._stats,
+                "captures": captures,
+                "bytes": total,
+                "clients": clients,
+                "leased": len(self._leases),
+                "max_bytes": self.max_bytes,
+                "client_quota_bytes": self.client_quota_bytes,
+                "client_max_captures": self.client_max_captures
+            }
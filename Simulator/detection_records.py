@@ -0,0 +1,167 @@
+# detection_records.py
+# Compact detection storage for H-SAFE (rule / packet indices, Detection dicts on demand)
+
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from schema import Packet, Rule, Detection, new_detection
+
+
+# =========================
+# MATCHED FIELDS
+# =========================
+
+_MATCH_FIELDS = ("src_ip", "dst_ip", "src_port", "dst_port")
+_SIZE_FIELDS = ("min_payload_size", "max_payload_size")
+
+
+def _matched_template(rule: Rule) -> Tuple[Tuple[str, ...], Dict]:
+    """
+    (packet fields, size thresholds) a detection of rule reports as
+    matched_fields (see rule_implementation._packet_matches_rule).
+    """
+    conditions = rule["conditions"]
+    fields = tuple(field for field in _MATCH_FIELDS if conditions.get(field) is not None)
+    sizes = {field: conditions[field] for field in _SIZE_FIELDS if conditions.get(field) is not None}
+    return fields, sizes
+
+
+# =========================
+# DETECTION RECORDS
+# =========================
+
+# detection_id = uuid5 of (records timestamp, packet index, rule index) in this namespace
+_ID_NAMESPACE = uuid.UUID("9f3c1a52-6d0e-4b7a-8e21-5c4d2f7b9a10")
+
+class DetectionRecords:
+    """
+    Detections kept as parallel lists instead of Detection dicts:
+
+        packet_index[i]  timeline index of the detected packet
+        rule_index[i]    position of the matching rule in rules
+        packets[i]       the detected Packet (shared, not copied)
+
+    Detection dicts (with matched fields and an id) are only built when
+    the records are indexed, iterated or materialized, so they can stand
+    in for a List[Detection] wherever detections are only read. The id is
+    derived from the record, so every read of a detection has the same one.
+    """
+
+    __slots__ = ("rules", "packet_index", "rule_index", "packets", "timestamp")
+
+    def __init__(self, rules: Sequence[Rule] = (), timestamp: Optional[float] = None):
+        self.rules = rules
+        self.packet_index: List[int] = []
+        self.rule_index: List[int] = []
+        self.packets: List[Packet] = []
+        # Detection (analysis) time shared by every record, as Detection["timestamp"];
+        # capture time of record i is packets[i]["timestamp"]
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def from_pairs(
+        cls,
+        rules: Sequence[Rule],
+        packets: Sequence[Packet],
+        packet_index: List[int],
+        rule_index: List[int]
+    ) -> "DetectionRecords":
+        """
+        Records for (packet_index, rule_index) pairs into packets / rules.
+        """
+        records = cls(rules)
+        records.packet_index = list(packet_index)
+        records.rule_index = list(rule_index)
+        records.packets = [packets[i] for i in packet_index]
+        return records
+
+    def add(self, packet_index: int, packet: Packet, rule_index: int) -> None:
+        self.packet_index.append(packet_index)
+        self.packets.append(packet)
+        self.rule_index.append(rule_index)
+
+    def shift(self, offset: int) -> None:
+        """
+        Move packet indices by offset (chunk-local -> timeline indices).
+        """
+        if offset:
+            self.packet_index = [index + offset for index in self.packet_index]
+
+    def extend(self, other: "DetectionRecords", offset: int = 0) -> None:
+        """
+        Append other's records, shifting their packet indices by offset.
+        A different rule table is appended to this one.
+        """
+        base = 0
+        if other.rules is not self.rules and list(other.rules) != list(self.rules):
+            if self.rule_index:
+                base = len(self.rules)
+                self.rules = list(self.rules) + list(other.rules)
+            else:
+                self.rules = other.rules
+
+        self.packet_index.extend(
+            other.packet_index if not offset else [index + offset for index in other.packet_index]
+        )
+        self.rule_index.extend(
+            other.rule_index if not base else [index + base for index in other.rule_index]
+        )
+        self.packets.extend(other.packets)
+
+    def __len__(self) -> int:
+        return len(self.rule_index)
+
+    def _detection_id(self, packet_index: int, rule_index: int) -> str:
+        return str(uuid.uuid5(_ID_NAMESPACE, f"{self.timestamp!r}/{packet_index}/{rule_index}"))
+
+    def __getitem__(self, position: int) -> Detection:
+        rule = self.rules[self.rule_index[position]]
+        packet = self.packets[position]
+        fields, sizes = _matched_template(rule)
+        return new_detection(
+            rule=rule,
+            packet=packet,
+            matched_fields={**{field: packet[field] for field in fields}, **sizes},
+            timestamp=self.timestamp,
+            detection_id=self._detection_id(self.packet_index[position], self.rule_index[position])
+        )
+
+    def __iter__(self) -> Iterator[Detection]:
+        templates = [_matched_template(rule) for rule in self.rules]
+        rules = self.rules
+        for packet_index, rule_index, packet in zip(self.packet_index, self.rule_index, self.packets):
+            fields, sizes = templates[rule_index]
+            yield new_detection(
+                rule=rules[rule_index],
+                packet=packet,
+                matched_fields={**{field: packet[field] for field in fields}, **sizes},
+                timestamp=self.timestamp,
+                detection_id=self._detection_id(packet_index, rule_index)
+            )
+
+    def materialize(self) -> List[Detection]:
+        """
+        The records as the Detection dicts the rule engines used to return.
+        """
+        return list(self)
+
+    def to_dict(self) -> Dict:
+        """
+        JSON form: one rule table plus parallel index lists
+        (packets are referenced by timeline index, not repeated).
+        """
+        return {
+            "rules": [
+                {
+                    "rule_id": rule["rule_id"],
+                    "rule_name": rule["name"],
+                    "severity": rule["severity"],
+                    "action": rule["action"]
+                }
+                for rule in self.rules
+            ],
+            "packet_index": self.packet_index,
+            "rule_index": self.rule_index,
+            "timestamp": self.timestamp
+        }
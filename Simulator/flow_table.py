@@ -0,0 +1,197 @@
+# flow_table.py
+# Flow-level aggregation and per-flow verdict caching for H-SAFE
+
+import math
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from schema import Packet, Rule
+from detection_records import DetectionRecords
+
+
+# =========================
+# FLOW KEYS
+# =========================
+
+FLOW_FIELDS = ("src_ip", "dst_ip", "protocol", "src_port", "dst_port")
+
+# Cached (flow, size band) verdicts before the cache is reset
+_MAX_CACHED_VERDICTS = 65536
+
+# (detection records, verdicts, decisive_rule_indices) for a packet list
+Evaluator = Callable[[List[Packet]], Tuple[DetectionRecords, List[str], List[int]]]
+
+
+def flow_key(packet: Packet) -> Tuple:
+    return (
+        packet["src_ip"],
+        packet["dst_ip"],
+        packet["protocol"],
+        packet["src_port"],
+        packet["dst_port"]
+    )
+
+
+def size_band_edges(rules: List[Rule]) -> Optional[List[int]]:
+    """
+    Sorted payload sizes at which some rule's size condition flips.
+
+    Packets of one flow whose sizes fall between the same edges match exactly
+    the same rules. Returns None if a threshold cannot be reduced to an
+    integer edge; the exact payload size is then used as the band.
+    """
+    edges = set()
+    for rule in rules:
+        conditions = rule["conditions"]
+        try:
+            min_size = conditions.get("min_payload_size")
+            if min_size is not None:
+                # size >= min  <=>  size >= ceil(min)
+                edges.add(math.ceil(min_size))
+            max_size = conditions.get("max_payload_size")
+            if max_size is not None:
+                # size <= max  <=>  size < floor(max) + 1
+                edges.add(math.floor(max_size) + 1)
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return sorted(edges)
+
+
+# =========================
+# FLOW TABLE
+# =========================
+
+class FlowTable:
+    """
+    Evaluates packets once per distinct flow and accumulates flow statistics.
+
+    A flow is the (src_ip, dst_ip, protocol, src_port, dst_port) tuple. Rules
+    only look at those fields and the payload size, so every packet of a flow
+    in the same size band gets the same verdict and detections; the engine
+    runs on the first such packet and the result is fanned out to the rest.
+    """
+
+    def __init__(self, rules: List[Rule], evaluate: Evaluator):
+        self._evaluate = evaluate
+        self._edges = size_band_edges(rules)
+        # (flow, band) -> (verdict, decisive rule, indices of the detecting rules)
+        self._verdicts: Dict[Tuple, Tuple[str, int, Tuple[int, ...]]] = {}
+        # Rule table the evaluator's detection records refer to
+        self._detection_rules: List[Rule] = []
+        # flow -> [packets, bytes, first_seen, last_seen, ALLOW, DENY, ALERT]
+        self._stats: Dict[Tuple, List] = {}
+        self.evaluated = 0
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def _band(self, payload_size) -> int:
+        if self._edges is None:
+            return payload_size
+        if not self._edges:
+            return 0
+        return bisect_right(self._edges, payload_size)
+
+    def evaluate(self, packets: List[Packet]) -> Tuple[DetectionRecords, List[str], List[int]]:
+        """
+        Same contract as pcap_analysis.evaluate_packets(..., compact=True),
+        with one engine evaluation per new (flow, size band) in packets.
+        """
+        flows = [flow_key(packet) for packet in packets]
+        keys = [(flow, self._band(packet["payload_size"])) for flow, packet in zip(flows, packets)]
+
+        if len(self._verdicts) >= _MAX_CACHED_VERDICTS:
+            self._verdicts.clear()
+
+        # Representatives of (flow, band) pairs not cached yet
+        pending: Dict[Tuple, int] = {}
+        representatives: List[Packet] = []
+        for key, packet in zip(keys, packets):
+            if key not in self._verdicts and key not in pending:
+                pending[key] = len(representatives)
+                representatives.append(packet)
+
+        if representatives:
+            self._cache_results(pending, representatives)
+
+        detections = DetectionRecords(self._detection_rules)
+        verdicts: List[str] = []
+        decisive_rules: List[int] = []
+        stats = self._stats
+
+        for position, (flow, key, packet) in enumerate(zip(flows, keys, packets)):
+            verdict, decisive, rule_indices = self._verdicts[key]
+            verdicts.append(verdict)
+            decisive_rules.append(decisive)
+
+            for rule_index in rule_indices:
+                detections.add(position, packet, rule_index)
+
+            entry = stats.get(flow)
+            if entry is None:
+                entry = stats[flow] = [0, 0, packet["timestamp"], packet["timestamp"], 0, 0, 0]
+            entry[0] += 1
+            entry[1] += packet["payload_size"]
+            timestamp = packet["timestamp"]
+            if timestamp < entry[2]:
+                entry[2] = timestamp
+            elif timestamp > entry[3]:
+                entry[3] = timestamp
+            entry[4 + ("ALLOW", "DENY", "ALERT").index(verdict)] += 1
+
+        return detections, verdicts, decisive_rules
+
+    def _cache_results(self, pending: Dict[Tuple, int], representatives: List[Packet]) -> None:
+        found, verdicts, decisive_rules = self._evaluate(representatives)
+        self.evaluated += len(representatives)
+        self._detection_rules = found.rules
+
+        # Engines keep each packet's detections in rule order
+        by_packet: Dict[int, List[int]] = {}
+        for position, rule_index in zip(found.packet_index, found.rule_index):
+            by_packet.setdefault(position, []).append(rule_index)
+
+        for key, position in pending.items():
+            self._verdicts[key] = (
+                verdicts[position],
+                decisive_rules[position],
+                tuple(by_packet.get(position, ()))
+            )
+
+    def flows(self) -> List[Dict]:
+        """
+        Per-flow statistics in order of first appearance.
+        """
+        return [
+            {
+                **dict(zip(FLOW_FIELDS, flow)),
+                "packets": entry[0],
+                "bytes": entry[1],
+                "first_seen": entry[2],
+                "last_seen": entry[3],
+                "actions": {"ALLOW": entry[4], "DENY": entry[5], "ALERT": entry[6]}
+            }
+            for flow, entry in self._stats.items()
+        ]
+
+
+def merge_flows(parts: Iterable[List[Dict]]) -> List[Dict]:
+    """
+    Combine FlowTable.flows() lists of consecutive capture ranges,
+    keeping the order of first appearance.
+    """
+    merged: Dict[Tuple, Dict] = {}
+    for flows in parts:
+        for flow in flows:
+            key = tuple(flow[field] for field in FLOW_FIELDS)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {**flow, "actions": dict(flow["actions"])}
+                continue
+            entry["packets"] += flow["packets"]
+            entry["bytes"] += flow["bytes"]
+            entry["first_seen"] = min(entry["first_seen"], flow["first_seen"])
+            entry["last_seen"] = max(entry["last_seen"], flow["last_seen"])
+            for action, count in flow["actions"].items():
+                entry["actions"][action] += count
+    return list(merged.values())
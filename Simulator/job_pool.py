@@ -0,0 +1,417 @@
+# job_pool.py
+# Process pool with admission control for CPU-heavy H-SAFE API work
+
+import asyncio
+import json
+import os
+import site
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import result_encoding
+from detection_records import DetectionRecords
+from job_store import ProgressFile
+
+
+# =========================
+# CONFIGURATION
+# =========================
+
+_SIMULATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Worker processes (0 = run jobs on threads, e.g. where processes cannot be forked)
+DEFAULT_WORKERS = 0 if os.environ.get("VERCEL") else (os.cpu_count() or 1)
+MAX_WORKERS = _env_int("HSAFE_JOB_WORKERS", DEFAULT_WORKERS)
+
+# Admitted jobs that may wait for a free worker before requests are refused
+MAX_QUEUED = _env_int("HSAFE_JOB_QUEUE", 2 * max(MAX_WORKERS, 1))
+
+# Scheduling priority of worker processes, so the API process keeps answering
+WORKER_NICENESS = _env_int("HSAFE_JOB_NICENESS", 5)
+
+
+class PoolSaturated(RuntimeError):
+    """
+    Raised when every worker is busy and the wait queue is full.
+    """
+
+
+def _init_worker(simulator_dir: str, niceness: int) -> None:
+    site.addsitedir(simulator_dir)
+    if niceness and hasattr(os, "nice"):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+
+
+# =========================
+# JOB POOL
+# =========================
+
+class JobPool:
+    """
+    Runs blocking jobs off the event loop.
+
+    At most max_workers jobs run at once and at most max_queued more wait
+    for a worker; beyond that admit() raises PoolSaturated. A job that
+    starts its own worker processes (workers > 1) holds one slot per
+    process. The executor is created on first use and replaced if a worker
+    process dies.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_queued: int = MAX_QUEUED,
+        niceness: int = WORKER_NICENESS
+    ):
+        self.max_workers = max_workers
+        self.max_queued = max(max_queued, 0)
+        self.niceness = niceness
+        self._executor = None
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.max_workers, 1) + self.max_queued
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.max_workers > 0:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=_init_worker,
+                        initargs=(_SIMULATOR_DIR, self.niceness)
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hsafe-job")
+            return self._executor
+
+    def _reset(self, executor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def job_workers(self, workers: Optional[int]) -> int:
+        """
+        Worker processes a job asking for workers (None = one per CPU) may
+        start: at most the pool size, 1 in thread mode. Reserve as many slots.
+        """
+        if self.max_workers < 1:
+            return 1
+        return max(1, min(workers or os.cpu_count() or 1, self.max_workers))
+
+    def reserve(self, slots: int = 1) -> "JobSlot":
+        """
+        Take slots job slots at once (raises PoolSaturated); release them when done.
+        """
+        with self._lock:
+            if self._admitted + slots > self.capacity:
+                raise PoolSaturated(
+                    f"Analysis capacity exhausted ({self._admitted} jobs running or queued); retry later"
+                )
+            self._admitted += slots
+        return JobSlot(self, slots)
+
+    def _release(self, slots: int) -> None:
+        with self._lock:
+            self._admitted -= slots
+
+    @contextmanager
+    def admit(self, slots: int = 1):
+        """
+        Hold job slots for the duration of the block (yields the JobSlot).
+        """
+        slot = self.reserve(slots)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run fn(*args) on the pool and await its result (no admission check;
+        call inside admit()).
+        """
+        executor = self._get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Admit and run one job.
+        """
+        with self.admit():
+            return await self.submit(fn, *args)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            admitted = self._admitted
+        workers = max(self.max_workers, 1)
+        return {
+            "mode": "process" if self.max_workers > 0 else "thread",
+            "workers": workers,
+            "running": min(admitted, workers),
+            "queued": max(admitted - workers, 0),
+            "max_queued": self.max_queued
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JobSlot:
+    """
+    One admitted job (holding slots pool slots). release() is idempotent;
+    detach() hands the slot to a new owner (e.g. a background task) so this
+    one no longer releases it.
+    """
+
+    def __init__(self, pool: JobPool, slots: int = 1):
+        self._pool = pool
+        self._slots = slots
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._pool._release(self._slots)
+
+    def detach(self) -> "JobSlot":
+        if not self._held:
+            raise RuntimeError("Job slot already released")
+        self._held = False
+        return JobSlot(self._pool, self._slots)
+
+
+# =========================
+# JOBS
+# =========================
+# Module-level functions so they can be pickled to worker processes.
+# Results are encoded in the worker: only response bytes cross back.
+# progress_path (background jobs) names the job_store progress file to report to.
+# Analysis modules (scapy, numpy) are imported by the jobs, in the worker,
+# so the API process that imports job_pool stays light.
+
+class JobInputError(ValueError):
+    """
+    Raised by a job whose input cannot be analyzed (a client error).
+    """
+
+
+def encode_json(content: Any) -> bytes:
+    # Same encoding as fastapi.responses.JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_analysis_response(report: Dict, simulation_result: Dict, response_format: str) -> Tuple[bytes, str]:
+    """
+    /analyze response body: {"report", "simulation"} as JSON, or encoded
+    in a result_encoding format. Returns (body, media_type).
+    """
+    if response_format != "json":
+        return result_encoding.encode_analysis(report, simulation_result, response_format)
+    if isinstance(simulation_result["detections"], DetectionRecords):
+        simulation_result["detections"] = simulation_result["detections"].to_dict()
+    return encode_json({"report": report, "simulation": simulation_result}), result_encoding.MEDIA_TYPES["json"]
+
+
+def _progress(progress_path: Optional[str]) -> Optional["pcap_analysis.AnalysisProgress"]:
+    """
+    AnalysisProgress mirrored to a progress file (None without a path).
+    """
+    if progress_path is None:
+        return None
+    import pcap_analysis
+
+    writer = ProgressFile(progress_path)
+    return pcap_analysis.AnalysisProgress(lambda progress: writer.write(progress.to_dict()))
+
+
+def _set_stage(progress: Optional["pcap_analysis.AnalysisProgress"], stage: str) -> None:
+    if progress is not None:
+        progress.update(stage=stage)
+
+
+def _report(
+    simulation_result: Dict,
+    bucket_seconds: float,
+    aggregation: str,
+    response_format: str,
+    progress: Optional["pcap_analysis.AnalysisProgress"] = None,
+    store: Optional[Dict] = None,
+    compact_detections: bool = True
+) -> Tuple[bytes, str]:
+    import post_attack_analysis
+    import result_store
+
+    _set_stage(progress, "reporting")
+    final_report = post_attack_analysis.analyze_firewall_run(simulation_result, bucket_seconds, aggregation)
+
+    if store is not None:
+        _set_stage(progress, "storing")
+        result_store.ResultStore(store["path"]).save(
+            store["client_id"], store["result_id"], simulation_result, final_report, store.get("source")
+        )
+        if not compact_detections:
+            simulation_result["detections"] = simulation_result["detections"].materialize()
+        if not store.get("include_timeline", True):
+            simulation_result = {
+                key: value for key, value in simulation_result.items()
+                if key not in ("timeline", "detections")
+            }
+            simulation_result.update(timeline=[], detections=[])
+
+    _set_stage(progress, "encoding")
+    return encode_analysis_response(final_report, simulation_result, response_format)
+
+
+def report_job(
+    simulation_result: Dict,
+    bucket_seconds: float,
+    aggregation: str,
+    response_format: str
+) -> Tuple[bytes, str]:
+    """
+    Post-attack report over a finished simulation, encoded.
+    """
+    return _report(simulation_result, bucket_seconds, aggregation, response_format)
+
+
+def finish_stream_job(
+    flow: "pcap_analysis.IncrementalPcapFlow",
+    bucket_seconds: float,
+    aggregation: str,
+    response_format: str
+) -> Tuple[bytes, str]:
+    """
+    Finish a fully fed IncrementalPcapFlow (last chunk, flow stats) plus
+    report, encoded.
+    """
+    return _report(flow.finish(), bucket_seconds, aggregation, response_format)
+
+
+def analyze_pcap_job(
+    pcap_path: str,
+    rules: List[Dict],
+    options: Dict,
+    bucket_seconds: float,
+    aggregation: str,
+    response_format: str,
+    store: Optional[Dict] = None,
+    progress_path: Optional[str] = None
+) -> Tuple[bytes, str]:
+    """
+    simulate_pcap_flow(pcap_path, rules, **options) plus report, encoded.
+    Stages: simulating (bytes_parsed / packets_evaluated), reporting,
+    storing, encoding.
+
+    store ({"path", "client_id", "result_id", "source", "include_timeline"}) also saves
+    the result to that result_store database; include_timeline=False then
+    leaves timeline and detections out of the response.
+    """
+    import pcap_analysis
+
+    progress = _progress(progress_path)
+    compact_detections = options.get("compact_detections", False)
+    if store is not None:
+        # The store ingests the compact form; materialized afterwards if asked
+        options = {**options, "compact_detections": True}
+    simulation_result = pcap_analysis.simulate_pcap_flow(pcap_path, rules, progress=progress, **options)
+    return _report(
+        simulation_result, bucket_seconds, aggregation, response_format, progress, store, compact_detections
+    )
+
+
+def analyze_batch_job(
+    inputs: List[Tuple[str, str]],
+    rules: List[Dict],
+    work_dir: str,
+    workers: Optional[int],
+    engine: str,
+    bucket_seconds: float,
+    aggregation: str,
+    compact_detections: bool = False
+) -> Tuple[bytes, str]:
+    """
+    simulate_pcap_batch plus combined report, encoded as JSON.
+    """
+    import pcap_batch
+    import post_attack_analysis
+
+    batch_result = pcap_batch.simulate_pcap_batch(
+        inputs, rules, work_dir, workers=workers, engine=engine, compact_detections=compact_detections
+    )
+    simulation_result = batch_result["combined"]
+    if not any("summary" in f for f in batch_result["files"]):
+        raise JobInputError("No analyzable pcap / pcapng capture in the upload.")
+
+    final_report = post_attack_analysis.analyze_firewall_run(simulation_result, bucket_seconds, aggregation)
+    if isinstance(simulation_result["detections"], DetectionRecords):
+        simulation_result["detections"] = simulation_result["detections"].to_dict()
+    body = encode_json({
+        "report": final_report,
+        "files": batch_result["files"],
+        "simulation": simulation_result
+    })
+    return body, result_encoding.MEDIA_TYPES["json"]
+
+
+def topology_job(topology: Dict, attacker_node: str, target_node: str, protocol: str,
+                 dst_port: int, packet_count: int, rules: List[Dict],
+                 progress_path: Optional[str] = None) -> Dict:
+    import topology_simulation
+
+    _set_stage(_progress(progress_path), "simulating")
+
+    return topology_simulation.simulate_attack(
+        topology=topology,
+        attacker_node=attacker_node,
+        target_node=target_node,
+        protocol=protocol,
+        dst_port=dst_port,
+        packet_count=packet_count,
+        rules=rules
+    )
+
+
+def export_report_job(report: Dict, output_path: str, export_format: str, timeline: List[Dict],
+                      progress_path: Optional[str] = None) -> str:
+    """
+    Write report to output_path; returns the file's media type.
+    """
+    import report_generator
+
+    _set_stage(_progress(progress_path), "rendering")
+
+    if export_format == "pdf":
+        report_generator.export_pdf(report, output_path, timeline)
+        return "application/pdf"
+    if export_format == "csv":
+        report_generator.export_csv(report, output_path)
+        return "text/csv"
+    if export_format == "json":
+        report_generator.export_json(report, output_path)
+        return "application/json"
+    raise JobInputError("Unsupported format. Use pdf, csv, or json.")
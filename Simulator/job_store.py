@@ -0,0 +1,258 @@
+# job_store.py
+# Background job records, progress files and TTL-bounded result storage for H-SAFE
+
+import glob
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# =========================
+# CONFIGURATION
+# =========================
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Seconds a finished job (and its result) is kept after completion
+JOB_TTL = _env_number("HSAFE_JOB_TTL", 900)
+
+# Finished jobs kept at most, and total bytes of their stored results
+MAX_JOBS = int(_env_number("HSAFE_JOB_STORE_MAX", 100))
+MAX_RESULT_BYTES = int(_env_number("HSAFE_JOB_STORE_BYTES", 256 * 1024 * 1024))
+
+# Minimum seconds between progress file writes of one job
+PROGRESS_INTERVAL = 0.25
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+
+# =========================
+# PROGRESS FILES
+# =========================
+# Workers may be other processes: progress is exchanged through a small
+# JSON file per job, replaced atomically and read when the job is polled.
+
+class ProgressFile:
+    """
+    Writer side (in the worker). Within a stage, write() updates the file
+    at most once per PROGRESS_INTERVAL; stage changes are always written.
+    A path of None makes it a no-op.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._written_at = 0.0
+        self._stage = None
+
+    def write(self, progress: Dict) -> None:
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if progress.get("stage") == self._stage and now - self._written_at < PROGRESS_INTERVAL:
+            return
+        self._written_at = now
+        self._stage = progress.get("stage")
+
+        partial = self.path + ".part"
+        with open(partial, "w") as f:
+            json.dump(progress, f)
+        os.replace(partial, self.path)
+
+
+def read_progress(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# =========================
+# JOB RECORDS
+# =========================
+
+class Job:
+    """
+    One background job. result is (body, media_type), or for file results
+    (path, media_type) with filename set.
+    """
+
+    def __init__(self, kind: str, directory: str, ttl: float = JOB_TTL):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.ttl = ttl
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.result: Optional[Tuple[Any, str]] = None
+        self.filename: Optional[str] = None
+        self.result_bytes = 0
+        self.progress: Dict = {"stage": "queued"}
+        self.directory = directory
+        self.task = None
+
+    def path(self, suffix: str) -> str:
+        """
+        Scratch file owned by this job (removed with it).
+        """
+        return os.path.join(self.directory, f"{self.job_id}.{suffix}")
+
+    @property
+    def progress_path(self) -> str:
+        return self.path("progress.json")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def refresh(self) -> None:
+        """
+        Pick up the worker's latest progress.
+        """
+        if self.finished:
+            return
+        progress = read_progress(self.progress_path)
+        if progress is not None:
+            self.progress = progress
+            self.status = "running"
+
+    def finish(self, result: Optional[Tuple[Any, str]] = None, filename: Optional[str] = None) -> None:
+        self.refresh()
+        self.status = "done"
+        self.finished_at = time.time()
+        self.result = result
+        self.filename = filename
+        if result is not None:
+            body = result[0]
+            self.result_bytes = os.path.getsize(body) if filename is not None else len(body)
+        self.progress["stage"] = "done"
+        self._remove_scratch(keep_result=True)
+
+    def fail(self, status_code: int, detail: str) -> None:
+        self.refresh()
+        self.status = "failed"
+        self.finished_at = time.time()
+        self.error_status = status_code
+        self.error = detail
+        self.progress["stage"] = "failed"
+        self._remove_scratch()
+
+    def _remove_scratch(self, keep_result: bool = False) -> None:
+        keep = self.result[0] if keep_result and self.filename is not None else None
+        for path in glob.glob(os.path.join(self.directory, f"{self.job_id}.*")):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def discard(self) -> None:
+        """
+        Drop the stored result and every file of the job.
+        """
+        self.result = None
+        self._remove_scratch()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + self.ttl if self.finished_at is not None else None,
+            "error": self.error
+        }
+
+
+# =========================
+# JOB STORE
+# =========================
+
+class JobStore:
+    """
+    Jobs by id. Finished jobs expire ttl seconds after completion; beyond
+    max_jobs finished jobs or max_result_bytes of results, the oldest
+    finished ones are evicted first. Unfinished jobs are never evicted
+    (their number is bounded by the job pool's admission control).
+
+    Not thread-safe: use from the event loop only.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = JOB_TTL,
+        max_jobs: int = MAX_JOBS,
+        max_result_bytes: int = MAX_RESULT_BYTES
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_result_bytes = max_result_bytes
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._stats = {"created": 0, "expired": 0, "evicted": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, kind: str) -> Job:
+        self.evict()
+        job = Job(kind, self.directory, self.ttl)
+        self._jobs[job.job_id] = job
+        self._stats["created"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.evict()
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.refresh()
+        return job
+
+    def _finished(self) -> List[Job]:
+        # Oldest completion first
+        return sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+
+    def _drop(self, job: Job, reason: str) -> None:
+        job.discard()
+        del self._jobs[job.job_id]
+        self._stats[reason] += 1
+
+    def evict(self) -> None:
+        now = time.time()
+        finished = self._finished()
+        for job in finished:
+            if now - job.finished_at >= self.ttl:
+                self._drop(job, "expired")
+        finished = [job for job in finished if job.job_id in self._jobs]
+
+        stored = sum(job.result_bytes for job in finished)
+        # The newest result is kept even if it alone exceeds max_result_bytes
+        while len(finished) > self.max_jobs or (len(finished) > 1 and stored > self.max_result_bytes):
+            job = finished.pop(0)
+            stored -= job.result_bytes
+            self._drop(job, "evicted")
+
+    def stats(self) -> Dict:
+        self.evict()
+        counts = {state: 0 for state in JOB_STATES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            **counts,
+            **self._stats,
+            "result_bytes": sum(job.result_bytes for job in self._jobs.values()),
+            "ttl_seconds": self.ttl,
+            "max_jobs": self.max_jobs,
+            "max_result_bytes": self.max_result_bytes
+        }
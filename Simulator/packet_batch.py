@@ -0,0 +1,247 @@
+# packet_batch.py
+# Columnar packet representation for H-SAFE (NumPy structured arrays)
+
+import socket
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from schema import Packet
+
+
+# =========================
+# COLUMN LAYOUT
+# =========================
+
+PACKET_DTYPE = np.dtype([
+    ("src_ip", np.uint32),          # IPv4, host-order integer
+    ("dst_ip", np.uint32),
+    ("src_port", np.uint16),
+    ("dst_port", np.uint16),
+    ("has_src_port", np.bool_),     # False where the Packet port is None
+    ("has_dst_port", np.bool_),
+    ("protocol", np.uint8),         # PROTOCOL_CODES
+    ("payload_size", np.uint32),
+    ("timestamp", np.float64),
+])
+
+PROTOCOL_CODES: Dict[str, int] = {"ICMP": 1, "TCP": 6, "UDP": 17}
+PROTOCOL_NAMES: Dict[int, str] = {code: name for name, code in PROTOCOL_CODES.items()}
+
+DEFAULT_BATCH_SIZE = 65536
+
+_U32 = struct.Struct("!I")
+
+
+# =========================
+# SCALAR CONVERSION
+# =========================
+
+def ip_to_int(ip: str) -> int:
+    """
+    Dotted-quad IPv4 string to integer. Raises ValueError for anything else.
+    """
+    try:
+        if ip.count(".") == 3:
+            return _U32.unpack(socket.inet_aton(ip))[0]
+    except (OSError, AttributeError):
+        pass
+    raise ValueError(f"Not an IPv4 address: {ip!r}")
+
+
+def int_to_ip(value: int) -> str:
+    return socket.inet_ntoa(_U32.pack(int(value)))
+
+
+def ips_to_strings(values: np.ndarray) -> List[str]:
+    """
+    Convert an integer IP column to strings, formatting each distinct value once.
+    """
+    unique, inverse = np.unique(values, return_inverse=True)
+    names = np.array([int_to_ip(v) for v in unique], dtype=object)
+    return names[inverse].tolist()
+
+
+# =========================
+# PACKET BATCH
+# =========================
+
+class PacketBatch:
+    """
+    A fixed set of packets stored column-wise in one structured array.
+
+    Columns are exposed as NumPy views (batch.src_ip, batch.dst_port, ...),
+    so filters and rule checks can run as vector operations.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Optional[np.ndarray] = None):
+        if data is None:
+            data = np.empty(0, dtype=PACKET_DTYPE)
+        if data.dtype != PACKET_DTYPE:
+            raise ValueError("PacketBatch requires PACKET_DTYPE records")
+        self.data = data
+
+    # ---------------------
+    # Construction
+    # ---------------------
+
+    @classmethod
+    def empty(cls, size: int = 0) -> "PacketBatch":
+        return cls(np.zeros(size, dtype=PACKET_DTYPE))
+
+    @classmethod
+    def from_packets(cls, packets: Iterable[Packet]) -> "PacketBatch":
+        """
+        Build a batch from schema.Packet dicts.
+        Raises ValueError for non-IPv4 addresses or unknown protocols.
+        """
+        packets = packets if isinstance(packets, list) else list(packets)
+        data = np.empty(len(packets), dtype=PACKET_DTYPE)
+        ip_cache: Dict[str, int] = {}
+
+        def encode_ip(ip: str) -> int:
+            value = ip_cache.get(ip)
+            if value is None:
+                value = ip_cache[ip] = ip_to_int(ip)
+            return value
+
+        rows = []
+        for packet in packets:
+            protocol = PROTOCOL_CODES.get(packet["protocol"])
+            if protocol is None:
+                raise ValueError(f"Unsupported protocol: {packet['protocol']!r}")
+            src_port = packet["src_port"]
+            dst_port = packet["dst_port"]
+            rows.append((
+                encode_ip(packet["src_ip"]),
+                encode_ip(packet["dst_ip"]),
+                src_port or 0,
+                dst_port or 0,
+                src_port is not None,
+                dst_port is not None,
+                protocol,
+                packet["payload_size"],
+                packet["timestamp"],
+            ))
+
+        if rows:
+            data[:] = rows
+        return cls(data)
+
+    @classmethod
+    def concatenate(cls, batches: Iterable["PacketBatch"]) -> "PacketBatch":
+        arrays = [batch.data for batch in batches]
+        if not arrays:
+            return cls.empty()
+        return cls(np.concatenate(arrays))
+
+    # ---------------------
+    # Conversion
+    # ---------------------
+
+    def to_packets(self) -> List[Packet]:
+        """
+        Materialize the batch as schema.Packet dicts.
+        """
+        data = self.data
+        src_ips = ips_to_strings(data["src_ip"])
+        dst_ips = ips_to_strings(data["dst_ip"])
+        protocols = [PROTOCOL_NAMES[code] for code in data["protocol"].tolist()]
+        src_ports = data["src_port"].tolist()
+        dst_ports = data["dst_port"].tolist()
+        has_src = data["has_src_port"].tolist()
+        has_dst = data["has_dst_port"].tolist()
+        sizes = data["payload_size"].tolist()
+        timestamps = data["timestamp"].tolist()
+
+        return [
+            Packet(
+                src_ip=src_ips[i],
+                dst_ip=dst_ips[i],
+                protocol=protocols[i],
+                src_port=src_ports[i] if has_src[i] else None,
+                dst_port=dst_ports[i] if has_dst[i] else None,
+                payload_size=sizes[i],
+                timestamp=timestamps[i]
+            )
+            for i in range(len(data))
+        ]
+
+    # ---------------------
+    # Column access
+    # ---------------------
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key) -> "PacketBatch":
+        """
+        Slice, index array or boolean mask -> new PacketBatch.
+        """
+        if isinstance(key, (int, np.integer)):
+            key = [key]
+        return PacketBatch(self.data[key])
+
+    @property
+    def src_ip(self) -> np.ndarray:
+        return self.data["src_ip"]
+
+    @property
+    def dst_ip(self) -> np.ndarray:
+        return self.data["dst_ip"]
+
+    @property
+    def src_port(self) -> np.ndarray:
+        return self.data["src_port"]
+
+    @property
+    def dst_port(self) -> np.ndarray:
+        return self.data["dst_port"]
+
+    @property
+    def has_src_port(self) -> np.ndarray:
+        return self.data["has_src_port"]
+
+    @property
+    def has_dst_port(self) -> np.ndarray:
+        return self.data["has_dst_port"]
+
+    @property
+    def protocol(self) -> np.ndarray:
+        return self.data["protocol"]
+
+    @property
+    def payload_size(self) -> np.ndarray:
+        return self.data["payload_size"]
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self.data["timestamp"]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+
+def iter_batches(
+    packets: Iterable[Packet],
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[PacketBatch]:
+    """
+    Convert a packet stream into PacketBatch chunks of at most batch_size.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+
+    chunk: List[Packet] = []
+    for packet in packets:
+        chunk.append(packet)
+        if len(chunk) >= batch_size:
+            yield PacketBatch.from_packets(chunk)
+            chunk = []
+
+    if chunk:
+        yield PacketBatch.from_packets(chunk)
@@ -0,0 +1,385 @@
+# packet_filter.py
+# BPF-style capture filter expressions for H-SAFE (compiled once, applied at header decode)
+
+import ipaddress
+import re
+import socket
+import struct
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+
+
+# =========================
+# ERRORS / TOKENS
+# =========================
+
+class FilterSyntaxError(ValueError):
+    """
+    Raised for a filter expression that cannot be compiled.
+    """
+
+
+_TOKEN = re.compile(r"\(|\)|&&|\|\||!|[^\s()!&|]+")
+
+_PROTOCOLS = {"tcp": "TCP", "udp": "UDP", "icmp": "ICMP", "ip": None}
+_DIRECTIONS = ("src", "dst")
+_TYPES = ("host", "net", "port", "portrange")
+
+_AND = ("and", "&&")
+_OR = ("or", "||")
+_NOT = ("not", "!")
+
+# Filters compiled per process (expression -> PacketFilter)
+FILTER_CACHE_SIZE = 128
+
+# Longest expression and deepest nesting of ( ) / not accepted, so the
+# recursive-descent parser and Python's compiler stay within their limits
+MAX_FILTER_LENGTH = 4096
+MAX_FILTER_DEPTH = 32
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens = _TOKEN.findall(expression)
+    if "".join(tokens) != re.sub(r"\s+", "", expression):
+        raise FilterSyntaxError(f"Invalid characters in filter: {expression!r}")
+    return tokens
+
+
+_U32 = struct.Struct("!I")
+
+
+@lru_cache(maxsize=65536)
+def _ip_value(ip: str) -> int:
+    return _U32.unpack(socket.inet_aton(ip))[0]
+
+
+# =========================
+# PRIMITIVES -> PYTHON SOURCE
+# =========================
+#
+# The compiled predicate takes the decoded header fields:
+#   s, d   source / destination IP (dotted quad)
+#   p      protocol ("TCP" / "UDP" / "ICMP")
+#   sp, dp source / destination port (None for ICMP)
+#   n      captured frame length (Packet payload_size)
+#
+# With columns=True the same expression compiles to NumPy operations over
+# packet_batch.PacketBatch columns (integer IPs and protocol codes, ports
+# with their has_src_port / has_dst_port flags hs / hd), giving a row mask.
+
+_PROTOCOL_CODES = {"TCP": 6, "UDP": 17, "ICMP": 1}  # packet_batch.PROTOCOL_CODES
+
+
+def _any(parts: List[str], columns: bool) -> str:
+    return "(" + (" | " if columns else " or ").join(parts) + ")"
+
+
+def _host_code(value: str, direction: Optional[str], columns: bool = False) -> str:
+    try:
+        ip = ipaddress.IPv4Address(value)
+    except ValueError:
+        raise FilterSyntaxError(f"Invalid host address: {value!r}")
+    literal = repr(int(ip)) if columns else repr(str(ip))
+    fields = {"src": ("s",), "dst": ("d",), None: ("s", "d")}[direction]
+    return _any([f"({field} == {literal})" for field in fields], columns)
+
+
+def _net_code(value: str, direction: Optional[str], columns: bool = False) -> str:
+    try:
+        network = ipaddress.IPv4Network(value, strict=False)
+    except ValueError:
+        raise FilterSyntaxError(f"Invalid network: {value!r}")
+    net = int(network.network_address)
+    mask = int(network.netmask)
+    fields = {"src": ("s",), "dst": ("d",), None: ("s", "d")}[direction]
+    if columns:
+        return _any([f"(({field} & {mask}) == {net})" for field in fields], columns)
+    return _any([f"_ip({field}) & {mask} == {net}" for field in fields], columns)
+
+
+def _port_value(value: str) -> int:
+    if value.isdigit():
+        port = int(value)
+    else:
+        try:
+            port = socket.getservbyname(value)
+        except OSError:
+            raise FilterSyntaxError(f"Unknown port: {value!r}")
+    if not 0 <= port <= 0xFFFF:
+        raise FilterSyntaxError(f"Port out of range: {value!r}")
+    return port
+
+
+# Port column -> its has_*_port flag column
+_PORT_FLAGS = {"sp": "hs", "dp": "hd"}
+
+
+def _port_code(value: str, direction: Optional[str], columns: bool = False) -> str:
+    port = _port_value(value)
+    fields = {"src": ("sp",), "dst": ("dp",), None: ("sp", "dp")}[direction]
+    if columns:
+        return _any([f"({_PORT_FLAGS[field]} & ({field} == {port}))" for field in fields], columns)
+    return _any([f"{field} == {port}" for field in fields], columns)
+
+
+def _portrange_code(value: str, direction: Optional[str], columns: bool = False) -> str:
+    low, sep, high = value.partition("-")
+    if not sep:
+        raise FilterSyntaxError(f"Invalid port range: {value!r}")
+    low, high = _port_value(low), _port_value(high)
+    fields = {"src": ("sp",), "dst": ("dp",), None: ("sp", "dp")}[direction]
+    if columns:
+        return _any([
+            f"({_PORT_FLAGS[field]} & ({field} >= {low}) & ({field} <= {high}))" for field in fields
+        ], columns)
+    return _any([f"({field} is not None and {low} <= {field} <= {high})" for field in fields], columns)
+
+
+_TYPE_CODE = {
+    "host": _host_code,
+    "net": _net_code,
+    "port": _port_code,
+    "portrange": _portrange_code,
+}
+
+
+def _implicit_type(value: str) -> str:
+    """
+    Type of a value given without host / net / port ("src 10.0.0.1").
+    """
+    if "/" in value:
+        return "net"
+    if value.count(".") == 3:
+        return "host"
+    raise FilterSyntaxError(f"Expected host, net or port before {value!r}")
+
+
+def _true_column(n):
+    """
+    All-True mask as long as column n (the "ip" primitive in column form).
+    """
+    return n == n
+
+
+# =========================
+# PARSER
+# =========================
+
+class _Parser:
+    """
+    Recursive-descent parser for the pcap-filter subset:
+
+        expr      := and_expr (("or" | "||") and_expr)*
+        and_expr  := not_expr (("and" | "&&") not_expr)*
+        not_expr  := ("not" | "!") not_expr | "(" expr ")" | primitive
+        primitive := [tcp|udp|icmp|ip] [src|dst] [host|net|port|portrange] value
+                   | less N | greater N
+
+    A bare value after and / or reuses the previous qualifiers
+    ("port 80 or 443"). columns=True emits the NumPy column form.
+    """
+
+    def __init__(self, tokens: List[str], columns: bool = False):
+        self.tokens = tokens
+        self.columns = columns
+        self.pos = 0
+        self.depth = 0
+        self.last_qualifiers: Optional[Tuple[Optional[str], Optional[str], Optional[str]]] = None
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos].lower() if self.pos < len(self.tokens) else None
+
+    def take(self) -> str:
+        if self.pos >= len(self.tokens):
+            raise FilterSyntaxError("Unexpected end of filter")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> str:
+        code = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise FilterSyntaxError(f"Unexpected token: {self.tokens[self.pos]!r}")
+        return code
+
+    def parse_or(self) -> str:
+        parts = [self.parse_and()]
+        while self.peek() in _OR:
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else _any(parts, self.columns)
+
+    def parse_and(self) -> str:
+        parts = [self.parse_not()]
+        while self.peek() in _AND:
+            self.take()
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else "(" + (" & " if self.columns else " and ").join(parts) + ")"
+
+    def parse_not(self) -> str:
+        token = self.peek()
+        if token not in _NOT and token != "(":
+            return self.parse_primitive()
+
+        self.depth += 1
+        if self.depth > MAX_FILTER_DEPTH:
+            raise FilterSyntaxError(f"Filter nested deeper than {MAX_FILTER_DEPTH} levels")
+        self.take()
+        if token in _NOT:
+            code = f"(~{self.parse_not()})" if self.columns else f"(not {self.parse_not()})"
+        else:
+            code = self.parse_or()
+            if self.peek() != ")":
+                raise FilterSyntaxError("Missing closing parenthesis")
+            self.take()
+        self.depth -= 1
+        return code
+
+    def parse_primitive(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise FilterSyntaxError("Unexpected end of filter")
+
+        if token in ("less", "greater"):
+            self.take()
+            value = self.take()
+            if not value.isdigit():
+                raise FilterSyntaxError(f"Expected a length after {token!r}")
+            return f"(n <= {int(value)})" if token == "less" else f"(n >= {int(value)})"
+
+        protocol = direction = kind = None
+        qualified = False
+
+        if token in _PROTOCOLS:
+            protocol = self.take().lower()
+            qualified = True
+            token = self.peek()
+        if token in _DIRECTIONS:
+            direction = self.take().lower()
+            qualified = True
+            token = self.peek()
+        if token in _TYPES:
+            kind = self.take().lower()
+            qualified = True
+            token = self.peek()
+
+        if protocol is not None and direction is None and kind is None:
+            # Protocol alone: "tcp", "icmp", ...
+            return self._protocol_code(protocol)
+
+        if not qualified:
+            if self.last_qualifiers is None or token in (None, "(", ")"):
+                raise FilterSyntaxError(f"Unexpected token: {token!r}")
+            protocol, direction, kind = self.last_qualifiers
+
+        value = self.take()
+        if kind is None:
+            kind = _implicit_type(value)
+        self.last_qualifiers = (protocol, direction, kind)
+
+        code = _TYPE_CODE[kind](value, direction, self.columns)
+        if protocol is not None:
+            code = f"({self._protocol_code(protocol)} {'&' if self.columns else 'and'} {code})"
+        return code
+
+    def _protocol_code(self, protocol: str) -> str:
+        name = _PROTOCOLS[protocol]
+        if self.columns:
+            return "_true(n)" if name is None else f"(p == {_PROTOCOL_CODES[name]})"
+        # Every decoded packet is IPv4
+        return "True" if name is None else f"(p == {name!r})"
+
+
+# =========================
+# COMPILED FILTER
+# =========================
+
+class PacketFilter:
+    """
+    A filter expression compiled to a single Python predicate over
+    decoded header fields, so packets can be dropped before a Packet
+    dict is built, and to a NumPy expression over PacketBatch columns
+    (mask), so cached rows can be dropped before they become Packet dicts.
+    """
+
+    __slots__ = ("expression", "matches", "_matches_columns")
+
+    def __init__(self, expression: str, matches: Callable[..., bool], matches_columns: Callable[..., Any]):
+        self.expression = expression
+        # matches(src_ip, dst_ip, protocol, src_port, dst_port, length) -> bool
+        self.matches = matches
+        self._matches_columns = matches_columns
+
+    def __repr__(self) -> str:
+        return f"PacketFilter({self.expression!r})"
+
+    def __reduce__(self):
+        # Workers recompile from the expression
+        return (compile_filter, (self.expression,))
+
+    def match_packet(self, packet) -> bool:
+        return self.matches(
+            packet["src_ip"],
+            packet["dst_ip"],
+            packet["protocol"],
+            packet["src_port"],
+            packet["dst_port"],
+            packet["payload_size"]
+        )
+
+    def mask(self, batch):
+        """
+        Boolean NumPy array: which rows of a packet_batch.PacketBatch match.
+        """
+        return self._matches_columns(
+            batch.src_ip,
+            batch.dst_ip,
+            batch.protocol,
+            batch.src_port,
+            batch.dst_port,
+            batch.has_src_port,
+            batch.has_dst_port,
+            batch.payload_size
+        )
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def compile_filter(expression: str) -> PacketFilter:
+    """
+    Compile a BPF-style expression such as "tcp and dst port 3389" or
+    "src net 10.0.0.0/24 and not icmp". Raises FilterSyntaxError, also
+    for expressions over MAX_FILTER_LENGTH / MAX_FILTER_DEPTH.
+    """
+    if len(expression) > MAX_FILTER_LENGTH:
+        raise FilterSyntaxError(f"Filter longer than {MAX_FILTER_LENGTH} characters")
+    tokens = _tokenize(expression)
+    if not tokens:
+        raise FilterSyntaxError("Empty filter expression")
+
+    try:
+        code = _Parser(tokens).parse()
+        predicate = eval(
+            compile(f"lambda s, d, p, sp, dp, n: {code}", "<packet filter>", "eval"),
+            {"__builtins__": {}, "_ip": _ip_value}
+        )
+        column_code = _Parser(tokens, columns=True).parse()
+        column_predicate = eval(
+            compile(f"lambda s, d, p, sp, dp, hs, hd, n: {column_code}", "<packet filter>", "eval"),
+            {"__builtins__": {}, "_true": _true_column}
+        )
+    except FilterSyntaxError:
+        raise
+    except (SyntaxError, RecursionError, MemoryError, ValueError) as e:
+        raise FilterSyntaxError(f"Cannot compile filter: {type(e).__name__}") from None
+    return PacketFilter(expression, predicate, column_predicate)
+
+
+def resolve_filter(packet_filter) -> Optional[PacketFilter]:
+    """
+    Accept an expression string, a PacketFilter or None / "".
+    """
+    if packet_filter is None or isinstance(packet_filter, PacketFilter):
+        return packet_filter
+    if not packet_filter.strip():
+        return None
+    return compile_filter(packet_filter.strip())
@@ -0,0 +1,287 @@
+# parse_cache.py
+# Content-addressed on-disk cache of parsed captures for H-SAFE
+
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from schema import Packet
+from packet_batch import PacketBatch, PACKET_DTYPE, DEFAULT_BATCH_SIZE
+
+
+# =========================
+# CACHE LOCATION / LIMITS
+# =========================
+
+PARSE_CACHE_DIR = "/tmp/hsafe_parse_cache"  # Use /tmp for serverless consistency
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Bumped whenever the meaning of cached columns changes (v2: capture timestamps)
+_CACHE_SUFFIX = ".v2.npy"
+_HASH_READ_SIZE = 1 << 20
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# (path, size, mtime_ns) -> digest, so an unchanged file is hashed once
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def capture_digest(file_path: str) -> str:
+    """
+    SHA-256 of the capture bytes.
+    """
+    stat = os.stat(file_path)
+    signature = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(signature)
+    if digest is not None:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    if len(_digests) >= 1024:
+        _digests.clear()
+    _digests[signature] = digest
+    return digest
+
+
+def _entry_path(digest: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, digest + _CACHE_SUFFIX)
+
+
+# =========================
+# LOAD / STORE
+# =========================
+
+def load_batch(digest: str) -> Optional[PacketBatch]:
+    """
+    Cached columns of a capture (memory-mapped), or None on a miss.
+    """
+    path = _entry_path(digest)
+    try:
+        data = np.load(path, mmap_mode="r", allow_pickle=False)
+        if data.dtype != PACKET_DTYPE:
+            raise ValueError("Stale cache entry layout")
+        # Touch for LRU ordering
+        os.utime(path)
+    except FileNotFoundError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    except (OSError, ValueError, EOFError):
+        # Unreadable entry: drop it and parse again
+        _remove(path)
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    with _lock:
+        _stats["hits"] += 1
+    return PacketBatch(data)
+
+
+def store_batch(digest: str, batch: PacketBatch) -> None:
+    """
+    Write the columns of a parsed capture, then evict down to the size cap.
+    """
+    if batch.nbytes > PARSE_CACHE_MAX_BYTES:
+        return
+
+    path = _entry_path(digest)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, batch.data, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        _remove(tmp_path)
+        return  # Read-only or full /tmp: analysis still works uncached
+
+    _evict(keep=path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _entries() -> List[Tuple[float, int, str]]:
+    """
+    (last_used, size, path) of every cache entry.
+    """
+    entries = []
+    try:
+        names = os.listdir(PARSE_CACHE_DIR)
+    except OSError:
+        return entries
+
+    for name in names:
+        # Any layout version, so entries of older versions age out too
+        if not name.endswith(".npy"):
+            continue
+        path = os.path.join(PARSE_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict(keep: Optional[str] = None) -> None:
+    """
+    Remove least recently used entries until the cache fits its cap.
+    """
+    with _lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= PARSE_CACHE_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            _remove(path)
+            total -= size
+            _stats["evictions"] += 1
+
+
+def cache_stats() -> Dict[str, int]:
+    entries = _entries()
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": PARSE_CACHE_MAX_BYTES
+        }
+
+
+def clear_cache() -> None:
+    with _lock:
+        for _, _, path in _entries():
+            _remove(path)
+        for key in _stats:
+            _stats[key] = 0
+        _digests.clear()
+
+
+# =========================
+# CACHED READING
+# =========================
+
+def _parse_and_store(
+    digest: str,
+    parse: Callable[[], Iterable[Packet]],
+    batch_size: int
+) -> Iterator[Tuple[List[Packet], PacketBatch]]:
+    """
+    Parse a capture in (packets, batch) chunks, spilling the columns to a
+    temporary file and caching them once the whole capture has been read.
+    Columns outgrowing PARSE_CACHE_MAX_BYTES are dropped (not cached).
+    """
+    rows_path = f"{_entry_path(digest)}.{os.getpid()}.{threading.get_ident()}.rows"
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        rows = open(rows_path, "wb")
+    except OSError:
+        rows = None  # Read-only or full /tmp: analysis still works uncached
+    spilled = 0
+
+    def spill(batch: PacketBatch) -> None:
+        nonlocal rows, spilled
+        if rows is None:
+            return
+        spilled += batch.nbytes
+        try:
+            if spilled > PARSE_CACHE_MAX_BYTES:
+                raise OSError("Capture too large to cache")
+            batch.data.tofile(rows)
+        except OSError:
+            rows.close()
+            rows = None
+            _remove(rows_path)
+
+    try:
+        chunk: List[Packet] = []
+        for packet in parse():
+            chunk.append(packet)
+            if len(chunk) >= batch_size:
+                batch = PacketBatch.from_packets(chunk)
+                spill(batch)
+                yield chunk, batch
+                chunk = []
+        if chunk:
+            batch = PacketBatch.from_packets(chunk)
+            spill(batch)
+            yield chunk, batch
+
+        if rows is not None:
+            rows.close()
+            if spilled:
+                store_batch(digest, PacketBatch(np.memmap(rows_path, dtype=PACKET_DTYPE, mode="r")))
+            else:
+                store_batch(digest, PacketBatch.empty())
+    finally:
+        if rows is not None:
+            rows.close()
+            _remove(rows_path)
+
+
+def iter_cached_batches(
+    file_path: str,
+    parse: Callable[[], Iterable[Packet]],
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[PacketBatch]:
+    """
+    PacketBatch chunks of a capture, from the cache when its content was
+    parsed before, otherwise from parse() (stored once fully read).
+    """
+    digest = capture_digest(file_path)
+    cached = load_batch(digest)
+    if cached is not None:
+        for start in range(0, len(cached), batch_size):
+            yield cached[start:start + batch_size]
+        return
+
+    for _, batch in _parse_and_store(digest, parse, batch_size):
+        yield batch
+
+
+def iter_cached_packets(
+    file_path: str,
+    parse: Callable[[], Iterable[Packet]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    keep: Optional[Callable[[PacketBatch], np.ndarray]] = None
+) -> Iterator[Packet]:
+    """
+    Packet-dict form of iter_cached_batches.
+
+    keep(batch) -> boolean row mask (e.g. PacketFilter.mask) drops rows
+    from the columns before they become Packet dicts; the cache itself
+    still holds the whole capture.
+    """
+    digest = capture_digest(file_path)
+    cached = load_batch(digest)
+    if cached is not None:
+        for start in range(0, len(cached), batch_size):
+            batch = cached[start:start + batch_size]
+            if keep is not None:
+                batch = batch[keep(batch)]
+            yield from batch.to_packets()
+        return
+
+    for packets, batch in _parse_and_store(digest, parse, batch_size):
+        if keep is None:
+            yield from packets
+        else:
+            yield from (packet for packet, kept in zip(packets, keep(batch).tolist()) if kept)
@@ -1,12 +1,20 @@
 # pcap_analysis.py
 # PCAP analysis + firewall flow simulation for H-SAFE (headless)
 
-from typing import List, Dict
+import os
+from functools import partial
+from typing import Callable, List, Dict, Iterator, Iterable, Optional, Tuple, Union
 
-from scapy.all import rdpcap, IP, TCP, UDP, ICMP
+# scapy is imported where frames need full dissection: loading it takes about a
+# second, and the native decoder handles most captures without it
 
 from schema import Packet, Detection, new_packet
-from rule_implementation import apply_rules
+from rule_implementation import apply_rules_with_verdicts
+from detection_records import DetectionRecords
+import pcap_decoder
+import pcap_index
+from flow_table import FlowTable
+from packet_filter import PacketFilter, resolve_filter
 
 
 # =========================
@@ -22,53 +30,336 @@ PORT_LANES = {
 
 DEFAULT_LANE = "OTHER"
 
+# Packets evaluated per batch in streaming mode
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rule engines accepted by evaluate_packets
+RULE_ENGINES = ("python", "compiled", "vectorized")
+
+
+# =========================
+# PROGRESS
+# =========================
+
+class AnalysisProgress:
+    """
+    Progress of a running simulation, for status polling.
+
+    Readers advance bytes_parsed as records are decoded; the chunk loop
+    advances packets_evaluated and calls on_update(progress) after every
+    chunk and stage change.
+    """
+
+    def __init__(self, on_update: Optional[Callable[["AnalysisProgress"], None]] = None):
+        self.stage = "queued"
+        self.bytes_total = 0
+        self.bytes_parsed = 0
+        self.packets_evaluated = 0
+        self._on_update = on_update
+
+    def update(self, **fields) -> None:
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if self._on_update is not None:
+            self._on_update(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "stage": self.stage,
+            "bytes_total": self.bytes_total,
+            "bytes_parsed": self.bytes_parsed,
+            "packets_evaluated": self.packets_evaluated
+        }
+
 
 # =========================
 # PCAP PARSING
 # =========================
 
-def parse_pcap(file_path: str) -> List[Packet]:
+def _normalize_scapy_packet(pkt, timestamp: Optional[float] = None) -> Optional[Packet]:
     """
-    Parse PCAP file and normalize packets to H-SAFE Packet schema.
+    Normalize a single scapy packet to the H-SAFE Packet schema.
+    Returns None for traffic the simulator does not model.
+
+    timestamp: capture time; defaults to the packet's own pkt.time
+    """
+    from scapy.all import IP, TCP, UDP, ICMP
+
+    if not pkt.haslayer(IP):
+        return None
+
+    ip = pkt[IP]
+    protocol = None
+    src_port = None
+    dst_port = None
+
+    if pkt.haslayer(TCP):
+        protocol = "TCP"
+        src_port = pkt[TCP].sport
+        dst_port = pkt[TCP].dport
+    elif pkt.haslayer(UDP):
+        protocol = "UDP"
+        src_port = pkt[UDP].sport
+        dst_port = pkt[UDP].dport
+    elif pkt.haslayer(ICMP):
+        protocol = "ICMP"
+    else:
+        return None
+
+    return new_packet(
+        src_ip=ip.src,
+        dst_ip=ip.dst,
+        protocol=protocol,
+        src_port=src_port,
+        dst_port=dst_port,
+        payload_size=len(bytes(pkt)),
+        timestamp=float(pkt.time) if timestamp is None else timestamp
+    )
+
+
+def _dissect_frame(linktype: int, data: bytes):
+    """
+    Full scapy dissection of a raw frame (fallback for the native decoder).
+    """
+    from scapy.all import conf
+
+    layer = conf.l2types.num2layer.get(linktype, conf.raw_layer)
+    try:
+        return layer(data)
+    except Exception:
+        # Same recovery as scapy's PcapReader for undissectable frames
+        return conf.raw_layer(data)
+
+
+def _decode_record(
+    linktype: int,
+    data: bytes,
+    packet_filter: Optional[PacketFilter] = None,
+    timestamp: Optional[float] = None
+) -> Optional[Packet]:
     """
+    Normalize a raw frame using the struct-based decoder,
+    falling back to scapy for frames it does not handle.
+    Frames rejected by packet_filter are dropped before a Packet is built.
+    """
+    try:
+        headers = pcap_decoder.decode_frame(linktype, data)
+    except pcap_decoder.UnsupportedFrame:
+        packet = _normalize_scapy_packet(_dissect_frame(linktype, bytes(data)), timestamp)
+        if packet is not None and packet_filter is not None and not packet_filter.match_packet(packet):
+            return None
+        return packet
+
+    if headers is None:
+        return None
+
+    src_ip, dst_ip, protocol, src_port, dst_port = headers
+    if packet_filter is not None and not packet_filter.matches(
+        src_ip, dst_ip, protocol, src_port, dst_port, len(data)
+    ):
+        return None
+    return new_packet(
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        protocol=protocol,
+        src_port=src_port,
+        dst_port=dst_port,
+        payload_size=len(data),
+        timestamp=timestamp
+    )
+
+
+def _iter_pcap_native(
+    file_path: str,
+    packet_filter: Optional[PacketFilter] = None,
+    progress: Optional[AnalysisProgress] = None
+) -> Iterator[Packet]:
+    with open(file_path, "rb") as f:
+        for offset, timestamp, linktype, data in pcap_decoder.iter_records(f):
+            if progress is not None:
+                progress.bytes_parsed = offset
+            packet = _decode_record(linktype, data, packet_filter, timestamp)
+            if packet is not None:
+                yield packet
+
+
+def iter_pcap_mapped(
+    file_path: str,
+    start: int = 0,
+    stop: Optional[int] = None,
+    packet_filter: Optional[PacketFilter] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    progress: Optional[AnalysisProgress] = None
+) -> Iterator[Packet]:
+    """
+    Packets of records [start, stop) of a capture, read through its
+    offset index (time window and filter applied).
+    """
+    with pcap_index.MappedCapture(file_path) as capture:
+        for timestamp, linktype, frame in capture.iter_frames(start, stop, start_ts, end_ts):
+            if progress is not None:
+                progress.bytes_parsed = capture.bytes_read
+            packet = _decode_record(linktype, frame, packet_filter, timestamp)
+            if packet is not None:
+                yield packet
+
+
+def _iter_pcap_scapy(
+    file_path: str,
+    packet_filter: Optional[PacketFilter] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    progress: Optional[AnalysisProgress] = None
+) -> Iterator[Packet]:
+    from scapy.all import PcapReader
+
+    with PcapReader(file_path) as reader:
+        for pkt in reader:
+            if progress is not None:
+                progress.bytes_parsed = reader.f.tell()
+            if start_ts is not None and float(pkt.time) < start_ts:
+                continue
+            if end_ts is not None and float(pkt.time) >= end_ts:
+                continue
+            packet = _normalize_scapy_packet(pkt)
+            if packet is not None and (packet_filter is None or packet_filter.match_packet(packet)):
+                yield packet
+
+
+def iter_pcap(
+    file_path: str,
+    native: bool = True,
+    indexed: bool = False,
+    cached: bool = False,
+    packet_filter=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    progress: Optional[AnalysisProgress] = None
+) -> Iterator[Packet]:
+    """
+    Lazily read a PCAP file, yielding normalized packets one at a time.
+    Only the packet currently being normalized is held in memory.
 
-    packets: List[Packet] = []
-    scapy_packets = rdpcap(file_path)
-
-    for pkt in scapy_packets:
-        if not pkt.haslayer(IP):
-            continue
-
-        ip = pkt[IP]
-        protocol = None
-        src_port = None
-        dst_port = None
-
-        if pkt.haslayer(TCP):
-            protocol = "TCP"
-            src_port = pkt[TCP].sport
-            dst_port = pkt[TCP].dport
-        elif pkt.haslayer(UDP):
-            protocol = "UDP"
-            src_port = pkt[UDP].sport
-            dst_port = pkt[UDP].dport
-        elif pkt.haslayer(ICMP):
-            protocol = "ICMP"
-        else:
-            continue
-
-        packets.append(
-            new_packet(
-                src_ip=ip.src,
-                dst_ip=ip.dst,
-                protocol=protocol,
-                src_port=src_port,
-                dst_port=dst_port,
-                payload_size=len(bytes(pkt))
-            )
+    native:
+    - Decode pcap / pcapng headers directly with struct (fast path);
+      files in other formats are read through scapy
+
+    indexed:
+    - Memory-map the capture and walk its sidecar offset index
+      (built on first use), decoding frames in place
+
+    cached:
+    - Reuse the parse_cache columns of a capture with identical content
+      (parsed and stored on the first read)
+
+    packet_filter:
+    - BPF-style expression (or compiled packet_filter.PacketFilter);
+      only matching packets are yielded
+
+    start_ts / end_ts:
+    - Capture-time window [start_ts, end_ts) in epoch seconds; pcap / pcapng
+      files binary-search the sidecar timestamp index for the first record
+      and stop at the window end (the parse cache is bypassed)
+
+    progress:
+    - AnalysisProgress whose bytes_parsed follows the reader
+      (unchanged on a parse cache hit)
+    """
+    packet_filter = resolve_filter(packet_filter)
+    windowed = start_ts is not None or end_ts is not None
+
+    if windowed:
+        if native and pcap_decoder.sniff_format(file_path):
+            return iter_pcap_mapped(file_path, 0, None, packet_filter, start_ts, end_ts, progress)
+        return _iter_pcap_scapy(file_path, packet_filter, start_ts, end_ts, progress)
+
+    if cached:
+        import parse_cache
+
+        # The cache holds the whole capture; the filter runs on its columns,
+        # so rejected rows never become Packet dicts
+        return parse_cache.iter_cached_packets(
+            file_path,
+            lambda: iter_pcap(file_path, native=native, indexed=indexed, progress=progress),
+            keep=packet_filter.mask if packet_filter is not None else None
         )
 
-    return packets
+    if native and pcap_decoder.sniff_format(file_path):
+        if indexed:
+            return iter_pcap_mapped(file_path, packet_filter=packet_filter, progress=progress)
+        return _iter_pcap_native(file_path, packet_filter, progress)
+    return _iter_pcap_scapy(file_path, packet_filter, progress=progress)
+
+
+def iter_packet_chunks(
+    packets: Iterable[Packet],
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[List[Packet]]:
+    """
+    Group a packet stream into lists of at most chunk_size packets.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+
+    chunk: List[Packet] = []
+    for packet in packets:
+        chunk.append(packet)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def iter_pcap_batches(
+    file_path: str,
+    batch_size: Optional[int] = None,
+    indexed: bool = False,
+    cached: bool = False
+):
+    """
+    Read a PCAP as columnar packet_batch.PacketBatch chunks.
+    """
+    import packet_batch
+
+    if cached:
+        import parse_cache
+
+        return parse_cache.iter_cached_batches(
+            file_path,
+            lambda: iter_pcap(file_path, indexed=indexed),
+            batch_size or packet_batch.DEFAULT_BATCH_SIZE
+        )
+
+    return packet_batch.iter_batches(
+        iter_pcap(file_path, indexed=indexed),
+        batch_size or packet_batch.DEFAULT_BATCH_SIZE
+    )
+
+
+def parse_pcap(
+    file_path: str,
+    native: bool = True,
+    indexed: bool = False,
+    cached: bool = False,
+    packet_filter=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None
+) -> List[Packet]:
+    """
+    Parse PCAP file and normalize packets to H-SAFE Packet schema.
+    """
+    return list(iter_pcap(
+        file_path,
+        native=native,
+        indexed=indexed,
+        cached=cached,
+        packet_filter=packet_filter,
+        start_ts=start_ts,
+        end_ts=end_ts
+    ))
 
 
 # =========================
@@ -88,61 +379,492 @@ def _assign_lane(packet: Packet) -> str:
 # PCAP FIREWALL SIMULATION
 # =========================
 
-def simulate_pcap_flow(
-    pcap_path: str,
+def evaluate_packets(
+    packets: List[Packet],
     rules: List[Dict],
-    speed: int = 1
-) -> Dict:
+    engine: str = "python",
+    compact: bool = False
+) -> Tuple[Union[List[Detection], DetectionRecords], List[str], List[int]]:
     """
-    Simulate firewall behavior over PCAP traffic.
+    Run the selected rule engine over packets.
 
-    speed:
-    - Logical speed factor (used by UI or backend, not sleep-based)
+    Returns (detections, verdicts, decisive_rule_indices) with one verdict
+    and rule index per packet (see rule_implementation.evaluate_packet).
+    For the compiled engine, indices refer to the enabled rules only.
+    compact returns detections as DetectionRecords over packets.
     """
+    if engine == "vectorized":
+        import packet_batch
+        import rule_vectorized
+
+        batch = packet_batch.PacketBatch.from_packets(packets)
+        evaluation = rule_vectorized.evaluate_batch(batch, rules)
+        return (
+            evaluation.detection_records(packets) if compact else evaluation.detections(packets),
+            evaluation.actions(),
+            evaluation.verdict_rules().tolist()
+        )
 
-    packets = parse_pcap(pcap_path)
+    if engine == "compiled":
+        import rule_compiler
 
-    detections: List[Detection] = apply_rules(packets, rules)
+        compiled = rule_compiler.get_compiled_ruleset(rules)
+        return rule_compiler.evaluate_compiled_rules(packets, compiled, compact)
 
-    timeline = []
-    action_count = {"ALLOW": 0, "DENY": 0, "ALERT": 0}
+    if engine not in RULE_ENGINES:
+        raise ValueError(f"Unknown rule engine: {engine}")
 
-    for index, packet in enumerate(packets):
-        packet_detections = [
-            d for d in detections if d["packet"] == packet
-        ]
+    return apply_rules_with_verdicts(packets, rules, compact)
 
-        if packet_detections:
-            # Firewall enforces first matching rule (already ordered)
-            decision = packet_detections[0]["action"]
-        else:
-            decision = "ALLOW"  # default firewall behavior
+
+def _build_timeline(
+    packets: List[Packet],
+    verdicts: List[str],
+    start_index: int,
+    action_count: Dict[str, int]
+) -> List[Dict]:
+    """
+    Produce the timeline entry of each packet from its engine verdict.
+    Updates action_count in place.
+    """
+    timeline = []
+
+    for offset, packet in enumerate(packets):
+        # Verdict = first matching rule's action, ALLOW by default
+        decision = verdicts[offset]
 
         action_count[decision] += 1
 
         timeline.append({
-            "index": index,
+            "index": start_index + offset,
             "timestamp": packet["timestamp"],
             "src_ip": packet["src_ip"],
             "dst_ip": packet["dst_ip"],
             "protocol": packet["protocol"],
             "dst_port": packet["dst_port"],
+            "payload_size": packet["payload_size"],
             "lane": _assign_lane(packet),
             "action": decision
         })
 
-        # DENY stops further evaluation for this packet only
-        # (already handled in rule engine)
+    return timeline
+
+
+def evaluate_chunk(
+    chunk: List[Packet],
+    rules: List[Dict],
+    engine: str,
+    flow_table: Optional[FlowTable],
+    start_index: int
+) -> Dict:
+    """
+    Evaluate one chunk of packets into a partial flow result
+    (detections as DetectionRecords indexed like the timeline).
+    """
+    if flow_table is not None:
+        detections, verdicts, _ = flow_table.evaluate(chunk)
+    else:
+        detections, verdicts, _ = evaluate_packets(chunk, rules, engine, compact=True)
+    detections.shift(start_index)
+    action_count = {"ALLOW": 0, "DENY": 0, "ALERT": 0}
+    timeline = _build_timeline(chunk, verdicts, start_index, action_count)
 
     return {
-        "summary": {
-            "total_packets": len(packets),
-            "allow": action_count["ALLOW"],
-            "deny": action_count["DENY"],
-            "alert": action_count["ALERT"],
-            "speed_factor": speed,
-            "duration": (packets[-1]["timestamp"] - packets[0]["timestamp"]) if len(packets) > 1 else 0.0
-        },
         "timeline": timeline,
-        "detections": detections
+        "detections": detections,
+        "action_count": action_count,
+        "first_timestamp": chunk[0]["timestamp"],
+        "last_timestamp": chunk[-1]["timestamp"]
+    }
+
+
+class FlowResult:
+    """
+    Accumulates partial results (as yielded by stream_pcap_flow) into
+    the simulate_pcap_flow result shape.
+
+    compact: leave result detections as DetectionRecords instead of
+    materializing Detection dicts.
+    """
+
+    def __init__(self, speed: int = 1, compact: bool = False):
+        self.speed = speed
+        self.compact = compact
+        self.timeline: List[Dict] = []
+        self.detections = DetectionRecords()
+        self.action_count = {"ALLOW": 0, "DENY": 0, "ALERT": 0}
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def add(self, part: Dict, reindex: bool = False) -> None:
+        """
+        Append the next part in capture order. reindex renumbers timeline
+        entries (and detections) of a part that was indexed from 0 on its own.
+        """
+        offset = 0
+        if reindex:
+            offset = len(self.timeline)
+            for entry in part["timeline"]:
+                entry["index"] += offset
+        self.timeline.extend(part["timeline"])
+        self.detections.extend(part["detections"], offset)
+        for action, count in part["action_count"].items():
+            self.action_count[action] += count
+
+        if part["first_timestamp"] is not None:
+            if self.first_timestamp is None:
+                self.first_timestamp = part["first_timestamp"]
+            self.last_timestamp = part["last_timestamp"]
+
+    def result(self, flows: Optional[List[Dict]] = None) -> Dict:
+        result = {
+            "summary": {
+                "total_packets": len(self.timeline),
+                "allow": self.action_count["ALLOW"],
+                "deny": self.action_count["DENY"],
+                "alert": self.action_count["ALERT"],
+                "speed_factor": self.speed,
+                "duration": (self.last_timestamp - self.first_timestamp) if len(self.timeline) > 1 else 0.0
+            },
+            "timeline": self.timeline,
+            "detections": self.detections if self.compact else self.detections.materialize()
+        }
+        if flows is not None:
+            result["flows"] = flows
+        return result
+
+
+def stream_pcap_flow(
+    pcap_path: str,
+    rules: List[Dict],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    indexed: bool = False,
+    engine: str = "python",
+    flow_table: Optional[FlowTable] = None,
+    cached: bool = False,
+    packet_filter=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    progress: Optional[AnalysisProgress] = None
+) -> Iterator[Dict]:
+    """
+    Evaluate a PCAP chunk by chunk.
+
+    Yields one partial result per chunk:
+    {
+        "timeline": [...],
+        "detections": DetectionRecords (packet indices into the timeline),
+        "action_count": {...},
+        "first_timestamp": float,
+        "last_timestamp": float
     }
+
+    Peak memory is bounded by chunk_size, not by capture size.
+
+    flow_table:
+    - Evaluate through this FlowTable (verdicts cached per flow across
+      chunks); its flows() holds the per-flow statistics afterwards
+
+    progress:
+    - AnalysisProgress updated after every chunk
+    """
+    index = 0
+
+    packets = iter_pcap(
+        pcap_path,
+        indexed=indexed,
+        cached=cached,
+        packet_filter=packet_filter,
+        start_ts=start_ts,
+        end_ts=end_ts,
+        progress=progress
+    )
+
+    for chunk in iter_packet_chunks(packets, chunk_size):
+        yield evaluate_chunk(chunk, rules, engine, flow_table, index)
+        index += len(chunk)
+        if progress is not None:
+            progress.update(packets_evaluated=index)
+
+
+def simulate_pcap_flow(
+    pcap_path: str,
+    rules: List[Dict],
+    speed: int = 1,
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    indexed: bool = False,
+    engine: str = "python",
+    aggregate_flows: bool = False,
+    workers: Optional[int] = 1,
+    cached: bool = False,
+    packet_filter=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    compact_detections: bool = False,
+    progress: Optional[AnalysisProgress] = None
+) -> Dict:
+    """
+    Simulate firewall behavior over PCAP traffic.
+
+    speed:
+    - Logical speed factor (used by UI or backend, not sleep-based)
+
+    streaming:
+    - Read and evaluate the capture in chunks of chunk_size packets
+      instead of loading it fully before rule evaluation
+
+    indexed:
+    - Read through the memory-mapped sidecar index (fast re-analysis
+      of a capture that stays on disk)
+
+    engine:
+    - "python": per-packet rule_implementation.apply_rules
+    - "vectorized": column-wise rule_vectorized.evaluate_batch
+    - "compiled": rule_compiler index lookup of candidate rules per packet
+
+    aggregate_flows:
+    - Evaluate rules once per 5-tuple flow (and payload-size band) and
+      add per-flow statistics to the result under "flows"
+
+    workers:
+    - Parse and evaluate record ranges in this many processes
+      (None / 0 = one per CPU); small captures still run serially
+
+    cached:
+    - Load packets from the content-addressed parse cache instead of
+      re-parsing a capture seen before (takes precedence over workers)
+
+    packet_filter:
+    - BPF-style expression ("tcp and dst port 3389", "net 10.0.0.0/24");
+      other packets are dropped at header decode and never evaluated
+
+    start_ts / end_ts:
+    - Only analyze packets captured in [start_ts, end_ts) (epoch seconds);
+      the cost scales with the window, not the capture
+
+    compact_detections:
+    - Return detections as DetectionRecords (rule / timeline indices)
+      instead of one Detection dict (embedding its packet) per match
+
+    progress:
+    - AnalysisProgress to report bytes parsed / packets evaluated to
+      (stage "simulating"); implies streaming
+    """
+
+    packet_filter = resolve_filter(packet_filter)
+    if progress is not None:
+        streaming = True
+        progress.update(stage="simulating", bytes_total=os.path.getsize(pcap_path))
+
+    if workers != 1 and not cached:
+        import pcap_parallel
+
+        result = pcap_parallel.simulate_pcap_flow_parallel(
+            pcap_path, rules, speed, workers, chunk_size, engine, aggregate_flows,
+            packet_filter=packet_filter,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            compact_detections=compact_detections,
+            progress=progress
+        )
+        if result is not None:
+            return result
+
+    flow_table = new_flow_table(rules, engine) if aggregate_flows else None
+
+    if streaming:
+        return _simulate_pcap_flow_streaming(
+            pcap_path, rules, speed, chunk_size, indexed, engine, flow_table,
+            cached=cached,
+            packet_filter=packet_filter,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            compact_detections=compact_detections,
+            progress=progress
+        )
+
+    packets = parse_pcap(
+        pcap_path,
+        indexed=indexed,
+        cached=cached,
+        packet_filter=packet_filter,
+        start_ts=start_ts,
+        end_ts=end_ts
+    )
+
+    flow_result = FlowResult(speed, compact_detections)
+    if packets:
+        flow_result.add(evaluate_chunk(packets, rules, engine, flow_table, 0))
+
+    return flow_result.result(flow_table.flows() if flow_table is not None else None)
+
+
+def new_flow_table(rules: List[Dict], engine: str) -> FlowTable:
+    """
+    Flow table whose cache misses are evaluated with the given engine.
+    """
+    # partial rather than a lambda, so flow tables can be pickled to job pool workers
+    return FlowTable(rules, partial(evaluate_packets, rules=rules, engine=engine, compact=True))
+
+
+def analyze_pcap_range(
+    pcap_path: str,
+    start: int,
+    stop: int,
+    rules: List[Dict],
+    chunk_size: int,
+    engine: str,
+    aggregate_flows: bool,
+    packet_filter: Optional[PacketFilter] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None
+) -> Dict:
+    """
+    Parse and evaluate records [start, stop) of a capture into a partial
+    flow result (the pcap_parallel worker). Timeline indices are local to
+    the range; merge parts with FlowResult.add(part, reindex=True).
+    """
+    flow_result = FlowResult()
+    flow_table = new_flow_table(rules, engine) if aggregate_flows else None
+
+    packets = iter_pcap_mapped(pcap_path, start, stop, packet_filter, start_ts, end_ts)
+    for chunk in iter_packet_chunks(packets, chunk_size):
+        flow_result.add(evaluate_chunk(chunk, rules, engine, flow_table, len(flow_result.timeline)))
+
+    return {
+        "timeline": flow_result.timeline,
+        "detections": flow_result.detections,
+        "action_count": flow_result.action_count,
+        "first_timestamp": flow_result.first_timestamp,
+        "last_timestamp": flow_result.last_timestamp,
+        "flows": flow_table.flows() if flow_table is not None else None
+    }
+
+
+def _simulate_pcap_flow_streaming(
+    pcap_path: str,
+    rules: List[Dict],
+    speed: int,
+    chunk_size: int,
+    indexed: bool,
+    engine: str,
+    flow_table: Optional[FlowTable] = None,
+    cached: bool = False,
+    packet_filter: Optional[PacketFilter] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    compact_detections: bool = False,
+    progress: Optional[AnalysisProgress] = None
+) -> Dict:
+    """
+    Streaming variant of simulate_pcap_flow with an identical result shape.
+    """
+    flow_result = FlowResult(speed, compact_detections)
+
+    parts = stream_pcap_flow(
+        pcap_path, rules, chunk_size, indexed, engine, flow_table,
+        cached=cached,
+        packet_filter=packet_filter,
+        start_ts=start_ts,
+        end_ts=end_ts,
+        progress=progress
+    )
+    for part in parts:
+        flow_result.add(part)
+
+    if progress is not None:
+        # Also covers a parse cache hit, where no capture bytes are read
+        progress.update(bytes_parsed=progress.bytes_total)
+
+    return flow_result.result(flow_table.flows() if flow_table is not None else None)
+
+
+# =========================
+# INCREMENTAL (UPLOAD) SIMULATION
+# =========================
+
+class IncrementalPcapFlow:
+    """
+    simulate_pcap_flow over capture bytes as they arrive (pcap / pcapng).
+
+    feed() decodes every record completed by the new bytes and evaluates
+    each full chunk right away, so finish() only has the last partial
+    chunk left to process once the upload ends.
+    """
+
+    def __init__(
+        self,
+        rules: List[Dict],
+        speed: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        engine: str = "python",
+        aggregate_flows: bool = False,
+        packet_filter=None,
+        compact_detections: bool = False
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.rules = rules
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.bytes_received = 0
+        self._filter = resolve_filter(packet_filter)
+        self._parser = pcap_decoder.CaptureParser()
+        self._capture_kind = None
+        self._pending: List[Packet] = []
+        self._flow_table = new_flow_table(rules, engine) if aggregate_flows else None
+        self._result = FlowResult(speed, compact_detections)
+
+    @property
+    def packets_processed(self) -> int:
+        return len(self._result.timeline) + len(self._pending)
+
+    def feed(self, data: bytes) -> None:
+        """
+        Consume the next bytes of the capture.
+        Raises pcap_decoder.CaptureFormatError if it is not pcap / pcapng.
+        """
+        self.bytes_received += len(data)
+        for _, timestamp, linktype, frame in self._parser.feed(data):
+            packet = _decode_record(linktype, frame, self._filter, timestamp)
+            if packet is None:
+                continue
+            self._pending.append(packet)
+            if len(self._pending) >= self.chunk_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            part = evaluate_chunk(
+                self._pending, self.rules, self.engine, self._flow_table, len(self._result.timeline)
+            )
+            self._result.add(part)
+            self._pending = []
+
+    def __getstate__(self) -> Dict:
+        # Pickled to hand a fully fed flow to a job pool worker: the parser
+        # (and the bytes of any unfinished record) stays behind
+        state = dict(self.__dict__)
+        state["_parser"] = None
+        state["_capture_kind"] = self.capture_kind
+        return state
+
+    @property
+    def capture_kind(self) -> Optional[str]:
+        """
+        "pcap" / "pcapng" once the capture header has been read, else None.
+        """
+        if self._parser is not None:
+            return self._parser.kind
+        return self._capture_kind
+
+    def finish(self) -> Dict:
+        """
+        Evaluate the remaining packets and return the simulate_pcap_flow result.
+        """
+        if self.capture_kind is None:
+            raise pcap_decoder.CaptureFormatError("Empty or truncated capture header")
+        self._flush()
+        flows = self._flow_table.flows() if self._flow_table is not None else None
+        return self._result.result(flows)
@@ -0,0 +1,308 @@
+# pcap_batch.py
+# Batch analysis of several captures (or archives of captures) for H-SAFE
+
+import heapq
+import os
+import site
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+import pcap_analysis
+import pcap_decoder
+from detection_records import DetectionRecords
+
+
+# =========================
+# INPUT EXPANSION
+# =========================
+
+# Upper bound on bytes written while unpacking archives
+MAX_EXTRACTED_BYTES = 2 * 1024 * 1024 * 1024
+
+_COPY_BUFFER = 1024 * 1024
+
+_SIMULATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _safe_name(index: int, member_name: str) -> str:
+    """
+    Flat, collision-free file name for an archive member
+    (directory components and traversal are dropped).
+    """
+    base = os.path.basename(member_name.replace("\\", "/")) or "capture"
+    return f"{index:05d}_{base}"
+
+
+def _copy_limited(src, dst_path: str, budget: List[int]) -> None:
+    with open(dst_path, "wb") as dst:
+        while True:
+            block = src.read(_COPY_BUFFER)
+            if not block:
+                break
+            budget[0] -= len(block)
+            if budget[0] < 0:
+                raise ValueError("Archive expands beyond the batch size limit")
+            dst.write(block)
+
+
+def _extract_archive(archive_path: str, dest_dir: str, budget: List[int]) -> List[Tuple[str, str]]:
+    """
+    Unpack the regular files of a zip / tar archive into dest_dir.
+    Returns (label, path) for each extracted file.
+    """
+    extracted = []
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                path = os.path.join(dest_dir, _safe_name(len(extracted), info.filename))
+                with archive.open(info) as src:
+                    _copy_limited(src, path, budget)
+                extracted.append((info.filename, path))
+        return extracted
+
+    with tarfile.open(archive_path) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            path = os.path.join(dest_dir, _safe_name(len(extracted), member.name))
+            src = archive.extractfile(member)
+            with src:
+                _copy_limited(src, path, budget)
+            extracted.append((member.name, path))
+    return extracted
+
+
+def _is_archive(path: str) -> bool:
+    if pcap_decoder.sniff_format(path):
+        return False
+    if zipfile.is_zipfile(path):
+        return True
+    try:
+        return tarfile.is_tarfile(path)
+    except OSError:
+        return False
+
+
+def expand_inputs(inputs: List[Tuple[str, str]], work_dir: str) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Resolve (label, path) inputs into files, unpacking archives into work_dir.
+
+    Returns (label, path, format) per file in input order (archive members
+    in place of their archive); format is "pcap" / "pcapng", or None for
+    anything that is not a capture.
+    """
+    files = []
+    budget = [MAX_EXTRACTED_BYTES]
+
+    for position, (label, path) in enumerate(inputs):
+        if _is_archive(path):
+            archive_dir = os.path.join(work_dir, f"archive_{position:05d}")
+            os.makedirs(archive_dir, exist_ok=True)
+            members = [
+                (f"{label}/{name}", member_path)
+                for name, member_path in _extract_archive(path, archive_dir, budget)
+            ]
+        else:
+            members = [(label, path)]
+
+        for member_label, member_path in members:
+            files.append((member_label, member_path, pcap_decoder.sniff_format(member_path)))
+
+    return files
+
+
+# =========================
+# WORKER
+# =========================
+
+def _analyze_capture(path: str, rules: List[Dict], engine: str, chunk_size: int) -> Dict:
+    """
+    Streaming simulate_pcap_flow of one capture (runs in a worker),
+    detections as DetectionRecords.
+    """
+    return pcap_analysis.simulate_pcap_flow(
+        path, rules, streaming=True, chunk_size=chunk_size, engine=engine, compact_detections=True
+    )
+
+
+# =========================
+# BATCH SIMULATION
+# =========================
+
+def _entry_time(item) -> float:
+    return item[0]["timestamp"]
+
+
+def _in_time_order(timeline: List[Dict]) -> bool:
+    return all(a["timestamp"] <= b["timestamp"] for a, b in zip(timeline, islice(timeline, 1, None)))
+
+
+def merge_results(
+    labels: List[str],
+    results: List[Dict],
+    speed: int = 1,
+    compact_detections: bool = False
+) -> Dict:
+    """
+    Combine per-capture simulate_pcap_flow results (detections as
+    DetectionRecords) into one result. Per-file timelines in timestamp
+    order are k-way merged (ties keep input file order) rather than
+    re-sorted; a capture whose records are out of time order is
+    stable-sorted first.
+
+    Timeline entries gain a "file" label and are renumbered in merged order;
+    detections follow their packets. compact_detections keeps detections as
+    DetectionRecords, otherwise they are Detection dicts with a "file" label.
+    """
+    action_count = {"ALLOW": 0, "DENY": 0, "ALERT": 0}
+    for label, result in zip(labels, results):
+        for entry in result["timeline"]:
+            entry["file"] = label
+        summary = result["summary"]
+        action_count["ALLOW"] += summary["allow"]
+        action_count["DENY"] += summary["deny"]
+        action_count["ALERT"] += summary["alert"]
+
+    # Per-file timeline index -> merged timeline index
+    remap = [[0] * len(result["timeline"]) for result in results]
+    timeline = []
+    runs = []
+    reordered = []
+    for position, result in enumerate(results):
+        run = zip(result["timeline"], repeat(position))
+        reordered.append(not _in_time_order(result["timeline"]))
+        if reordered[-1]:
+            run = sorted(run, key=_entry_time)
+        runs.append(run)
+    for index, (entry, position) in enumerate(heapq.merge(*runs, key=_entry_time)):
+        remap[position][entry["index"]] = index
+        entry["index"] = index
+        timeline.append(entry)
+
+    detections = DetectionRecords(results[0]["detections"].rules if results else ())
+    runs = []
+    for position, (label, result) in enumerate(zip(labels, results)):
+        records = result["detections"]
+        base = 0
+        if records.rules is not detections.rules and list(records.rules) != list(detections.rules):
+            base = len(detections.rules)
+            detections.rules = list(detections.rules) + list(records.rules)
+        run = zip(
+            [remap[position][index] for index in records.packet_index],
+            [index + base for index in records.rule_index],
+            records.packets,
+            repeat(label)
+        )
+        if reordered[position]:
+            # Packets of a re-sorted capture moved; stable, so a packet's detections keep rule order
+            run = sorted(run, key=itemgetter(0))
+        runs.append(run)
+    detection_files = []
+    for packet_index, rule_index, packet, label in heapq.merge(*runs, key=itemgetter(0)):
+        detections.add(packet_index, packet, rule_index)
+        detection_files.append(label)
+
+    if not compact_detections:
+        materialized = detections.materialize()
+        for detection, label in zip(materialized, detection_files):
+            detection["file"] = label
+        detections = materialized
+
+    return {
+        "summary": {
+            "total_packets": len(timeline),
+            "allow": action_count["ALLOW"],
+            "deny": action_count["DENY"],
+            "alert": action_count["ALERT"],
+            "speed_factor": speed,
+            "duration": (timeline[-1]["timestamp"] - timeline[0]["timestamp"]) if len(timeline) > 1 else 0.0
+        },
+        "timeline": timeline,
+        "detections": detections
+    }
+
+
+def simulate_pcap_batch(
+    inputs: List[Tuple[str, str]],
+    rules: List[Dict],
+    work_dir: str,
+    workers: Optional[int] = None,
+    engine: str = "python",
+    chunk_size: int = pcap_analysis.DEFAULT_CHUNK_SIZE,
+    speed: int = 1,
+    compact_detections: bool = False
+) -> Dict:
+    """
+    Simulate firewall behavior over several captures at once.
+
+    inputs:   (label, path) of pcap / pcapng files or zip / tar archives of them
+    work_dir: scratch directory for unpacked archive members
+    workers:  capture files analyzed concurrently (None = one per CPU)
+    compact_detections: combined detections as DetectionRecords
+
+    Returns:
+    {
+        "combined": simulate_pcap_flow-shaped result over all captures,
+        "files": [{"file", "format", "summary"} | {"file", "error"}, ...] in input order
+    }
+    """
+    expanded = expand_inputs(inputs, work_dir)
+    captures = [(label, path) for label, path, kind in expanded if kind]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(captures) or 1))
+
+    outcomes: List[Optional[Dict]] = []
+    errors: List[Optional[str]] = []
+
+    if workers == 1:
+        for _, path in captures:
+            try:
+                outcomes.append(_analyze_capture(path, rules, engine, chunk_size))
+                errors.append(None)
+            except Exception as e:
+                outcomes.append(None)
+                errors.append(str(e))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=site.addsitedir,
+            initargs=(_SIMULATOR_DIR,)
+        ) as pool:
+            futures = [
+                pool.submit(_analyze_capture, path, rules, engine, chunk_size)
+                for _, path in captures
+            ]
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                    errors.append(None)
+                except Exception as e:
+                    outcomes.append(None)
+                    errors.append(str(e))
+
+    files = []
+    labels = []
+    results = []
+    analyzed = zip(outcomes, errors)
+    for label, _, kind in expanded:
+        if not kind:
+            files.append({"file": label, "error": "Not a pcap / pcapng capture"})
+            continue
+        result, error = next(analyzed)
+        if result is None:
+            files.append({"file": label, "error": error})
+            continue
+        files.append({"file": label, "format": kind, "summary": result["summary"]})
+        labels.append(label)
+        results.append(result)
+
+    return {
+        "combined": merge_results(labels, results, speed, compact_detections),
+        "files": files
+    }
@@ -0,0 +1,494 @@
+# pcap_decoder.py
+# Lightweight pcap / pcapng decoder for H-SAFE (no scapy dissection)
+
+import struct
+from socket import inet_ntoa
+from typing import Iterator, List, Optional, Tuple, BinaryIO
+
+
+# =========================
+# FORMAT CONSTANTS
+# =========================
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+_VLAN_ETHERTYPES = {0x8100, 0x88A8, 0x9100}
+
+# EtherTypes that never carry IPv4 at the top level (dropped without scapy)
+_NON_IPV4_ETHERTYPES = {0x0806, 0x8035, 0x88CC, 0x8809, 0x888E, 0x88F7}
+
+# IP protocols / UDP ports that scapy dissects further into tunnelled layers.
+# Those frames go to the scapy fallback so results stay identical.
+_TUNNEL_IP_PROTOCOLS = {4, 41, 47, 51}
+_TUNNEL_UDP_PORTS = {434, 1701, 4754, 4789, 4790, 6633, 8472, 17754, 48879}
+
+IP_PROTOCOLS = {6: "TCP", 17: "UDP", 1: "ICMP"}
+
+# ICMP types whose header is exactly 8 bytes
+_ICMP_BASIC_TYPES = {0, 3, 4, 5, 8, 9, 10, 11, 12}
+
+# Bytes read from disk per refill in file mode
+READ_CHUNK_SIZE = 1 << 20
+
+_U16 = struct.Struct("!H")
+_U16_PAIR = struct.Struct("!HH")
+
+
+# =========================
+# ERRORS
+# =========================
+
+class CaptureFormatError(ValueError):
+    """Raised when the input is neither a pcap nor a pcapng capture, or is a malformed one."""
+
+
+class UnsupportedFrame(Exception):
+    """Raised when a frame needs full scapy dissection to be normalized."""
+
+
+# =========================
+# RECORD PARSER
+# =========================
+
+# A record is (file_offset, timestamp, linktype, data_start, data_end)
+RecordSpan = Tuple[int, float, int, int, int]
+
+
+def _unpack_at(fmt: str, buf, offset: int) -> tuple:
+    """
+    struct.unpack_from for record lookups at indexed offsets: an offset
+    past the buffer means the capture no longer matches its index.
+    """
+    try:
+        return struct.unpack_from(fmt, buf, offset)
+    except struct.error:
+        raise CaptureFormatError(f"Truncated capture record at offset {offset}") from None
+
+
+def _check_caplen(caplen: int, block_len: int, overhead: int) -> None:
+    """
+    Reject a packet block whose captured length runs past the block
+    (overhead = block bytes that are not packet data).
+    """
+    if caplen > block_len - overhead:
+        raise CaptureFormatError("pcapng packet data overruns its block")
+
+
+class CaptureParser:
+    """
+    Incremental pcap / pcapng record parser.
+
+    The parser only walks record and block headers; it never copies or
+    interprets packet payloads. It can be driven over a complete buffer
+    (next_record) or fed arbitrary chunks of a stream (feed).
+    """
+
+    def __init__(self):
+        self.kind: Optional[str] = None          # "pcap" | "pcapng"
+        self.linktype: Optional[int] = None      # pcap global link type
+        self._endian = "<"
+        self._ts_units = 10 ** 6                 # timestamp ticks per second
+        self._record_header: Optional[struct.Struct] = None
+        self._interfaces: List[Tuple[int, int, int]] = []   # (linktype, ts_units, ts_offset)
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+
+    # ---------------------
+    # Header handling
+    # ---------------------
+
+    def parse_header(self, buf, pos: int = 0) -> Optional[int]:
+        """
+        Parse the file header at pos.
+        Returns the offset of the first record, or None if more bytes are needed.
+        """
+        if len(buf) - pos < 4:
+            return None
+
+        magic_le = struct.unpack_from("<I", buf, pos)[0]
+
+        if magic_le == PCAPNG_SHB:
+            self.kind = "pcapng"
+            return pos
+
+        for endian in ("<", ">"):
+            magic = struct.unpack_from(endian + "I", buf, pos)[0]
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                if len(buf) - pos < 24:
+                    return None
+                self.kind = "pcap"
+                self._endian = endian
+                self._ts_units = 10 ** 6 if magic == PCAP_MAGIC_US else 10 ** 9
+                self._record_header = struct.Struct(endian + "IIII")
+                self.linktype = struct.unpack_from(endian + "I", buf, pos + 20)[0] & 0x0FFFFFFF
+                return pos + 24
+
+        raise CaptureFormatError("Unrecognized capture format (expected pcap or pcapng)")
+
+    # ---------------------
+    # Record iteration
+    # ---------------------
+
+    def next_record(self, buf, pos: int, end: int) -> Optional[Tuple[int, Optional[RecordSpan]]]:
+        """
+        Parse the next unit at pos.
+
+        Returns (next_pos, record) where record is None for pcapng blocks
+        that carry no packet, or None if buf[pos:end] holds an incomplete unit.
+        """
+        if self.kind == "pcap":
+            return self._next_pcap_record(buf, pos, end)
+        return self._next_pcapng_block(buf, pos, end)
+
+    def _next_pcap_record(self, buf, pos: int, end: int):
+        if end - pos < 16:
+            return None
+
+        ts_sec, ts_frac, caplen, _ = self._record_header.unpack_from(buf, pos)
+        data_start = pos + 16
+        data_end = data_start + caplen
+        if data_end > end:
+            return None
+
+        # Integer true division rounds once, like scapy's exact Decimal timestamps
+        timestamp = (ts_sec * self._ts_units + ts_frac) / self._ts_units
+        return data_end, (pos, timestamp, self.linktype, data_start, data_end)
+
+    def _next_pcapng_block(self, buf, pos: int, end: int):
+        if end - pos < 12:
+            return None
+
+        # The SHB type value is byte-order independent
+        block_type = struct.unpack_from(self._endian + "I", buf, pos)[0]
+
+        if block_type == PCAPNG_SHB:
+            order = struct.unpack_from("<I", buf, pos + 8)[0]
+            if order == PCAPNG_BYTE_ORDER_MAGIC:
+                self._endian = "<"
+            elif struct.unpack_from(">I", buf, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                self._endian = ">"
+            else:
+                raise CaptureFormatError("Invalid pcapng byte-order magic")
+            block_len = struct.unpack_from(self._endian + "I", buf, pos + 4)[0]
+            if end - pos < block_len:
+                return None
+            # A new section starts a new interface table
+            self._interfaces = []
+            return pos + block_len, None
+
+        block_len = struct.unpack_from(self._endian + "I", buf, pos + 4)[0]
+        if block_len < 12:
+            raise CaptureFormatError("Corrupt pcapng block length")
+        if end - pos < block_len:
+            return None
+
+        next_pos = pos + block_len
+        e = self._endian
+
+        if block_type == PCAPNG_EPB:
+            iface, ts_high, ts_low, caplen = struct.unpack_from(e + "IIII", buf, pos + 8)
+            linktype, ts_units, ts_offset = self._interface(iface)
+            data_start = pos + 28
+            _check_caplen(caplen, block_len, 32)
+            timestamp = ((ts_high << 32) | ts_low) / ts_units + ts_offset
+            return next_pos, (pos, timestamp, linktype, data_start, data_start + caplen)
+
+        if block_type == PCAPNG_SPB:
+            orig_len = struct.unpack_from(e + "I", buf, pos + 8)[0]
+            linktype = self._interface(0)[0]
+            data_start = pos + 12
+            caplen = min(orig_len, block_len - 16)
+            return next_pos, (pos, 0.0, linktype, data_start, data_start + caplen)
+
+        if block_type == PCAPNG_OPB:
+            iface, _, ts_high, ts_low, caplen = struct.unpack_from(e + "HHIII", buf, pos + 8)
+            linktype, ts_units, ts_offset = self._interface(iface)
+            data_start = pos + 28
+            _check_caplen(caplen, block_len, 32)
+            timestamp = ((ts_high << 32) | ts_low) / ts_units + ts_offset
+            return next_pos, (pos, timestamp, linktype, data_start, data_start + caplen)
+
+        if block_type == PCAPNG_IDB:
+            self._interfaces.append(self._parse_idb(buf, pos, block_len))
+
+        return next_pos, None
+
+    def _interface(self, iface: int) -> Tuple[int, int, int]:
+        """
+        (linktype, ts_units, ts_offset) of interface iface of the current section.
+        """
+        if iface >= len(self._interfaces):
+            raise CaptureFormatError(f"pcapng packet block names undeclared interface {iface}")
+        return self._interfaces[iface]
+
+    def _parse_idb(self, buf, pos: int, block_len: int) -> Tuple[int, int, int]:
+        e = self._endian
+        linktype = struct.unpack_from(e + "H", buf, pos + 8)[0]
+        ts_units = 10 ** 6
+        ts_offset = 0
+
+        opt = pos + 16
+        opt_end = pos + block_len - 4
+        while opt + 4 <= opt_end:
+            code, length = struct.unpack_from(e + "HH", buf, opt)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:          # if_tsresol
+                value = buf[opt + 4]
+                ts_units = 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+            elif code == 14 and length >= 8:       # if_tsoffset
+                ts_offset = struct.unpack_from(e + "q", buf, opt + 4)[0]
+            opt += 4 + ((length + 3) & ~3)
+
+        return linktype, ts_units, ts_offset
+
+    def interface_at(self, buf, offset: int) -> Tuple[int, int, int]:
+        """
+        (linktype, ts_units, ts_offset) of the packet record at a known
+        offset, from the current section's interfaces (pcap: the file header).
+        """
+        if self.kind == "pcap":
+            return self.linktype, self._ts_units, 0
+        e = self._endian
+        block_type = _unpack_at(e + "I", buf, offset)[0]
+        if block_type == PCAPNG_EPB:
+            return self._interface(_unpack_at(e + "I", buf, offset + 8)[0])
+        if block_type == PCAPNG_OPB:
+            return self._interface(_unpack_at(e + "H", buf, offset + 8)[0])
+        return self._interface(0)
+
+    def timestamp_at(self, buf, offset: int, ts_units: int, ts_offset: int) -> float:
+        """
+        Timestamp of the packet record at a known offset, computed exactly
+        as next_record() computes it.
+        """
+        e = self._endian
+        if self.kind == "pcap":
+            ts_sec, ts_frac = _unpack_at(e + "II", buf, offset)
+            return (ts_sec * ts_units + ts_frac) / ts_units
+        block_type = _unpack_at(e + "I", buf, offset)[0]
+        if block_type == PCAPNG_SPB:
+            return 0.0
+        ts_high, ts_low = _unpack_at(e + "II", buf, offset + 12)
+        return ((ts_high << 32) | ts_low) / ts_units + ts_offset
+
+    def data_span(self, buf, offset: int) -> Tuple[int, int]:
+        """
+        Return (data_start, data_end) of the packet record at a known offset.
+        """
+        e = self._endian
+        if self.kind == "pcap":
+            caplen = _unpack_at(e + "I", buf, offset + 8)[0]
+            return offset + 16, offset + 16 + caplen
+
+        block_type, block_len = _unpack_at(e + "II", buf, offset)
+        if block_type == PCAPNG_SPB:
+            orig_len = _unpack_at(e + "I", buf, offset + 8)[0]
+            return offset + 12, offset + 12 + min(orig_len, block_len - 16)
+
+        caplen = _unpack_at(e + "I", buf, offset + 20)[0]
+        _check_caplen(caplen, block_len, 32)
+        return offset + 28, offset + 28 + caplen
+
+    # ---------------------
+    # Streaming input
+    # ---------------------
+
+    def feed(self, data: bytes) -> List[Tuple[int, float, int, bytes]]:
+        """
+        Append stream bytes and return every record completed by them as
+        (file_offset, timestamp, linktype, frame_bytes).
+        """
+        self._buffer += data
+        buf = self._buffer
+        end = len(buf)
+        pos = 0
+        records = []
+
+        if self.kind is None:
+            first = self.parse_header(buf, 0)
+            if first is None:
+                return records
+            pos = first
+
+        while True:
+            step = self.next_record(buf, pos, end)
+            if step is None:
+                break
+            pos, record = step
+            if record is not None:
+                offset, timestamp, linktype, start, stop = record
+                records.append((offset + self._buffer_offset, timestamp, linktype, bytes(buf[start:stop])))
+
+        del buf[:pos]
+        self._buffer_offset += pos
+        return records
+
+
+def iter_records(fileobj: BinaryIO, read_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[int, float, int, bytes]]:
+    """
+    Yield (file_offset, timestamp, linktype, frame_bytes) for every packet
+    record in a pcap or pcapng stream. A truncated trailing record is ignored.
+    """
+    parser = CaptureParser()
+    while True:
+        chunk = fileobj.read(read_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+
+    if parser.kind is None:
+        raise CaptureFormatError("Empty or truncated capture header")
+
+
+def sniff_format(file_path: str) -> Optional[str]:
+    """
+    Return "pcap" or "pcapng" for a supported capture, otherwise None.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(24)
+    try:
+        parser = CaptureParser()
+        if parser.parse_header(head) is None:
+            return None
+        return parser.kind
+    except CaptureFormatError:
+        return None
+
+
+# =========================
+# HEADER DECODING
+# =========================
+
+# Decoded headers: (src_ip, dst_ip, protocol, src_port, dst_port)
+Headers = Tuple[str, str, str, Optional[int], Optional[int]]
+
+
+def _decode_ipv4(data, off: int) -> Optional[Headers]:
+    n = len(data)
+    if n - off < 20:
+        return None
+
+    ihl = (data[off] & 0x0F) * 4
+    if ihl < 20 or n - off < ihl:
+        raise UnsupportedFrame("Malformed IPv4 header")
+
+    total_len, _, frag = struct.unpack_from("!HHH", data, off + 2)
+    proto = data[off + 9]
+
+    if proto in _TUNNEL_IP_PROTOCOLS:
+        raise UnsupportedFrame("Tunnelled IPv4 payload")
+
+    # Non-first fragments carry no transport header
+    if frag & 0x1FFF:
+        return None
+
+    protocol = IP_PROTOCOLS.get(proto)
+    if protocol is None:
+        return None
+
+    start = off + ihl
+    # Mirror scapy: the IP total length bounds the payload unless it is too short
+    stop = off + total_len if total_len >= ihl else n
+    if stop > n:
+        stop = n
+    available = stop - start
+
+    src_ip = inet_ntoa(data[off + 12:off + 16])
+    dst_ip = inet_ntoa(data[off + 16:off + 20])
+
+    if protocol == "TCP":
+        if available < 20:
+            raise UnsupportedFrame("Truncated TCP header")
+        src_port, dst_port = _U16_PAIR.unpack_from(data, start)
+        return src_ip, dst_ip, "TCP", src_port, dst_port
+
+    if protocol == "UDP":
+        if available < 8:
+            raise UnsupportedFrame("Truncated UDP header")
+        src_port, dst_port = _U16_PAIR.unpack_from(data, start)
+        if src_port in _TUNNEL_UDP_PORTS or dst_port in _TUNNEL_UDP_PORTS:
+            raise UnsupportedFrame("Tunnelled UDP payload")
+        return src_ip, dst_ip, "UDP", src_port, dst_port
+
+    # Other ICMP types have type-specific header fields left to scapy
+    if available < 8 or data[start] not in _ICMP_BASIC_TYPES:
+        raise UnsupportedFrame("Truncated or extended ICMP header")
+    return src_ip, dst_ip, "ICMP", None, None
+
+
+def _decode_ethertype(ethertype: int, data, off: int) -> Optional[Headers]:
+    if ethertype == ETHERTYPE_IPV4:
+        return _decode_ipv4(data, off)
+
+    if ethertype == ETHERTYPE_IPV6:
+        # IPv4-in-IPv6 still exposes an IP layer to scapy
+        if len(data) - off >= 40 and data[off + 6] in _TUNNEL_IP_PROTOCOLS:
+            raise UnsupportedFrame("Tunnelled IPv6 payload")
+        return None
+
+    if ethertype in _NON_IPV4_ETHERTYPES:
+        return None
+
+    raise UnsupportedFrame(f"Unhandled EtherType 0x{ethertype:04x}")
+
+
+def decode_frame(linktype: int, data) -> Optional[Headers]:
+    """
+    Decode link, network and transport headers of a captured frame.
+
+    Returns (src_ip, dst_ip, protocol, src_port, dst_port) for TCP / UDP / ICMP
+    over IPv4, None for traffic the simulator does not model, and raises
+    UnsupportedFrame when the frame needs full scapy dissection.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        off = 14
+        ethertype = _U16.unpack_from(data, 12)[0]
+        while ethertype in _VLAN_ETHERTYPES:
+            if len(data) < off + 4:
+                return None
+            ethertype = _U16.unpack_from(data, off + 2)[0]
+            off += 4
+        return _decode_ethertype(ethertype, data, off)
+
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        if not len(data):
+            return None
+        version = data[0] >> 4
+        if version == 4:
+            return _decode_ipv4(data, 0)
+        if version == 6 and linktype == LINKTYPE_RAW:
+            return _decode_ethertype(ETHERTYPE_IPV6, data, 0)
+        raise UnsupportedFrame("Unknown raw IP version")
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        return _decode_ethertype(_U16.unpack_from(data, 14)[0], data, 16)
+
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None
+        return _decode_ethertype(_U16.unpack_from(data, 0)[0], data, 20)
+
+    raise UnsupportedFrame(f"Unhandled link type {linktype}")
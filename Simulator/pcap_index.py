@@ -0,0 +1,361 @@
+# pcap_index.py
+# Memory-mapped capture reader with a persistent record offset index for H-SAFE
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pcap_decoder import CaptureParser, CaptureFormatError
+
+
+# =========================
+# SIDECAR FORMAT
+# =========================
+
+INDEX_SUFFIX = ".idx"
+
+_INDEX_MAGIC = b"HSAFEIDX"
+_INDEX_VERSION = 3       # v3: interfaces carry integer timestamp units
+_HEADER = struct.Struct("<8sII")      # magic, version, metadata length
+
+
+def index_path_for(capture_path: str) -> str:
+    """
+    Sidecar index location for a capture file.
+    """
+    return capture_path + INDEX_SUFFIX
+
+
+def _source_signature(capture_path: str) -> Tuple[int, int]:
+    stat = os.stat(capture_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# =========================
+# OFFSET INDEX
+# =========================
+
+class PcapIndex:
+    """
+    Compact per-record index of a capture.
+
+    offsets:       file offset of each packet record (array 'Q')
+    timestamps:    capture timestamp of each record, rounded to nanoseconds
+                   (array 'Q'); search keys only, emitted timestamps are
+                   decoded from the record header
+    interface_ids: position in interfaces of each record's interface (array 'H')
+    interfaces:    distinct (linktype, ts_units, ts_offset) of the capture
+    monotonic:     timestamps never decrease, so time windows can be binary-searched
+    """
+
+    def __init__(self, kind: str, endian: str, linktype: Optional[int]):
+        self.kind = kind
+        self.endian = endian
+        self.linktype = linktype
+        self.offsets = array("Q")
+        self.timestamps = array("Q")
+        self.interface_ids = array("H")
+        self.interfaces: List[Tuple[int, int, int]] = []
+        self.source_size = 0
+        self.source_mtime_ns = 0
+        self.monotonic = True
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def parser(self) -> CaptureParser:
+        """
+        A CaptureParser primed with this capture's framing parameters.
+        """
+        parser = CaptureParser()
+        parser.kind = self.kind
+        parser.linktype = self.linktype
+        parser._endian = self.endian
+        return parser
+
+    # ---------------------
+    # Build
+    # ---------------------
+
+    @classmethod
+    def build(cls, buf) -> "PcapIndex":
+        """
+        Scan record headers in buf (bytes / mmap) without touching payloads.
+        """
+        parser = CaptureParser()
+        pos = parser.parse_header(buf, 0)
+        if pos is None:
+            raise CaptureFormatError("Empty or truncated capture header")
+
+        index = cls(parser.kind, parser._endian, parser.linktype)
+        offsets = index.offsets
+        timestamps = index.timestamps
+        interface_ids = index.interface_ids
+        interface_at = parser.interface_at
+        interfaces: Dict[Tuple[int, int, int], int] = {}
+        end = len(buf)
+
+        while True:
+            step = parser.next_record(buf, pos, end)
+            if step is None:
+                break
+            pos, record = step
+            if record is None:
+                continue
+            offset, timestamp, _, _, _ = record
+            offsets.append(offset)
+            timestamps.append(_to_ns(timestamp))
+            interface = interface_at(buf, offset)
+            interface_ids.append(interfaces.setdefault(interface, len(interfaces)))
+
+        index.interfaces = list(interfaces)
+
+        # pcapng sections may switch byte order; keep the one in effect
+        index.endian = parser._endian
+        index.monotonic = _is_monotonic(timestamps)
+        return index
+
+    # ---------------------
+    # Persistence
+    # ---------------------
+
+    def save(self, path: str) -> None:
+        metadata = json.dumps({
+            "kind": self.kind,
+            "endian": self.endian,
+            "linktype": self.linktype,
+            "count": len(self),
+            "source_size": self.source_size,
+            "source_mtime_ns": self.source_mtime_ns,
+            "monotonic": self.monotonic,
+            "interfaces": self.interfaces
+        }).encode("utf-8")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, len(metadata)))
+            f.write(metadata)
+            self.offsets.tofile(f)
+            self.timestamps.tofile(f)
+            self.interface_ids.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PcapIndex"]:
+        """
+        Load a sidecar index. Returns None if it is missing or unreadable.
+        """
+        try:
+            with open(path, "rb") as f:
+                magic, version, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+                    return None
+                metadata = json.loads(f.read(meta_len).decode("utf-8"))
+
+                index = cls(metadata["kind"], metadata["endian"], metadata["linktype"])
+                index.source_size = metadata["source_size"]
+                index.source_mtime_ns = metadata["source_mtime_ns"]
+                count = metadata["count"]
+                index.offsets.fromfile(f, count)
+                index.timestamps.fromfile(f, count)
+                index.interface_ids.fromfile(f, count)
+                index.interfaces = [tuple(interface) for interface in metadata["interfaces"]]
+                index.monotonic = metadata.get("monotonic")
+                if index.monotonic is None:
+                    index.monotonic = _is_monotonic(index.timestamps)
+                return index
+        except (OSError, EOFError, ValueError, KeyError, struct.error):
+            return None
+
+    def matches(self, capture_path: str) -> bool:
+        """
+        True if the index was built from the capture as it is on disk now.
+        """
+        return (self.source_size, self.source_mtime_ns) == _source_signature(capture_path)
+
+    # ---------------------
+    # Time windows
+    # ---------------------
+
+    def time_range(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Record range [start, stop) holding every packet captured in
+        [start_ts, end_ts), found by binary search over the timestamps.
+
+        Out-of-order captures cannot be searched; the whole capture is
+        returned and records must be checked one by one. Keys are rounded
+        to nanoseconds: MappedCapture.time_range settles records on the
+        boundary nanoseconds by their exact timestamps.
+        """
+        if not self.monotonic:
+            return 0, len(self)
+        start = 0 if start_ts is None else bisect_left(self.timestamps, _to_ns(start_ts))
+        stop = len(self) if end_ts is None else bisect_left(self.timestamps, _to_ns(end_ts))
+        return start, max(start, stop)
+
+
+def _to_ns(timestamp: float) -> int:
+    return max(0, int(round(timestamp * 1e9)))
+
+
+def _is_monotonic(timestamps: array) -> bool:
+    return all(a <= b for a, b in zip(timestamps, timestamps[1:]))
+
+
+def load_or_build_index(capture_path: str, buf=None, persist: bool = True) -> PcapIndex:
+    """
+    Return a valid index for capture_path, rebuilding the sidecar if it is stale.
+    """
+    sidecar = index_path_for(capture_path)
+    index = PcapIndex.load(sidecar)
+    if index is not None and index.matches(capture_path):
+        return index
+
+    if buf is None:
+        with open(capture_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                index = PcapIndex.build(mapped)
+    else:
+        index = PcapIndex.build(buf)
+
+    index.source_size, index.source_mtime_ns = _source_signature(capture_path)
+    if persist:
+        try:
+            index.save(sidecar)
+        except OSError:
+            pass  # Read-only location: the in-memory index is still usable
+
+    return index
+
+
+def remove_index(capture_path: str) -> None:
+    """
+    Delete the sidecar index of a capture, if any.
+    """
+    sidecar = index_path_for(capture_path)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
+
+
+# =========================
+# MEMORY-MAPPED READER
+# =========================
+
+class MappedCapture:
+    """
+    Zero-copy random access to the packet records of a capture.
+
+    Frames are exposed as memoryview slices of the mapping. A slice yielded by
+    iter_frames is only valid until the iterator advances.
+    """
+
+    def __init__(self, capture_path: str, persist_index: bool = True):
+        self.path = capture_path
+        self._file = open(capture_path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise CaptureFormatError("Empty capture file")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        self._view = memoryview(self._mmap)
+        self.index = load_or_build_index(capture_path, self._mmap, persist=persist_index)
+        self._parser = self.index.parser()
+        # File offset just past the last frame iter_frames yielded
+        self.bytes_read = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __enter__(self) -> "MappedCapture":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self._mmap.close()
+            self._file.close()
+
+    def timestamp(self, i: int) -> float:
+        """
+        Exact timestamp of record i, as the sequential readers decode it.
+        """
+        linktype, ts_units, ts_offset = self.index.interfaces[self.index.interface_ids[i]]
+        return self._parser.timestamp_at(self._mmap, self.index.offsets[i], ts_units, ts_offset)
+
+    def time_range(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Tuple[int, int]:
+        """
+        PcapIndex.time_range, exact: every record in the range has a
+        timestamp in [start_ts, end_ts) (monotonic captures).
+        """
+        start, stop = self.index.time_range(start_ts, end_ts)
+        if not self.index.monotonic:
+            return start, stop
+        if start_ts is not None:
+            while start < stop and self.timestamp(start) < start_ts:
+                start += 1
+        if end_ts is not None:
+            while stop < len(self) and self.timestamp(stop) < end_ts:
+                stop += 1
+        return start, stop
+
+    def frame(self, i: int) -> memoryview:
+        """
+        Memoryview of record i's captured bytes (no copy).
+        """
+        start, stop = self._parser.data_span(self._mmap, self.index.offsets[i])
+        return self._view[start:stop]
+
+    def iter_frames(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None
+    ) -> Iterator[Tuple[float, int, memoryview]]:
+        """
+        Yield (timestamp, linktype, frame) for records in [start, stop),
+        limited to packets captured in [start_ts, end_ts) when given.
+        """
+        index = self.index
+        if stop is None or stop > len(index):
+            stop = len(index)
+
+        windowed = start_ts is not None or end_ts is not None
+        if windowed:
+            first, last = self.time_range(start_ts, end_ts)
+            start = max(start, first)
+            stop = min(stop, last)
+            # Binary search already bounds a monotonic capture exactly
+            windowed = not index.monotonic
+
+        data_span = self._parser.data_span
+        timestamp_at = self._parser.timestamp_at
+        interfaces = index.interfaces
+        interface_ids = index.interface_ids
+        buf = self._mmap
+        view = self._view
+        for i in range(start, stop):
+            offset = index.offsets[i]
+            linktype, ts_units, ts_offset = interfaces[interface_ids[i]]
+            timestamp = timestamp_at(buf, offset, ts_units, ts_offset)
+            if windowed:
+                if (start_ts is not None and timestamp < start_ts) or (end_ts is not None and timestamp >= end_ts):
+                    continue
+            begin, end = data_span(buf, offset)
+            self.bytes_read = end
+            frame = view[begin:end]
+            try:
+                yield timestamp, linktype, frame
+            finally:
+                frame.release()
@@ -0,0 +1,133 @@
+# pcap_parallel.py
+# Multi-process PCAP parsing + rule evaluation for H-SAFE
+
+import os
+import site
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import pcap_analysis
+import pcap_decoder
+import pcap_index
+from flow_table import merge_flows
+from packet_filter import resolve_filter
+
+
+# =========================
+# RANGE PLANNING
+# =========================
+
+# Captures with fewer records are analyzed serially (process startup dominates)
+PARALLEL_MIN_PACKETS = 50000
+
+# Ranges per worker, so one slow range does not hold up the whole pool
+RANGES_PER_WORKER = 4
+
+_SIMULATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _range_bytes(index: pcap_index.PcapIndex, start: int, stop: int, file_size: int) -> int:
+    """
+    Capture bytes spanned by records [start, stop).
+    """
+    end = index.offsets[stop] if stop < len(index) else file_size
+    return end - index.offsets[start]
+
+
+def plan_ranges(record_count: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split record indices [0, record_count) into at most parts contiguous,
+    near-equal [start, stop) ranges.
+    """
+    parts = max(1, min(parts, record_count))
+    step, extra = divmod(record_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + step + (1 if i < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+# =========================
+# PARALLEL SIMULATION
+# =========================
+
+def simulate_pcap_flow_parallel(
+    pcap_path: str,
+    rules: List[Dict],
+    speed: int = 1,
+    workers: Optional[int] = None,
+    chunk_size: int = pcap_analysis.DEFAULT_CHUNK_SIZE,
+    engine: str = "python",
+    aggregate_flows: bool = False,
+    min_packets: Optional[int] = None,
+    packet_filter=None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    compact_detections: bool = False,
+    progress: Optional["pcap_analysis.AnalysisProgress"] = None
+) -> Optional[Dict]:
+    """
+    simulate_pcap_flow over record-aligned ranges in a process pool.
+
+    Ranges come from the sidecar offset index and are merged back in
+    capture order; timeline, detections and summary equal the sequential
+    run's (tests/test_parallel.py). Returns None when the capture should be
+    analyzed serially instead (fewer than min_packets records, default
+    PARALLEL_MIN_PACKETS, a single worker, or a format the native reader
+    cannot index). progress advances as each range completes.
+    """
+    if min_packets is None:
+        min_packets = PARALLEL_MIN_PACKETS
+    workers = workers or os.cpu_count() or 1
+    packet_filter = resolve_filter(packet_filter)
+    if workers < 2 or not pcap_decoder.sniff_format(pcap_path):
+        return None
+
+    with pcap_index.MappedCapture(pcap_path) as capture:
+        index = capture.index
+        first, last = capture.time_range(start_ts, end_ts)
+    if last - first < max(min_packets, 2):
+        return None
+
+    ranges = [
+        (first + start, first + stop)
+        for start, stop in plan_ranges(last - first, workers * RANGES_PER_WORKER)
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)),
+        initializer=site.addsitedir,
+        initargs=(_SIMULATOR_DIR,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                pcap_analysis.analyze_pcap_range, pcap_path, start, stop, rules, chunk_size, engine, aggregate_flows,
+                packet_filter, start_ts, end_ts
+            )
+            for start, stop in ranges
+        ]
+        if progress is not None:
+            spans = {
+                future: _range_bytes(index, start, stop, os.path.getsize(pcap_path))
+                for future, (start, stop) in zip(futures, ranges)
+            }
+            for future in as_completed(futures):
+                part = future.result()
+                progress.update(
+                    bytes_parsed=progress.bytes_parsed + spans[future],
+                    packets_evaluated=progress.packets_evaluated + len(part["timeline"])
+                )
+            # Ranges leave out the capture header
+            progress.update(bytes_parsed=progress.bytes_total)
+        parts = [future.result() for future in futures]
+
+    flow_result = pcap_analysis.FlowResult(speed, compact_detections)
+    for part in parts:
+        flow_result.add(part, reindex=True)
+
+    flows = merge_flows(part["flows"] for part in parts) if aggregate_flows else None
+    return flow_result.result(flows)
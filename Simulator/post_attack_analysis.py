@@ -1,10 +1,15 @@
 # post_attack_analysis.py
 # Post-event intelligence and correlation for H-SAFE Firewall Simulator
 
-from typing import Dict, List
-from collections import defaultdict
+import math
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Union
+from collections import Counter, defaultdict, deque
+
+import numpy as np
 
 from schema import Detection
+from detection_records import DetectionRecords
+from sketches import HyperLogLog, SpaceSaving
 
 
 # =========================
@@ -20,13 +25,537 @@ def _max_severity(severities: List[str]) -> str:
     return max(severities, key=lambda s: _SEVERITY_ORDER.index(s))
 
 
+def _detection_fields(
+    detections: Union[List[Detection], DetectionRecords]
+) -> Iterator[Tuple[str, str, str, float, str]]:
+    """
+    (rule_id, severity, action, timestamp, dst_ip) per detection, read
+    straight from the rule table for DetectionRecords (no Detection dicts).
+    timestamp is the capture time of the detected packet, not the time of
+    the analysis (Detection["timestamp"]).
+    """
+    if isinstance(detections, DetectionRecords):
+        rules = detections.rules
+        for rule_index, packet in zip(detections.rule_index, detections.packets):
+            rule = rules[rule_index]
+            yield rule["rule_id"], rule["severity"], rule["action"], packet["timestamp"], packet["dst_ip"]
+        return
+
+    for d in detections:
+        yield d["rule_id"], d["severity"], d["action"], d["packet"]["timestamp"], d["packet"]["dst_ip"]
+
+
+# =========================
+# TIME SERIES
+# =========================
+
+_ACTIONS = ("ALLOW", "DENY", "ALERT")
+_ACTION_CODES = {action: code for code, action in enumerate(_ACTIONS)}
+
+# Columns of a series row: packets, bytes, then one count per action
+_PACKETS, _BYTES = 0, 1
+_MEASURES = 2 + len(_ACTIONS)
+
+# Upper bound on buckets per series; wider buckets are used beyond it
+MAX_BUCKETS = 10000
+
+_ALL = ("all", "")
+
+
+def _rebin(low: int, rows: np.ndarray, factor: int) -> Tuple[int, np.ndarray]:
+    """
+    Sum rows of buckets [low, low + len(rows)) into buckets factor times wider.
+    """
+    target = np.arange(low, low + len(rows)) // factor
+    merged = np.zeros((int(target[-1] - target[0]) + 1, _MEASURES), dtype=np.int64)
+    np.add.at(merged, target - target[0], rows)
+    return int(target[0]), merged
+
+
+class _TimeSeries:
+    """
+    Packets / bytes / action histograms per time bucket, overall and by
+    lane and protocol. Buckets are aligned to multiples of their width,
+    which is widened (by powers of two times bucket_seconds) to stay within
+    MAX_BUCKETS. Power-of-two factors divide one another, so merged series
+    end at the width one pass over all of their entries would use.
+    """
+
+    def __init__(self, bucket_seconds: float = 1.0):
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        self.bucket_seconds = float(bucket_seconds)
+        self.factor = 1
+        self.low: Optional[int] = None  # Bucket number of row 0
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        # ("all", "") / ("lane", name) / ("protocol", name) -> (buckets, _MEASURES)
+        self.series: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def _base_bucket(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.bucket_seconds)
+
+    def _fit(self, first: float, last: float, step: int = 1) -> None:
+        """
+        Widen / extend the rows to cover [first, last], with the smallest
+        power-of-two factor that is at least step and the current factor.
+        """
+        if self.low is not None:
+            first = min(first, self.first_timestamp)
+            last = max(last, self.last_timestamp)
+        self.first_timestamp, self.last_timestamp = first, last
+
+        base_low, base_high = self._base_bucket(first), self._base_bucket(last)
+        factor = max(step, self.factor)
+        while base_high // factor - base_low // factor + 1 > MAX_BUCKETS:
+            factor *= 2
+
+        if self.low is not None and factor != self.factor:
+            for key, rows in self.series.items():
+                low, self.series[key] = _rebin(self.low, rows, factor // self.factor)
+            self.low = low
+        self.factor = factor
+
+        low, high = base_low // factor, base_high // factor
+        if self.low is None:
+            self.low = low
+        length = high - low + 1
+        for key, rows in self.series.items():
+            before = self.low - low
+            after = length - before - len(rows)
+            if before or after:
+                self.series[key] = np.pad(rows, ((before, after), (0, 0)))
+        self.low = low
+        self.length = length
+
+    def _add(self, key: Tuple[str, str], offset: int, rows: np.ndarray) -> None:
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = np.zeros((self.length, _MEASURES), dtype=np.int64)
+        series[offset:offset + len(rows)] += rows
+
+    def update(self, timeline: List[Dict]) -> None:
+        """
+        Add timeline entries (one vectorized pass per chunk).
+        """
+        count = len(timeline)
+        if not count:
+            return
+
+        timestamps = np.fromiter((e["timestamp"] for e in timeline), dtype=np.float64, count=count)
+        sizes = np.fromiter((e.get("payload_size", 0) for e in timeline), dtype=np.float64, count=count)
+        codes = np.fromiter((_ACTION_CODES[e["action"]] for e in timeline), dtype=np.int64, count=count)
+
+        self._fit(float(timestamps.min()), float(timestamps.max()))
+        bucket = np.floor(timestamps / self.bucket_seconds).astype(np.int64) // self.factor
+        chunk_low = int(bucket.min())
+        bucket -= chunk_low
+        span = int(bucket.max()) + 1
+        offset = chunk_low - self.low
+
+        groups = [(_ALL, None)]
+        for field in ("lane", "protocol"):
+            names, inverse = np.unique(np.asarray([e[field] for e in timeline]), return_inverse=True)
+            groups.append(((field, names), inverse.reshape(-1)))
+
+        for group, inverse in groups:
+            if inverse is None:
+                keys, cell = [group], bucket
+            else:
+                field, names = group
+                keys, cell = [(field, str(name)) for name in names], inverse * span + bucket
+            cells = len(keys) * span
+
+            rows = np.empty((cells, _MEASURES), dtype=np.int64)
+            rows[:, _PACKETS] = np.bincount(cell, minlength=cells)
+            rows[:, _BYTES] = np.rint(np.bincount(cell, weights=sizes, minlength=cells))
+            rows[:, _BYTES + 1:] = np.bincount(
+                cell * len(_ACTIONS) + codes, minlength=cells * len(_ACTIONS)
+            ).reshape(cells, len(_ACTIONS))
+
+            for i, key in enumerate(keys):
+                self._add(key, offset, rows[i * span:(i + 1) * span])
+
+    def merge(self, other: "_TimeSeries") -> None:
+        if other.bucket_seconds != self.bucket_seconds:
+            raise ValueError("Cannot merge time series of different bucket widths")
+        if other.low is None:
+            return
+
+        self._fit(other.first_timestamp, other.last_timestamp, step=other.factor)
+        for key, rows in other.series.items():
+            low = other.low
+            if self.factor != other.factor:
+                low, rows = _rebin(low, rows, self.factor // other.factor)
+            self._add(key, low - self.low, rows)
+
+    def _columns(self, rows: np.ndarray) -> Dict:
+        return {
+            "packets": rows[:, _PACKETS].tolist(),
+            "bytes": rows[:, _BYTES].tolist(),
+            "actions": {
+                action: rows[:, _BYTES + 1 + code].tolist()
+                for action, code in _ACTION_CODES.items()
+            }
+        }
+
+    def result(self) -> Dict:
+        """
+        Columnar lists aligned with "timestamps" (bucket starts).
+        """
+        width = self.bucket_seconds * self.factor
+        if self.low is None:
+            return {
+                "bucket_seconds": width,
+                "start": None,
+                "timestamps": [],
+                "packets": [],
+                "bytes": [],
+                "actions": {action: [] for action in _ACTIONS},
+                "by_lane": {},
+                "by_protocol": {}
+            }
+
+        return {
+            "bucket_seconds": width,
+            "start": self.low * width,
+            "timestamps": (width * np.arange(self.low, self.low + self.length)).tolist(),
+            **self._columns(self.series[_ALL]),
+            "by_lane": {
+                name: self._columns(self.series[("lane", name)])
+                for field, name in sorted(self.series) if field == "lane"
+            },
+            "by_protocol": {
+                name: self._columns(self.series[("protocol", name)])
+                for field, name in sorted(self.series) if field == "protocol"
+            }
+        }
+
+
+def build_time_series(timeline: List[Dict], bucket_seconds: float = 1.0) -> Dict:
+    """
+    Packets, bytes and verdicts per time bucket, overall and by lane /
+    protocol, as columnar lists aligned with "timestamps" (bucket starts).
+
+    Buckets are aligned to multiples of bucket_seconds; the width is
+    widened to a power-of-two multiple of it if the run would need more
+    than MAX_BUCKETS.
+    """
+    series = _TimeSeries(bucket_seconds)
+    series.update(timeline)
+    return series.result()
+
+
+# =========================
+# TOP-N / DISTINCT COUNTS
+# =========================
+
+AGGREGATION_MODES = ("auto", "exact", "sketch")
+
+# "auto" keeps exact counters up to this many packets, sketches beyond
+EXACT_MAX_PACKETS = 100000
+
+# Default error bounds of the sketch mode
+TOP_ERROR = 0.001       # Space-Saving: hits overestimated by at most 0.1% of the total
+DISTINCT_ERROR = 0.01   # HyperLogLog: ~1% relative standard error
+
+_TOP_N = 5
+
+# Sketch mode keeps the first and the last this many critical events for
+# the critical timeline (critical_events_total still counts all of them)
+CRITICAL_EVENTS_KEPT = 500
+
+# Fields counted for top-N ("rule_id" comes from detections) / distinct counts
+_TOP_FIELDS = ("dst_ip", "src_ip", "rule_id")
+_DISTINCT_FIELDS = ("src_ip", "dst_ip", "dst_port")
+
+
+def _resolve_aggregation(aggregation: str, packet_count: int) -> str:
+    if aggregation not in AGGREGATION_MODES:
+        raise ValueError(f"Unknown aggregation mode: {aggregation!r}")
+    if aggregation == "auto":
+        return "exact" if packet_count <= EXACT_MAX_PACKETS else "sketch"
+    return aggregation
+
+
+def _top_entries(top: List[Tuple[Hashable, int, int]], name: str, mode: str) -> List[Dict]:
+    if mode == "exact":
+        return [{name: value, "hits": hits} for value, hits, _ in top]
+    return [
+        {name: value, "hits": hits, "max_overestimate": error}
+        for value, hits, error in top
+    ]
+
+
+# =========================
+# INCREMENTAL AGGREGATION
+# =========================
+
+class ReportAggregator:
+    """
+    Incremental form of analyze_firewall_run.
+
+    update() takes {"timeline": [...], "detections": [...]} chunks (a
+    simulation result or one chunk / worker part of it; detections may be
+    DetectionRecords), merge() folds in
+    an aggregator built over other chunks, and finalize() returns the
+    report. Chunks may be processed in any order; the critical timeline
+    follows the order chunks were added / merged.
+
+    aggregation="auto" counts exactly until EXACT_MAX_PACKETS packets have
+    been seen, then converts to sketches. In sketch mode the critical
+    timeline keeps only the first and last CRITICAL_EVENTS_KEPT events.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: float = 1.0,
+        aggregation: str = "auto",
+        top_error: float = TOP_ERROR,
+        distinct_error: float = DISTINCT_ERROR
+    ):
+        _resolve_aggregation(aggregation, 0)
+        self.aggregation = aggregation
+        self.mode = "sketch" if aggregation == "sketch" else "exact"
+        self.top_error = top_error
+        self.distinct_error = distinct_error
+
+        self.packets = 0
+        self.action_counts = defaultdict(int)
+        self.protocol_counts = defaultdict(int)
+        self.lane_counts = defaultdict(int)
+        self.rule_hits = defaultdict(int)
+        self.severity_hits = defaultdict(int)
+        # critical_events, then critical_tail once it holds CRITICAL_EVENTS_KEPT in sketch mode
+        self.critical_events: List[Dict] = []
+        self.critical_tail: deque = deque(maxlen=CRITICAL_EVENTS_KEPT)
+        self.critical_total = 0
+        self.time_series = _TimeSeries(bucket_seconds)
+
+        # exact: Counter / set per field; sketch: SpaceSaving / HyperLogLog
+        self.top: Dict[str, object] = {}
+        self.distinct: Dict[str, object] = {}
+        if self.mode == "sketch":
+            self._to_sketch()
+        else:
+            self.top = {field: Counter() for field in _TOP_FIELDS}
+            self.distinct = {"dst_port": set()}
+
+    def _sketches(self) -> Tuple[Dict[str, SpaceSaving], Dict[str, HyperLogLog]]:
+        return (
+            {field: SpaceSaving.for_error(self.top_error) for field in _TOP_FIELDS},
+            {field: HyperLogLog.for_error(self.distinct_error) for field in _DISTINCT_FIELDS}
+        )
+
+    def _exact_as_sketches(self) -> Tuple[Dict[str, SpaceSaving], Dict[str, HyperLogLog]]:
+        top, distinct = self._sketches()
+        for field, counter in self.top.items():
+            for value, hits in counter.items():
+                top[field].add(value, hits)
+        distinct["src_ip"].update(self.top["src_ip"].keys())
+        distinct["dst_ip"].update(self.top["dst_ip"].keys())
+        distinct["dst_port"].update(self.distinct["dst_port"])
+        return top, distinct
+
+    def _to_sketch(self) -> None:
+        if self.top:
+            self.top, self.distinct = self._exact_as_sketches()
+        else:
+            self.top, self.distinct = self._sketches()
+        self.mode = "sketch"
+        self.critical_tail.extend(self.critical_events[CRITICAL_EVENTS_KEPT:])
+        del self.critical_events[CRITICAL_EVENTS_KEPT:]
+
+    def _keep_critical(self, event: Dict) -> None:
+        if self.mode == "exact" or len(self.critical_events) < CRITICAL_EVENTS_KEPT:
+            self.critical_events.append(event)
+        else:
+            self.critical_tail.append(event)
+
+    def _check_size(self) -> None:
+        if self.aggregation == "auto" and self.mode == "exact" and self.packets > EXACT_MAX_PACKETS:
+            self._to_sketch()
+
+    def update(self, chunk: Dict) -> None:
+        timeline = chunk.get("timeline", [])
+        detections = chunk.get("detections", [])
+
+        for event in timeline:
+            self.action_counts[event["action"]] += 1
+            self.protocol_counts[event["protocol"]] += 1
+            self.lane_counts[event["lane"]] += 1
+
+        rule_ids = []
+        for rule_id, severity, action, timestamp, dst_ip in _detection_fields(detections):
+            self.rule_hits[rule_id] += 1
+            self.severity_hits[severity] += 1
+            rule_ids.append(rule_id)
+            if severity == "CRITICAL":
+                self.critical_total += 1
+                self._keep_critical({
+                    "timestamp": timestamp,
+                    "rule_id": rule_id,
+                    "action": action,
+                    "dst_ip": dst_ip
+                })
+
+        dst_ips = [event["dst_ip"] for event in timeline]
+        src_ips = [event["src_ip"] for event in timeline]
+        dst_ports = [event["dst_port"] for event in timeline if event["dst_port"] is not None]
+
+        self.top["dst_ip"].update(dst_ips)
+        self.top["src_ip"].update(src_ips)
+        self.top["rule_id"].update(rule_ids)
+        self.distinct["dst_port"].update(dst_ports)
+        if self.mode == "sketch":
+            self.distinct["src_ip"].update(src_ips)
+            self.distinct["dst_ip"].update(dst_ips)
+
+        self.time_series.update(timeline)
+        self.packets += len(timeline)
+        self._check_size()
+
+    def merge(self, other: "ReportAggregator") -> None:
+        if (other.top_error, other.distinct_error) != (self.top_error, self.distinct_error):
+            raise ValueError("Cannot merge aggregators with different error bounds")
+
+        self.packets += other.packets
+        for own, theirs in (
+            (self.action_counts, other.action_counts),
+            (self.protocol_counts, other.protocol_counts),
+            (self.lane_counts, other.lane_counts),
+            (self.rule_hits, other.rule_hits),
+            (self.severity_hits, other.severity_hits)
+        ):
+            for key, count in theirs.items():
+                own[key] += count
+        for event in other.critical_events:
+            self._keep_critical(event)
+        for event in other.critical_tail:
+            self._keep_critical(event)
+        self.critical_total += other.critical_total
+        self.time_series.merge(other.time_series)
+
+        if self.mode == "exact" and other.mode == "exact":
+            for field, counter in other.top.items():
+                self.top[field].update(counter)
+            self.distinct["dst_port"].update(other.distinct["dst_port"])
+            self._check_size()
+            return
+
+        if self.mode == "exact":
+            self._to_sketch()
+        top, distinct = (other.top, other.distinct) if other.mode == "sketch" else other._exact_as_sketches()
+        for field, sketch in top.items():
+            self.top[field].merge(sketch)
+        for field, sketch in distinct.items():
+            self.distinct[field].merge(sketch)
+
+    def _top_values(self, field: str) -> List[Tuple[Hashable, int, int]]:
+        """
+        (value, hits, max_overestimate) of the most frequent values.
+        """
+        counter = self.top[field]
+        if self.mode == "sketch":
+            return counter.top(_TOP_N)
+        return [
+            (value, hits, 0)
+            for value, hits in sorted(counter.items(), key=lambda x: x[1], reverse=True)[:_TOP_N]
+        ]
+
+    def _distinct_count(self, field: str) -> int:
+        if self.mode == "sketch":
+            return self.distinct[field].count()
+        if field == "dst_port":
+            return len(self.distinct[field])
+        return len(self.top[field])
+
+    def finalize(self, summary: Optional[Dict] = None) -> Dict:
+        """
+        Report over everything added so far. summary (the simulation
+        summary) supplies total_packets / duration when given; otherwise
+        they are derived from the timeline chunks.
+        """
+        if summary is None:
+            first = self.time_series.first_timestamp
+            last = self.time_series.last_timestamp
+            summary = {
+                "total_packets": self.packets,
+                "duration": (last - first) if self.packets > 1 else 0.0
+            }
+
+        action_counts = self.action_counts
+        severity_hits = self.severity_hits
+        top_targets = self._top_values("dst_ip")
+
+        aggregation_info = {"mode": self.mode}
+        if self.mode == "sketch":
+            aggregation_info["top_error"] = self.top_error
+            aggregation_info["distinct_error"] = self.distinct_error
+
+        report = {
+            "overview": {
+                "total_packets": summary["total_packets"],
+                "allowed": action_counts.get("ALLOW", 0),
+                "denied": action_counts.get("DENY", 0),  # Matches "blocked_packets" concept
+                "alerted": action_counts.get("ALERT", 0), # Matches "total_alerts" concept
+
+                # Legacy/Alias keys for Report Generator compatibility
+                "blocked_packets": action_counts.get("DENY", 0),
+                "total_alerts": action_counts.get("ALERT", 0),
+
+                "duration_seconds": round(summary.get("duration", 0), 2),
+                "highest_severity": _max_severity(list(severity_hits.keys()))
+            },
+            "traffic_profile": {
+                "by_protocol": dict(self.protocol_counts),
+                "by_lane": dict(self.lane_counts),
+                "distinct": {
+                    "sources": self._distinct_count("src_ip"),
+                    "destinations": self._distinct_count("dst_ip"),
+                    "dst_ports": self._distinct_count("dst_port")
+                }
+            },
+            "security_findings": {
+                "rule_hit_count": dict(self.rule_hits),
+                "severity_distribution": dict(severity_hits),
+                "top_targeted_assets": _top_entries(top_targets, "ip", self.mode),
+                "top_sources": _top_entries(self._top_values("src_ip"), "ip", self.mode),
+                "top_rules": _top_entries(self._top_values("rule_id"), "rule_id", self.mode)
+            },
+            "critical_timeline": self.critical_events + list(self.critical_tail),
+            "critical_events_total": self.critical_total,
+            "time_series": self.time_series.result(),
+            "aggregation": aggregation_info,
+            "assessment": _generate_assessment(
+                action_counts,
+                severity_hits,
+                top_targets
+            )
+        }
+
+        return report
+
+
 # =========================
 # PUBLIC API
 # =========================
 
-def analyze_firewall_run(simulation_result: Dict) -> Dict:
+def analyze_firewall_run(
+    simulation_result: Dict,
+    bucket_seconds: float = 1.0,
+    aggregation: str = "auto",
+    top_error: float = TOP_ERROR,
+    distinct_error: float = DISTINCT_ERROR
+) -> Dict:
     """
     Analyze firewall simulation output and produce intelligence.
+    bucket_seconds sets the width of the traffic-rate time series.
+
+    aggregation selects how top talkers / distinct counts are computed:
+    "exact" counts every IP, "sketch" uses fixed-memory Space-Saving
+    (hits within top_error * total) and HyperLogLog (distinct_error
+    relative error), "auto" picks exact for runs up to EXACT_MAX_PACKETS.
     
     Expected input structure:
     {
@@ -34,95 +563,18 @@ def analyze_firewall_run(simulation_result: Dict) -> Dict:
         "timeline": [...],
         "detections": [...]
     }
-    """
 
+    See ReportAggregator to build the same report chunk by chunk.
+    """
     timeline = simulation_result.get("timeline", [])
-    detections: List[Detection] = simulation_result.get("detections", [])
-
-    # ---------------------
-    # Counters & Buckets
-    # ---------------------
-
-    action_counts = defaultdict(int)
-    protocol_counts = defaultdict(int)
-    lane_counts = defaultdict(int)
-    dst_ip_hits = defaultdict(int)
-    rule_hits = defaultdict(int)
-    severity_hits = defaultdict(int)
-
-    for event in timeline:
-        action_counts[event["action"]] += 1
-        protocol_counts[event["protocol"]] += 1
-        lane_counts[event["lane"]] += 1
-        dst_ip_hits[event["dst_ip"]] += 1
-
-    for det in detections:
-        rule_hits[det["rule_id"]] += 1
-        severity_hits[det["severity"]] += 1
-
-    # ---------------------
-    # Timeline Highlights
-    # ---------------------
-
-    critical_events = [
-        {
-            "timestamp": d["timestamp"],
-            "rule_id": d["rule_id"],
-            "action": d["action"],
-            "dst_ip": d["packet"]["dst_ip"]
-        }
-        for d in detections
-        if d["severity"] == "CRITICAL"
-    ]
-
-    # ---------------------
-    # Top Targets
-    # ---------------------
-
-    top_targets = sorted(
-        dst_ip_hits.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:5]
-
-    # ---------------------
-    # Final Intelligence Report
-    # ---------------------
-
-    report = {
-        "overview": {
-            "total_packets": simulation_result["summary"]["total_packets"],
-            "allowed": action_counts.get("ALLOW", 0),
-            "denied": action_counts.get("DENY", 0),  # Matches "blocked_packets" concept
-            "alerted": action_counts.get("ALERT", 0), # Matches "total_alerts" concept
-            
-            # Legacy/Alias keys for Report Generator compatibility
-            "blocked_packets": action_counts.get("DENY", 0),
-            "total_alerts": action_counts.get("ALERT", 0),
-            
-            "duration_seconds": round(simulation_result["summary"].get("duration", 0), 2),
-            "highest_severity": _max_severity(list(severity_hits.keys()))
-        },
-        "traffic_profile": {
-            "by_protocol": dict(protocol_counts),
-            "by_lane": dict(lane_counts)
-        },
-        "security_findings": {
-            "rule_hit_count": dict(rule_hits),
-            "severity_distribution": dict(severity_hits),
-            "top_targeted_assets": [
-                {"ip": ip, "hits": hits} for ip, hits in top_targets
-            ]
-        },
-        "critical_timeline": critical_events,
-        "assessment": _generate_assessment(
-            action_counts,
-            severity_hits,
-            top_targets
-        )
-    }
-
-    return report
+    aggregator = ReportAggregator(
+        bucket_seconds,
+        _resolve_aggregation(aggregation, len(timeline)),
+        top_error,
+        distinct_error
+    )
+    aggregator.update(simulation_result)
+    return aggregator.finalize(simulation_result["summary"])
 
 
 # =========================
@@ -0,0 +1,194 @@
+# result_encoding.py
+# Column-oriented / binary encodings of simulation results for H-SAFE API responses
+
+import importlib.util
+import json
+from typing import Dict, List, Optional, Tuple
+
+from detection_records import DetectionRecords
+
+
+# =========================
+# FORMATS
+# =========================
+
+RESPONSE_FORMATS = ("json", "columnar", "msgpack", "arrow")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.hsafe.columnar+json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+_ACCEPT_FORMATS = {
+    "application/vnd.hsafe.columnar+json": "columnar",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+
+# Optional packages behind the binary formats
+_FORMAT_PACKAGES = {"msgpack": "msgpack", "arrow": "pyarrow"}
+
+
+class EncodingUnavailable(RuntimeError):
+    """
+    Raised when a response format needs a package that is not installed.
+    """
+
+
+def format_available(response_format: str) -> bool:
+    package = _FORMAT_PACKAGES.get(response_format)
+    return package is None or importlib.util.find_spec(package) is not None
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str] = None) -> str:
+    """
+    Response format from an explicit format name, else from the Accept
+    header (first listed format whose package is installed), else "json".
+
+    Raises ValueError for an unknown name and EncodingUnavailable when the
+    requested format's package is missing.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in RESPONSE_FORMATS:
+            raise ValueError(f"Unknown response format: {requested}")
+        if not format_available(requested):
+            raise EncodingUnavailable(
+                f"The {requested} response format requires the {_FORMAT_PACKAGES[requested]} package"
+            )
+        return requested
+
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        response_format = _ACCEPT_FORMATS.get(media_type)
+        if response_format and format_available(response_format):
+            return response_format
+    return "json"
+
+
+# =========================
+# COLUMNAR LAYOUT
+# =========================
+
+def dictionary_encode(values: List) -> Dict:
+    """
+    {"dictionary": distinct values in first-seen order, "codes": positions}.
+    """
+    lookup: Dict = {}
+    codes = [lookup.setdefault(value, len(lookup)) for value in values]
+    return {"dictionary": list(lookup), "codes": codes}
+
+
+def _is_dictionary_column(values: List) -> bool:
+    # Strings (IPs, protocol, lane, action, file labels) repeat heavily
+    return any(isinstance(value, str) for value in values[:64])
+
+
+def columnar_rows(rows: List[Dict]) -> Dict:
+    """
+    List of flat dicts -> {"length", "columns"}, string columns
+    dictionary-encoded.
+    """
+    keys: Dict[str, None] = {}
+    for row in rows[:1]:
+        keys.update(dict.fromkeys(row))
+
+    columns = {}
+    for key in keys:
+        values = [row.get(key) for row in rows]
+        columns[key] = dictionary_encode(values) if _is_dictionary_column(values) else values
+    return {"length": len(rows), "columns": columns}
+
+
+def columnar_detections(detections) -> Dict:
+    """
+    DetectionRecords.to_dict() form; Detection dicts are flattened into
+    columns (packet fields prefixed "packet_").
+    """
+    if isinstance(detections, DetectionRecords):
+        return detections.to_dict()
+    return columnar_rows([
+        {
+            **{key: value for key, value in detection.items() if key != "packet"},
+            **{f"packet_{key}": value for key, value in detection["packet"].items()}
+        }
+        for detection in detections
+    ])
+
+
+def columnar_result(simulation_result: Dict) -> Dict:
+    """
+    simulate_pcap_flow result with timeline and detections column-oriented;
+    summary / flows are left as they are.
+    """
+    encoded = {
+        key: value for key, value in simulation_result.items()
+        if key not in ("timeline", "detections")
+    }
+    encoded["timeline"] = columnar_rows(simulation_result.get("timeline", []))
+    encoded["detections"] = columnar_detections(simulation_result.get("detections", []))
+    return encoded
+
+
+# =========================
+# ENCODERS
+# =========================
+
+def _arrow_table(timeline: Dict, metadata: Dict[str, str]):
+    import pyarrow as pa
+
+    arrays = {}
+    for name, column in timeline["columns"].items():
+        if isinstance(column, dict):
+            arrays[name] = pa.DictionaryArray.from_arrays(
+                pa.array(column["codes"], type=pa.int32()),
+                pa.array(column["dictionary"])
+            )
+        else:
+            arrays[name] = pa.array(column)
+    return pa.table(arrays, metadata=metadata)
+
+
+def encode_analysis(report: Dict, simulation_result: Dict, response_format: str) -> Tuple[bytes, str]:
+    """
+    Encode an /analyze response ({"report", "simulation"}) in a non-default
+    format. Returns (body, media_type).
+
+    columnar / msgpack: same document, simulation column-oriented.
+    arrow:              Arrow IPC stream of the timeline table; report and
+                        the rest of the simulation are JSON in the schema
+                        metadata ("report", "simulation").
+    """
+    if not format_available(response_format):
+        raise EncodingUnavailable(
+            f"The {response_format} response format requires the {_FORMAT_PACKAGES[response_format]} package"
+        )
+
+    simulation = columnar_result(simulation_result)
+
+    if response_format == "columnar":
+        body = json.dumps({"report": report, "simulation": simulation}, separators=(",", ":"))
+        return body.encode(), MEDIA_TYPES["columnar"]
+
+    if response_format == "msgpack":
+        import msgpack
+
+        return msgpack.packb({"report": report, "simulation": simulation}, use_bin_type=True), MEDIA_TYPES["msgpack"]
+
+    if response_format == "arrow":
+        import pyarrow as pa
+
+        timeline = simulation.pop("timeline")
+        table = _arrow_table(timeline, {
+            "report": json.dumps(report, separators=(",", ":")),
+            "simulation": json.dumps(simulation, separators=(",", ":"))
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), MEDIA_TYPES["arrow"]
+
+    raise ValueError(f"Unknown response format: {response_format}")
@@ -0,0 +1,371 @@
+# result_store.py
+# SQLite store of analysis results with indexed, cursor-paged timeline queries for H-SAFE
+
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from detection_records import DetectionRecords
+
+
+# =========================
+# LOCATION / LIMITS
+# =========================
+
+RESULT_DB_PATH = os.environ.get("HSAFE_RESULT_DB", "/tmp/hsafe_results.sqlite3")  # Use /tmp for serverless consistency
+
+# Stored analyses kept at most (oldest dropped first)
+MAX_RESULTS = int(os.environ.get("HSAFE_RESULT_STORE_MAX", 20))
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    rid INTEGER PRIMARY KEY,
+    result_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    source TEXT,
+    packet_count INTEGER NOT NULL,
+    detection_count INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    report TEXT NOT NULL,
+    client_id TEXT
+);
+CREATE TABLE IF NOT EXISTS timeline (
+    rid INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    timestamp REAL,
+    src_ip TEXT,
+    dst_ip TEXT,
+    protocol TEXT,
+    dst_port INTEGER,
+    payload_size INTEGER,
+    lane TEXT,
+    action TEXT,
+    PRIMARY KEY (rid, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS timeline_src_ip ON timeline (rid, src_ip, idx);
+CREATE INDEX IF NOT EXISTS timeline_dst_ip ON timeline (rid, dst_ip, idx);
+CREATE INDEX IF NOT EXISTS timeline_dst_port ON timeline (rid, dst_port, idx);
+CREATE INDEX IF NOT EXISTS timeline_protocol ON timeline (rid, protocol, idx);
+CREATE INDEX IF NOT EXISTS timeline_lane ON timeline (rid, lane, idx);
+CREATE INDEX IF NOT EXISTS timeline_action ON timeline (rid, action, idx);
+CREATE INDEX IF NOT EXISTS timeline_timestamp ON timeline (rid, timestamp);
+CREATE TABLE IF NOT EXISTS rules (
+    rid INTEGER NOT NULL,
+    rule_index INTEGER NOT NULL,
+    rule_id TEXT,
+    rule_name TEXT,
+    severity TEXT,
+    action TEXT,
+    PRIMARY KEY (rid, rule_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS detections (
+    rid INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    packet_index INTEGER NOT NULL,
+    rule_index INTEGER NOT NULL,
+    PRIMARY KEY (rid, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS detections_rule ON detections (rid, rule_index, seq);
+"""
+
+# After the client_id migration of stores created before results were per client
+_CLIENT_INDEX = "CREATE INDEX IF NOT EXISTS results_client ON results (client_id, created_at)"
+
+_TIMELINE_COLUMNS = ("idx", "timestamp", "src_ip", "dst_ip", "protocol", "dst_port", "payload_size", "lane", "action")
+
+# Timeline filter -> (column, operator); text values are matched upper-cased where noted
+TIMELINE_FILTERS = {
+    "src_ip": ("src_ip", "="),
+    "dst_ip": ("dst_ip", "="),
+    "dst_port": ("dst_port", "="),
+    "protocol": ("protocol", "="),
+    "lane": ("lane", "="),
+    "action": ("action", "="),
+    "start_ts": ("timestamp", ">="),
+    "end_ts": ("timestamp", "<"),
+}
+_UPPER_FILTERS = ("protocol", "lane", "action")
+
+
+class ResultNotFound(KeyError):
+    """
+    Raised for a result id that is not (or no longer) stored.
+    """
+
+
+# =========================
+# RESULT STORE
+# =========================
+
+class ResultStore:
+    """
+    Analysis results (summary, report, timeline, detections) by result id,
+    owned by the client that stored them: every query takes a client_id
+    and only sees that client's results (another client's id is unknown).
+
+    The timeline is one row per packet, indexed at ingest by source /
+    destination IP, destination port, protocol, lane, action and capture
+    time, so filtered pages are index range scans. Pages are keyed by
+    timeline index (cursor = last index returned), so paging stays cheap
+    however deep the client goes.
+
+    One connection per call: safe to use from threads and worker processes.
+    """
+
+    def __init__(self, path: str = RESULT_DB_PATH, max_results: int = MAX_RESULTS):
+        self.path = path
+        self.max_results = max_results
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            columns = [row[1] for row in db.execute("PRAGMA table_info(results)")]
+            if "client_id" not in columns:
+                # Older rows have no owner and stay unreachable until evicted
+                db.execute("ALTER TABLE results ADD COLUMN client_id TEXT")
+            db.execute(_CLIENT_INDEX)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _rid(self, db: sqlite3.Connection, client_id: str, result_id: str) -> int:
+        row = db.execute(
+            "SELECT rid FROM results WHERE result_id = ? AND client_id = ?", (result_id, client_id)
+        ).fetchone()
+        if row is None:
+            raise ResultNotFound(result_id)
+        return row[0]
+
+    # -------------------------
+    # INGEST
+    # -------------------------
+
+    def save(
+        self,
+        client_id: str,
+        result_id: str,
+        simulation_result: Dict,
+        report: Dict,
+        source: Optional[str] = None
+    ) -> None:
+        """
+        Store a simulate_pcap_flow result (detections as DetectionRecords)
+        and its report under result_id for client_id.
+        """
+        detections = simulation_result["detections"]
+        if not isinstance(detections, DetectionRecords):
+            raise TypeError("save() needs detections as DetectionRecords (compact_detections=True)")
+        timeline = simulation_result["timeline"]
+
+        db = self._connect()
+        try:
+            with db:
+                cursor = db.execute(
+                    "INSERT INTO results"
+                    " (result_id, created_at, source, packet_count, detection_count, summary, report, client_id)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        result_id, time.time(), source, len(timeline), len(detections),
+                        json.dumps(simulation_result["summary"]), json.dumps(report), client_id
+                    )
+                )
+                rid = cursor.lastrowid
+                db.executemany(
+                    "INSERT INTO timeline VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            rid, entry["index"], entry["timestamp"], entry["src_ip"], entry["dst_ip"],
+                            entry["protocol"], entry["dst_port"], entry["payload_size"], entry["lane"], entry["action"]
+                        )
+                        for entry in timeline
+                    )
+                )
+                db.executemany(
+                    "INSERT INTO rules VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        (rid, i, rule["rule_id"], rule["name"], rule["severity"], rule["action"])
+                        for i, rule in enumerate(detections.rules)
+                    )
+                )
+                db.executemany(
+                    "INSERT INTO detections VALUES (?, ?, ?, ?)",
+                    (
+                        (rid, seq, packet_index, rule_index)
+                        for seq, (packet_index, rule_index) in enumerate(zip(detections.packet_index, detections.rule_index))
+                    )
+                )
+            self._evict(db)
+        finally:
+            db.close()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        rows = db.execute(
+            "SELECT rid FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_results,)
+        ).fetchall()
+        for (rid,) in rows:
+            self._delete_rid(db, rid)
+
+    def _delete_rid(self, db: sqlite3.Connection, rid: int) -> None:
+        with db:
+            for table in ("timeline", "rules", "detections", "results"):
+                db.execute(f"DELETE FROM {table} WHERE rid = ?", (rid,))
+
+    def delete(self, client_id: str, result_id: str) -> None:
+        db = self._connect()
+        try:
+            self._delete_rid(db, self._rid(db, client_id, result_id))
+        finally:
+            db.close()
+
+    # -------------------------
+    # QUERIES
+    # -------------------------
+
+    def list_results(self, client_id: str) -> List[Dict]:
+        db = self._connect()
+        try:
+            rows = db.execute(
+                "SELECT result_id, created_at, source, packet_count, detection_count FROM results"
+                " WHERE client_id = ? ORDER BY created_at DESC",
+                (client_id,)
+            ).fetchall()
+        finally:
+            db.close()
+        return [
+            {
+                "result_id": result_id,
+                "created_at": created_at,
+                "source": source,
+                "packet_count": packet_count,
+                "detection_count": detection_count
+            }
+            for result_id, created_at, source, packet_count, detection_count in rows
+        ]
+
+    def get(self, client_id: str, result_id: str) -> Dict:
+        """
+        Summary and report of a stored result (no timeline / detections).
+        """
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT created_at, source, packet_count, detection_count, summary, report FROM results"
+                " WHERE result_id = ? AND client_id = ?", (result_id, client_id)
+            ).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            raise ResultNotFound(result_id)
+        created_at, source, packet_count, detection_count, summary, report = row
+        return {
+            "result_id": result_id,
+            "created_at": created_at,
+            "source": source,
+            "packet_count": packet_count,
+            "detection_count": detection_count,
+            "summary": json.loads(summary),
+            "report": json.loads(report)
+        }
+
+    def timeline(
+        self,
+        client_id: str,
+        result_id: str,
+        cursor: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        **filters
+    ) -> Dict:
+        """
+        One page of timeline entries after cursor, in capture order,
+        matching every given filter (see TIMELINE_FILTERS; None = any).
+
+        Returns {"entries": [...], "next_cursor": int | None}.
+        """
+        unknown = set(filters) - set(TIMELINE_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown timeline filter: {', '.join(sorted(unknown))}")
+
+        clauses = ["rid = ?", "idx > ?"]
+        params: List = [None, -1 if cursor is None else cursor]
+        for name, value in filters.items():
+            if value is None:
+                continue
+            column, operator = TIMELINE_FILTERS[name]
+            clauses.append(f"{column} {operator} ?")
+            params.append(value.upper() if name in _UPPER_FILTERS else value)
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        db = self._connect()
+        try:
+            params[0] = self._rid(db, client_id, result_id)
+            rows = db.execute(
+                f"SELECT {', '.join(_TIMELINE_COLUMNS)} FROM timeline WHERE {' AND '.join(clauses)}"
+                " ORDER BY idx LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        finally:
+            db.close()
+
+        entries = [dict(zip(("index",) + _TIMELINE_COLUMNS[1:], row)) for row in rows[:limit]]
+        return {
+            "entries": entries,
+            "next_cursor": entries[-1]["index"] if len(rows) > limit else None
+        }
+
+    def detections(
+        self,
+        client_id: str,
+        result_id: str,
+        cursor: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        rule_id: Optional[str] = None
+    ) -> Dict:
+        """
+        One page of detections after cursor (a detection sequence number),
+        each with its rule and timeline entry; rule_id narrows to one rule.
+
+        Returns {"detections": [...], "next_cursor": int | None}.
+        """
+        clauses = ["d.rid = ?", "d.seq > ?"]
+        params: List = [None, -1 if cursor is None else cursor]
+        if rule_id is not None:
+            clauses.append("r.rule_id = ?")
+            params.append(rule_id)
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        db = self._connect()
+        try:
+            params[0] = self._rid(db, client_id, result_id)
+            rows = db.execute(
+                "SELECT d.seq, r.rule_id, r.rule_name, r.severity, r.action,"
+                f" {', '.join('t.' + column for column in _TIMELINE_COLUMNS)}"
+                " FROM detections d"
+                " JOIN rules r ON r.rid = d.rid AND r.rule_index = d.rule_index"
+                " JOIN timeline t ON t.rid = d.rid AND t.idx = d.packet_index"
+                f" WHERE {' AND '.join(clauses)} ORDER BY d.seq LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        finally:
+            db.close()
+
+        detections = [
+            {
+                "seq": row[0],
+                "rule_id": row[1],
+                "rule_name": row[2],
+                "severity": row[3],
+                "action": row[4],
+                "packet": dict(zip(("index",) + _TIMELINE_COLUMNS[1:], row[5:]))
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            "detections": detections,
+            "next_cursor": detections[-1]["seq"] if len(rows) > limit else None
+        }
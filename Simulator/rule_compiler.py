@@ -0,0 +1,259 @@
+# rule_compiler.py
+# Rule compilation into exact-match lookup indexes for H-SAFE
+
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from heapq import merge
+from typing import Dict, List, Optional, Tuple, Union
+
+from schema import Packet, Rule, Detection, validate_packet
+from rule_implementation import evaluate_packet, NO_RULE
+from detection_records import DetectionRecords
+
+
+# =========================
+# INDEX KEYS
+# =========================
+
+# Fields a rule can pin to a single value; packets only visit matching buckets
+INDEXED_FIELDS = ("protocol", "dst_port", "dst_ip")
+
+_MATCH_FIELDS = ("src_ip", "dst_ip", "src_port", "dst_port", "min_payload_size", "max_payload_size")
+
+# Bucket key for a field the rule leaves open
+_ANY = object()
+
+# Distinct (protocol, dst_port, dst_ip) lookups memoized per ruleset
+_MAX_MEMO_ENTRIES = 65536
+
+# Compiled rulesets kept by the process-wide cache
+RULESET_CACHE_SIZE = 64
+
+
+def _can_match(rule: Rule) -> bool:
+    """
+    Mirrors apply_rules: disabled rules and rules without any condition
+    (empty matched_fields) never produce a match.
+    """
+    if not rule.get("enabled", True):
+        return False
+    conditions = rule["conditions"]
+    return any(conditions.get(field) is not None for field in _MATCH_FIELDS)
+
+
+def _pinned_value(value):
+    """
+    Bucket key for a rule value; unhashable values fall back to the wildcard
+    bucket and are left to the full match check.
+    """
+    if value is None:
+        return _ANY
+    try:
+        hash(value)
+    except TypeError:
+        return _ANY
+    return value
+
+
+def _rule_key(rule: Rule) -> Tuple:
+    conditions = rule["conditions"]
+    return (
+        _pinned_value(rule["protocol"]),
+        _pinned_value(conditions.get("dst_port")),
+        _pinned_value(conditions.get("dst_ip")),
+    )
+
+
+# =========================
+# COMPILED RULESET
+# =========================
+
+class CompiledRuleset:
+    """
+    An ordered rule list indexed by protocol, dst_port and dst_ip.
+
+    Rules are bucketed by the exact values they pin (or _ANY). A packet looks
+    up the 8 exact/wildcard bucket combinations for its own values; the
+    merged candidates keep original priority order, so evaluation only
+    touches rules that can possibly match it.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = list(rules)
+        self.ruleset_hash: Optional[str] = None
+        self._buckets: Dict[Tuple, List[int]] = {}
+        self._memo: Dict[Tuple, Tuple[int, ...]] = {}
+
+        for index, rule in enumerate(self.rules):
+            if _can_match(rule):
+                self._buckets.setdefault(_rule_key(rule), []).append(index)
+
+        # Lookup patterns actually present, so absent combinations cost nothing
+        self._patterns = sorted({
+            tuple(part is not _ANY for part in key) for key in self._buckets
+        })
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @property
+    def bucket_count(self) -> int:
+        return len(self._buckets)
+
+    def candidates(self, packet: Packet) -> Tuple[int, ...]:
+        """
+        Indices (into self.rules) of rules that can match packet,
+        in original priority order.
+        """
+        values = (packet["protocol"], packet["dst_port"], packet["dst_ip"])
+        try:
+            return self._memo[values]
+        except KeyError:
+            pass
+        except TypeError:
+            return self._lookup(values)
+
+        found = self._lookup(values)
+        if len(self._memo) >= _MAX_MEMO_ENTRIES:
+            self._memo.clear()
+        self._memo[values] = found
+        return found
+
+    def _lookup(self, values: Tuple) -> Tuple[int, ...]:
+        lists = []
+        for pattern in self._patterns:
+            # A pinned rule value is never None, so None packet fields only hit wildcards
+            if any(pinned and value is None for value, pinned in zip(values, pattern)):
+                continue
+            key = tuple(
+                value if pinned else _ANY
+                for value, pinned in zip(values, pattern)
+            )
+            try:
+                bucket = self._buckets.get(key)
+            except TypeError:
+                continue
+            if bucket:
+                lists.append(bucket)
+
+        if not lists:
+            return ()
+        if len(lists) == 1:
+            return tuple(lists[0])
+        return tuple(merge(*lists))
+
+
+def compile_rules(rules: List[Rule]) -> CompiledRuleset:
+    """
+    Build the lookup index for an ordered rule list.
+    """
+    return CompiledRuleset(rules)
+
+
+# =========================
+# RULESET CACHE
+# =========================
+
+_ruleset_cache: "OrderedDict[str, CompiledRuleset]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def ruleset_hash(rules: List[Rule]) -> str:
+    """
+    Canonical SHA-256 of the enabled rules, in evaluation order.
+    """
+    enabled = [rule for rule in rules if rule.get("enabled", True)]
+    canonical = json.dumps(enabled, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_compiled_ruleset(rules: List[Rule]) -> CompiledRuleset:
+    """
+    Return the compiled form of rules, compiling at most once per distinct
+    enabled ruleset (LRU, RULESET_CACHE_SIZE entries).
+    """
+    key = ruleset_hash(rules)
+
+    with _cache_lock:
+        compiled = _ruleset_cache.get(key)
+        if compiled is not None:
+            _ruleset_cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return compiled
+        _cache_stats["misses"] += 1
+
+    # Private copy: later mutation of the caller's dicts cannot leak into the cache
+    enabled = copy.deepcopy([rule for rule in rules if rule.get("enabled", True)])
+    compiled = CompiledRuleset(enabled)
+    compiled.ruleset_hash = key
+
+    with _cache_lock:
+        _ruleset_cache[key] = compiled
+        _ruleset_cache.move_to_end(key)
+        while len(_ruleset_cache) > RULESET_CACHE_SIZE:
+            _ruleset_cache.popitem(last=False)
+            _cache_stats["evictions"] += 1
+
+    return compiled
+
+
+def cache_stats() -> Dict[str, int]:
+    with _cache_lock:
+        return {
+            **_cache_stats,
+            "size": len(_ruleset_cache),
+            "max_size": RULESET_CACHE_SIZE
+        }
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _ruleset_cache.clear()
+        for key in _cache_stats:
+            _cache_stats[key] = 0
+
+
+# =========================
+# EVALUATION
+# =========================
+
+def evaluate_compiled_rules(
+    packets: List[Packet],
+    compiled: CompiledRuleset,
+    compact: bool = False
+) -> Tuple[Union[List[Detection], DetectionRecords], List[str], List[int]]:
+    """
+    Equivalent of apply_rules_with_verdicts(packets, compiled.rules, compact)
+    that evaluates each packet against its candidate rules only.
+
+    Decisive rule indices refer to compiled.rules (enabled rules only).
+    """
+    rules = compiled.rules
+    detections = DetectionRecords(rules) if compact else []
+    verdicts: List[str] = []
+    decisive_rules: List[int] = []
+
+    for position, packet in enumerate(packets):
+        if not validate_packet(packet):
+            verdicts.append("ALLOW")
+            decisive_rules.append(NO_RULE)
+            continue
+
+        verdict, decisive = evaluate_packet(
+            packet, rules, detections, compiled.candidates(packet), position
+        )
+        verdicts.append(verdict)
+        decisive_rules.append(decisive)
+
+    return detections, verdicts, decisive_rules
+
+
+def apply_compiled_rules(packets: List[Packet], compiled: CompiledRuleset) -> List[Detection]:
+    """
+    Equivalent of apply_rules(packets, compiled.rules).
+    """
+    return evaluate_compiled_rules(packets, compiled)[0]
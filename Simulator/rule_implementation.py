@@ -1,9 +1,10 @@
 # rule_implementation.py
 # Firewall rule evaluation + enforcement engine for H-SAFE
 
-from typing import List, Dict
+from typing import List, Dict, Iterable, Optional, Sequence, Tuple, Union
 
 from schema import Packet, Rule, Detection, validate_packet, new_detection
+from detection_records import DetectionRecords
 
 
 # =========================
@@ -74,34 +75,57 @@ def _packet_matches_rule(packet: Packet, rule: Rule) -> Dict:
 # PUBLIC API
 # =========================
 
-def apply_rules(packets: List[Packet], rules: List[Rule]) -> List[Detection]:
+NO_RULE = -1
+
+
+def evaluate_packet(
+    packet: Packet,
+    rules: Sequence[Rule],
+    detections: Union[List[Detection], DetectionRecords],
+    rule_indices: Optional[Iterable[int]] = None,
+    packet_index: int = 0
+) -> Tuple[str, int]:
     """
-    Apply firewall rules to packets.
+    Evaluate one packet against rules in order, appending its detections.
 
-    Rule behavior:
-    - ALERT: generate detection, continue evaluation
-    - DENY: generate detection, stop evaluation for packet
-    - ALLOW: stop evaluation for packet, no detection
+    detections:
+    - A list receives Detection dicts; DetectionRecords receive
+      (packet_index, packet, rule index) records instead
+
+    rule_indices:
+    - Restrict evaluation to these positions in rules (ascending order)
+
+    Returns (verdict, decisive_rule_index):
+    - verdict: action of the first detection, ALLOW if there is none
+    - decisive_rule_index: rule that set the verdict (first detection, or
+      the ALLOW rule that stopped evaluation), NO_RULE for the default
     """
 
-    detections: List[Detection] = []
+    verdict = "ALLOW"
+    decisive = NO_RULE
+    compact = isinstance(detections, DetectionRecords)
 
-    for packet in packets:
-        if not validate_packet(packet):
-            continue
+    if rule_indices is None:
+        rule_indices = range(len(rules))
 
-        for rule in rules:
-            if not rule.get("enabled", True):
-                continue
+    for index in rule_indices:
+        rule = rules[index]
+        if not rule.get("enabled", True):
+            continue
 
-            matched_fields = _packet_matches_rule(packet, rule)
-            if not matched_fields:
-                continue
+        matched_fields = _packet_matches_rule(packet, rule)
+        if not matched_fields:
+            continue
 
-            action = rule.get("action", "ALERT")
+        action = rule.get("action", "ALERT")
 
-            # ALERT
-            if action == "ALERT":
+        # ALERT
+        if action == "ALERT":
+            if decisive == NO_RULE:
+                verdict, decisive = action, index
+            if compact:
+                detections.add(packet_index, packet, index)
+            else:
                 detections.append(
                     new_detection(
                         rule=rule,
@@ -109,10 +133,15 @@ def apply_rules(packets: List[Packet], rules: List[Rule]) -> List[Detection]:
                         matched_fields=matched_fields
                     )
                 )
-                continue
+            continue
 
-            # DENY
-            if action == "DENY":
+        # DENY
+        if action == "DENY":
+            if decisive == NO_RULE:
+                verdict, decisive = action, index
+            if compact:
+                detections.add(packet_index, packet, index)
+            else:
                 detections.append(
                     new_detection(
                         rule=rule,
@@ -120,13 +149,68 @@ def apply_rules(packets: List[Packet], rules: List[Rule]) -> List[Detection]:
                         matched_fields=matched_fields
                     )
                 )
-                break
+            break
+
+        # ALLOW
+        if action == "ALLOW":
+            if decisive == NO_RULE:
+                decisive = index
+            break
+
+        # Unknown action is a configuration error
+        raise ValueError(f"Unknown rule action: {action}")
+
+    return verdict, decisive
+
+
+def apply_rules(packets: List[Packet], rules: List[Rule]) -> List[Detection]:
+    """
+    Apply firewall rules to packets.
+
+    Rule behavior:
+    - ALERT: generate detection, continue evaluation
+    - DENY: generate detection, stop evaluation for packet
+    - ALLOW: stop evaluation for packet, no detection
+    """
+
+    detections: List[Detection] = []
 
-            # ALLOW
-            if action == "ALLOW":
-                break
+    for packet in packets:
+        if not validate_packet(packet):
+            continue
 
-            # Unknown action is a configuration error
-            raise ValueError(f"Unknown rule action: {action}")
+        evaluate_packet(packet, rules, detections)
 
     return detections
+
+
+def apply_rules_with_verdicts(
+    packets: List[Packet],
+    rules: List[Rule],
+    compact: bool = False
+) -> Tuple[Union[List[Detection], DetectionRecords], List[str], List[int]]:
+    """
+    Apply firewall rules and also report the outcome of every packet.
+
+    Returns (detections, verdicts, decisive_rule_indices), where the last
+    two are aligned with packets (see evaluate_packet). Invalid packets are
+    skipped by the engine and reported as ALLOW / NO_RULE.
+
+    compact: return detections as DetectionRecords (indices into packets / rules).
+    """
+
+    detections = DetectionRecords(rules) if compact else []
+    verdicts: List[str] = []
+    decisive_rules: List[int] = []
+
+    for position, packet in enumerate(packets):
+        if not validate_packet(packet):
+            verdicts.append("ALLOW")
+            decisive_rules.append(NO_RULE)
+            continue
+
+        verdict, decisive = evaluate_packet(packet, rules, detections, packet_index=position)
+        verdicts.append(verdict)
+        decisive_rules.append(decisive)
+
+    return detections, verdicts, decisive_rules
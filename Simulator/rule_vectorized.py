@@ -0,0 +1,275 @@
+# rule_vectorized.py
+# Column-wise (NumPy) firewall rule evaluation for H-SAFE
+
+from numbers import Number
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from schema import Packet, Rule, Detection, new_detection
+from packet_batch import PacketBatch, PROTOCOL_CODES, ip_to_int, int_to_ip
+from rule_implementation import NO_RULE
+from detection_records import DetectionRecords
+
+
+# =========================
+# VERDICT CODES
+# =========================
+
+ACTION_CODES = {"ALLOW": 0, "DENY": 1, "ALERT": 2}
+ACTION_NAMES = {code: name for name, code in ACTION_CODES.items()}
+
+_MATCH_FIELDS = ("src_ip", "dst_ip", "src_port", "dst_port")
+
+# Evaluate on a compacted index list once fewer packets than this share are still undecided
+_COMPACT_RATIO = 0.5
+
+
+# =========================
+# RULE -> COLUMN PREDICATES
+# =========================
+
+def _ip_condition(value) -> Optional[int]:
+    """
+    Integer form of a rule IP, or None if no IPv4 packet string can equal it.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        encoded = ip_to_int(value)
+    except ValueError:
+        return None
+    # Packet IPs are canonical dotted quads; "010.0.0.1" never equals one
+    return encoded if int_to_ip(encoded) == value else None
+
+
+def _port_condition(value) -> Optional[int]:
+    """
+    Integer form of a rule port, or None if no packet port can equal it.
+    """
+    if not isinstance(value, Number) or value != int(value):
+        return None
+    value = int(value)
+    return value if 0 <= value <= 0xFFFF else None
+
+
+def _rule_mask(rule: Rule, cols: Dict[str, np.ndarray], size: int) -> np.ndarray:
+    """
+    Boolean mask of packets matching rule, mirroring
+    rule_implementation._packet_matches_rule (no conditions -> no match).
+    """
+    conditions = rule["conditions"]
+    none = np.zeros(size, dtype=bool)
+
+    has_field = any(conditions.get(field) is not None for field in _MATCH_FIELDS) or \
+        conditions.get("min_payload_size") is not None or \
+        conditions.get("max_payload_size") is not None
+    if not has_field:
+        return none
+
+    mask = np.ones(size, dtype=bool)
+
+    if rule["protocol"] is not None:
+        code = PROTOCOL_CODES.get(rule["protocol"]) if isinstance(rule["protocol"], str) else None
+        if code is None:
+            return none
+        mask &= cols["protocol"] == code
+
+    for field in ("src_ip", "dst_ip"):
+        value = conditions.get(field)
+        if value is None:
+            continue
+        encoded = _ip_condition(value)
+        if encoded is None:
+            return none
+        mask &= cols[field] == encoded
+
+    for field in ("src_port", "dst_port"):
+        value = conditions.get(field)
+        if value is None:
+            continue
+        encoded = _port_condition(value)
+        if encoded is None:
+            return none
+        mask &= cols["has_" + field] & (cols[field] == encoded)
+
+    min_size = conditions.get("min_payload_size")
+    if min_size is not None:
+        mask &= cols["payload_size"] >= min_size
+
+    max_size = conditions.get("max_payload_size")
+    if max_size is not None:
+        mask &= cols["payload_size"] <= max_size
+
+    return mask
+
+
+# =========================
+# BATCH EVALUATION
+# =========================
+
+class BatchEvaluation:
+    """
+    Result of evaluating an ordered rule list over a PacketBatch.
+
+    verdicts:      per-packet final action code (ACTION_CODES); the action of
+                   the first detection, ALLOW when there is none
+    first_rule:    index of the rule behind that first detection (NO_RULE if none)
+    decisive_rule: index of the DENY / ALLOW rule that stopped evaluation
+    rule_hits:     per rule, sorted packet indices it matched while the packet
+                   was still being evaluated (ALERT / DENY hits are detections)
+    """
+
+    __slots__ = ("verdicts", "first_rule", "decisive_rule", "rule_hits", "rules")
+
+    def __init__(self, size: int, rules: List[Rule]):
+        self.verdicts = np.full(size, ACTION_CODES["ALLOW"], dtype=np.uint8)
+        self.first_rule = np.full(size, NO_RULE, dtype=np.int32)
+        self.decisive_rule = np.full(size, NO_RULE, dtype=np.int32)
+        self.rule_hits: List[np.ndarray] = []
+        self.rules = rules
+
+    def __len__(self) -> int:
+        return len(self.verdicts)
+
+    def rule_mask(self, rule_index: int) -> np.ndarray:
+        """
+        Dense boolean match mask for one rule.
+        """
+        mask = np.zeros(len(self.verdicts), dtype=bool)
+        mask[self.rule_hits[rule_index]] = True
+        return mask
+
+    def verdict_rules(self) -> np.ndarray:
+        """
+        Per-packet index of the rule that set the verdict: the first
+        detection's rule, else the ALLOW rule that stopped evaluation.
+        """
+        return np.where(self.first_rule != NO_RULE, self.first_rule, self.decisive_rule)
+
+    def actions(self) -> List[str]:
+        """
+        Per-packet final action names.
+        """
+        return [ACTION_NAMES[code] for code in self.verdicts.tolist()]
+
+    def detection_pairs(self):
+        """
+        (packet_index, rule_index) arrays for every detection, in the
+        packet-major / rule-order sequence produced by apply_rules.
+        """
+        packet_parts = []
+        rule_parts = []
+        for rule_index, hits in enumerate(self.rule_hits):
+            if len(hits) and self.rules[rule_index].get("action", "ALERT") != "ALLOW":
+                packet_parts.append(hits)
+                rule_parts.append(np.full(len(hits), rule_index, dtype=np.int32))
+
+        if not packet_parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        packet_idx = np.concatenate(packet_parts)
+        rule_idx = np.concatenate(rule_parts)
+        order = np.lexsort((rule_idx, packet_idx))
+        return packet_idx[order], rule_idx[order]
+
+    def detections(self, packets: List[Packet]) -> List[Detection]:
+        """
+        Materialize Detection dicts identical to apply_rules output.
+        """
+        detections: List[Detection] = []
+        packet_idx, rule_idx = self.detection_pairs()
+
+        for p, r in zip(packet_idx.tolist(), rule_idx.tolist()):
+            rule = self.rules[r]
+            packet = packets[p]
+            conditions = rule["conditions"]
+
+            matched_fields = {
+                field: packet[field]
+                for field in _MATCH_FIELDS
+                if conditions.get(field) is not None
+            }
+            if conditions.get("min_payload_size") is not None:
+                matched_fields["min_payload_size"] = conditions["min_payload_size"]
+            if conditions.get("max_payload_size") is not None:
+                matched_fields["max_payload_size"] = conditions["max_payload_size"]
+
+            detections.append(new_detection(rule=rule, packet=packet, matched_fields=matched_fields))
+
+        return detections
+
+    def detection_records(self, packets: List[Packet]) -> DetectionRecords:
+        """
+        Compact form of detections(packets).
+        """
+        packet_idx, rule_idx = self.detection_pairs()
+        return DetectionRecords.from_pairs(self.rules, packets, packet_idx.tolist(), rule_idx.tolist())
+
+
+def evaluate_batch(batch: PacketBatch, rules: List[Rule]) -> BatchEvaluation:
+    """
+    Apply firewall rules to a whole PacketBatch with mask operations.
+
+    Same first-match semantics as rule_implementation.apply_rules:
+    - ALERT: generate detection, continue evaluation
+    - DENY: generate detection, stop evaluation for packet
+    - ALLOW: stop evaluation for packet, no detection
+    """
+    size = len(batch)
+    result = BatchEvaluation(size, rules)
+    # Contiguous copies: comparisons on strided record fields are several times slower
+    full_cols = {name: np.ascontiguousarray(batch.data[name]) for name in batch.data.dtype.names}
+
+    active = np.ones(size, dtype=bool)
+    active_idx = np.arange(size)
+    cols = full_cols
+
+    for rule_index, rule in enumerate(rules):
+        if not rule.get("enabled", True) or not len(active_idx):
+            result.rule_hits.append(np.empty(0, dtype=np.int64))
+            continue
+
+        mask = _rule_mask(rule, cols, len(active_idx))
+        if cols is full_cols:
+            mask &= active
+        hits = active_idx[mask]
+        result.rule_hits.append(hits)
+
+        if not len(hits):
+            continue
+
+        action = rule.get("action", "ALERT")
+        if action not in ACTION_CODES:
+            # Unknown action is a configuration error
+            raise ValueError(f"Unknown rule action: {action}")
+
+        if action != "ALLOW":
+            undecided = hits[result.first_rule[hits] == NO_RULE]
+            result.first_rule[undecided] = rule_index
+            result.verdicts[undecided] = ACTION_CODES[action]
+
+        if action == "ALERT":
+            continue
+
+        # DENY / ALLOW stop evaluation for matched packets
+        result.decisive_rule[hits] = rule_index
+        active[hits] = False
+
+        # Once most packets are decided, keep evaluating only the rest
+        remaining = np.flatnonzero(active)
+        if cols is not full_cols or len(remaining) < size * _COMPACT_RATIO:
+            active_idx = remaining
+            cols = {name: column[remaining] for name, column in full_cols.items()}
+
+    return result
+
+
+def apply_rules_batch(batch: PacketBatch, rules: List[Rule], packets: Optional[List[Packet]] = None) -> List[Detection]:
+    """
+    Drop-in equivalent of apply_rules for columnar input.
+    """
+    if packets is None:
+        packets = batch.to_packets()
+    return evaluate_batch(batch, rules).detections(packets)
@@ -129,8 +129,12 @@ def new_packet(
     protocol: str,
     src_port: Optional[int],
     dst_port: Optional[int],
-    payload_size: int
+    payload_size: int,
+    timestamp: Optional[float] = None
 ) -> Packet:
+    """
+    timestamp: capture time of the packet; defaults to now (generated traffic).
+    """
     return Packet(
         src_ip=src_ip,
         dst_ip=dst_ip,
@@ -138,22 +142,27 @@ def new_packet(
         src_port=src_port,
         dst_port=dst_port,
         payload_size=payload_size,
-        timestamp=time.time()
+        timestamp=time.time() if timestamp is None else timestamp
     )
 
 
 def new_detection(
     rule: Rule,
     packet: Packet,
-    matched_fields: Dict
+    matched_fields: Dict,
+    timestamp: Optional[float] = None,
+    detection_id: Optional[str] = None
 ) -> Detection:
+    """
+    detection_id: stable id of a stored detection; defaults to a new uuid4.
+    """
     return Detection(
-        detection_id=str(uuid.uuid4()),
+        detection_id=str(uuid.uuid4()) if detection_id is None else detection_id,
         rule_id=rule["rule_id"],
         rule_name=rule["name"],
         severity=rule["severity"],
         action=rule["action"],
         matched_fields=matched_fields,
         packet=packet,
-        timestamp=time.time()
+        timestamp=time.time() if timestamp is None else timestamp
     )
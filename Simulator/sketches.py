@@ -0,0 +1,202 @@
+# sketches.py
+# Fixed-memory streaming summaries (heavy hitters, distinct counts) for H-SAFE reports
+
+import hashlib
+import heapq
+import math
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+
+# =========================
+# HEAVY HITTERS (SPACE-SAVING)
+# =========================
+
+class SpaceSaving:
+    """
+    Space-Saving top-k counter (Metwally et al.).
+
+    Tracks at most `capacity` keys. Every reported count overestimates the
+    true count by at most its "error" (<= total / capacity), and every key
+    seen more than total / capacity times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # (count, tie, key) entries; an entry is stale once its key's count grew
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._tie = 0
+
+    @classmethod
+    def for_error(cls, error: float) -> "SpaceSaving":
+        """
+        Sized so counts overestimate by at most error * total.
+        """
+        if not 0 < error < 1:
+            raise ValueError("error must be between 0 and 1")
+        return cls(math.ceil(1 / error))
+
+    def _push(self, count: int, key: Hashable) -> None:
+        self._tie += 1
+        heapq.heappush(self._heap, (count, self._tie, key))
+
+    def _pop_min(self) -> Tuple[int, Hashable]:
+        """
+        Remove and return the (count, key) with the smallest current count.
+        """
+        while True:
+            count, _, key = heapq.heappop(self._heap)
+            current = self.counts[key]
+            if current == count:
+                return count, key
+            # Counts only grow: re-queue the stale entry at its current count
+            self._push(current, key)
+
+    def add(self, key: Hashable, count: int = 1) -> None:
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+            return
+        if len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+            self._push(count, key)
+            return
+
+        floor, evicted = self._pop_min()
+        del counts[evicted]
+        del self.errors[evicted]
+        counts[key] = floor + count
+        self.errors[key] = floor
+        self._push(floor + count, key)
+
+    def update(self, keys: Iterable[Hashable]) -> None:
+        add = self.add
+        for key in keys:
+            add(key)
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """
+        Fold another counter into this one (mergeable summary: the bound
+        becomes (total + other.total) / capacity).
+        """
+        # A key missing from a full counter may have up to its minimum count there
+        own_floor = min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+        other_floor = min(other.counts.values()) if len(other.counts) >= other.capacity else 0
+
+        merged = []
+        for key in self.counts.keys() | other.counts.keys():
+            count = self.counts.get(key, own_floor) + other.counts.get(key, other_floor)
+            error = self.errors.get(key, own_floor) + other.errors.get(key, other_floor)
+            merged.append((count, error, key))
+        merged = heapq.nlargest(self.capacity, merged, key=lambda item: item[0])
+
+        self.total += other.total
+        self.counts = {key: count for count, _, key in merged}
+        self.errors = {key: error for _, error, key in merged}
+        self._heap = []
+        for count, _, key in merged:
+            self._push(count, key)
+
+    def top(self, n: int) -> List[Tuple[Hashable, int, int]]:
+        """
+        (key, estimated_count, max_overestimate) of the n largest counts.
+        """
+        return [
+            (key, count, self.errors[key])
+            for key, count in heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+        ]
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+# =========================
+# DISTINCT COUNTS (HYPERLOGLOG)
+# =========================
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _hash64(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
+
+
+def hash_values(values: Iterable) -> np.ndarray:
+    """
+    Stable (process-independent) 64-bit hashes of values via their str() form
+    (BLAKE2b: a 32-bit hash would collide long before HLL's range runs out).
+    """
+    return np.fromiter((_hash64(value) for value in values), dtype=np.uint64)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with 2**precision registers
+    (relative standard error ~ 1.04 / sqrt(2**precision)).
+    """
+
+    MIN_PRECISION = 4
+    MAX_PRECISION = 18
+
+    def __init__(self, precision: int = 14):
+        if not self.MIN_PRECISION <= precision <= self.MAX_PRECISION:
+            raise ValueError(f"precision must be between {self.MIN_PRECISION} and {self.MAX_PRECISION}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @classmethod
+    def for_error(cls, error: float) -> "HyperLogLog":
+        """
+        Smallest register count with standard error <= error.
+        """
+        if not 0 < error < 1:
+            raise ValueError("error must be between 0 and 1")
+        precision = math.ceil(math.log2((1.04 / error) ** 2))
+        return cls(min(max(precision, cls.MIN_PRECISION), cls.MAX_PRECISION))
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """
+        Fold 64-bit hashes (see hash_values) into the registers.
+        """
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = (hashes << np.uint64(p)) & _MASK64
+
+        # Rank = leading zeros of the remaining 64 - p bits, plus one
+        # (bit length via frexp on the top 53 bits, which float64 holds exactly)
+        _, bit_length = np.frexp((rest >> np.uint64(11)).astype(np.float64))
+        rank = np.minimum(54 - bit_length, 64 - p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values: Iterable) -> None:
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog counters of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
@@ -7,8 +7,8 @@ from typing import Dict, List, Tuple, Any
 
 # Reuse existing schema components
 from schema import Packet, new_packet, Detection
-# Import the rule engine
-import rule_implementation
+# Import the rule engine (compiled + cached per ruleset)
+import rule_compiler
 
 
 # =========================
@@ -64,9 +64,10 @@ class TopologyGraph:
                     
         return []
 
-def _get_node_scan_result(node_id: str, node_data: Dict, packet: Packet, firewall_rules: List) -> Dict:
+def _get_node_scan_result(node_id: str, node_data: Dict, packet: Packet, firewall_rules) -> Dict:
     """
     Simulate processing a packet at a single node.
+    firewall_rules: CompiledRuleset (preferred) or plain rule list.
     Returns decision dict: { "action": "FORWARD" | "DROP" | "ALERT", "meta": ... }
     """
     node_type = node_data.get("type", "unknown")
@@ -74,7 +75,9 @@ def _get_node_scan_result(node_id: str, node_data: Dict, packet: Packet, firewal
     # 1. FIREWALL LOGIC
     if node_type == "firewall":
         # Apply H-SAFE Rule Engine
-        detections = rule_implementation.apply_rules([packet], firewall_rules)
+        if not isinstance(firewall_rules, rule_compiler.CompiledRuleset):
+            firewall_rules = rule_compiler.get_compiled_ruleset(firewall_rules)
+        detections = rule_compiler.apply_compiled_rules([packet], firewall_rules)
         
         # Analyze detections
         denies = [d for d in detections if d["action"] == "DENY"]
@@ -177,6 +180,8 @@ def simulate_attack(
     )
 
     # 3. Traversal Simulation (Hop-by-Hop)
+    # Compile once; every firewall hop shares the cached ruleset
+    compiled_rules = rule_compiler.get_compiled_ruleset(rules)
     trace_log = []
     final_outcome = "ARRIVED"
     
@@ -184,7 +189,7 @@ def simulate_attack(
         node_meta = nodes_data.get(node_id, {})
         
         # Simulate processing at this node
-        result = _get_node_scan_result(node_id, node_meta, packet, rules)
+        result = _get_node_scan_result(node_id, node_meta, packet, compiled_rules)
         
         step_info = {
             "hop": hop_idx + 1,
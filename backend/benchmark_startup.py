@@ -0,0 +1,151 @@
+# benchmark_startup.py
+# Cold-start cost of the H-SAFE API: import time per module and first-request latency
+#
+# Every measurement runs in a fresh interpreter, as a serverless cold start would.
+#
+# Usage:
+#   python backend/benchmark_startup.py [--repeat N] [--top N]
+#   python backend/benchmark_startup.py --modules pcap_analysis report_generator
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR_DIR = os.path.join(ROOT_DIR, "Simulator")
+
+# Modules the API can load lazily; reported as loaded / not loaded after startup
+HEAVY_MODULES = ("scapy.all", "numpy", "reportlab", "pcap_parallel", "post_attack_analysis", "report_generator")
+
+# Simulator modules and dependencies timed on their own with --modules (default)
+DEFAULT_MODULES = (
+    "fastapi", "scapy.all", "numpy", "reportlab.pdfgen.canvas",
+    "pcap_analysis", "post_attack_analysis", "report_generator", "job_pool"
+)
+
+# (method, path, JSON body) of lightweight requests
+FIRST_REQUESTS = (
+    ("GET", "/", None),
+    ("GET", "/rules", None),
+    ("POST", "/simulate/topology/generate", {"prompt": "star"}),
+    ("GET", "/pcap/status", None),
+)
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    """
+    Run a fresh interpreter with the repository and Simulator importable.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join((ROOT_DIR, SIMULATOR_DIR))}
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+# =========================
+# IMPORT TIMES
+# =========================
+
+def import_times(module: str):
+    """
+    [(depth, self_us, cumulative_us, name)] from python -X importtime.
+    """
+    result = _run("-X", "importtime", "-c", f"import {module}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+
+def report_app_imports(top: int) -> None:
+    entries = import_times("backend.main")
+    total = next(cumulative for _, _, cumulative, name in entries if name == "backend.main")
+    print(f"import backend.main: {total / 1000:8.1f} ms")
+
+    print(f"  direct imports (top {top} by cumulative time):")
+    direct = sorted((e for e in entries if e[0] == 1), key=lambda e: e[2], reverse=True)
+    for _, _, cumulative, name in direct[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = {name for _, _, _, name in entries}
+    for module in HEAVY_MODULES:
+        print(f"  {module:<22} {'loaded' if module in loaded else 'not loaded'} at startup")
+
+
+def report_module_imports(modules) -> None:
+    print("standalone import (fresh interpreter each):")
+    for module in modules:
+        entries = import_times(module)
+        cumulative = next((c for _, _, c, name in entries if name == module), None)
+        if cumulative is None:
+            print(f"    {'-':>8}     {module} (already imported by the interpreter)")
+        else:
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+
+# =========================
+# FIRST REQUEST
+# =========================
+
+_FIRST_REQUEST_CODE = """
+import json, sys, time
+start = time.perf_counter()
+from backend.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+method, path, body = json.loads(sys.argv[1])
+client = TestClient(app)
+client_ready = time.perf_counter()
+response = client.request(method, path, json=body)
+done = time.perf_counter()
+print(json.dumps({
+    "status": response.status_code,
+    "import": imported - start,
+    "request": done - client_ready,
+    "total": (imported - start) + (done - client_ready)
+}))
+"""
+
+
+def first_request(method: str, path: str, body, repeat: int):
+    runs = []
+    for _ in range(repeat):
+        result = _run("-c", _FIRST_REQUEST_CODE, json.dumps([method, path, body]))
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import", "request", "total")
+    }, runs[-1]["status"]
+
+
+def report_first_requests(repeat: int) -> None:
+    print(f"cold first request (median of {repeat}; test client setup excluded):")
+    for method, path, body in FIRST_REQUESTS:
+        timings, status = first_request(method, path, body, repeat)
+        print(
+            f"    {method:<4} {path:<30} {status}  import {timings['import'] * 1000:7.1f} ms"
+            f"  request {timings['request'] * 1000:7.1f} ms  total {timings['total'] * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API cold-start time")
+    parser.add_argument("--repeat", type=int, default=3, help="cold starts per first-request measurement")
+    parser.add_argument("--top", type=int, default=15, help="direct imports of backend.main to list")
+    parser.add_argument("--modules", nargs="*", help="time standalone imports of these modules instead")
+    args = parser.parse_args()
+
+    if args.modules is not None:
+        report_module_imports(args.modules or DEFAULT_MODULES)
+    else:
+        report_app_imports(args.top)
+        print()
+        report_first_requests(args.repeat)
@@ -1,32 +1,52 @@
 import time
 import os
+import asyncio
 import sys
 import shutil
 import json
+import tempfile
+import uuid
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException, Body, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Body, File, UploadFile, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 
 # Add Simulator directory to sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 simulator_path = os.path.join(current_dir, '..', 'Simulator')
 sys.path.append(simulator_path)
 
-# Import Simulator Modules
+# Import Simulator Modules (kept light: scapy, numpy and reportlab load on first use,
+# mostly in job pool workers, so cold starts of lightweight endpoints stay fast)
 import rule_addition
 import rule_implementation
 import pcap_analysis
-import report_generator
+import pcap_decoder
+import packet_filter as packet_filter_module
 import schema
-import post_attack_analysis
+import result_encoding
+import job_pool
+import job_store
+import result_store
+import capture_store
 
 # Determine root_path based on environment
 root_path = "/api" if os.environ.get("VERCEL") else ""
 
 app = FastAPI(root_path=root_path)
 
+# CPU-heavy work (pcap analysis, topology simulation, report export) runs here,
+# off the event loop; sized by HSAFE_JOB_WORKERS / HSAFE_JOB_QUEUE
+jobs = job_pool.JobPool()
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    jobs.shutdown()
+
 # Allow CORS for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -135,6 +155,8 @@ def move_rule_endpoint(rule_id: str, new_position: int = Body(..., embed=True)):
         if not success:
             raise HTTPException(status_code=404, detail="Rule not found")
         return {"ok": True}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
         
@@ -146,6 +168,8 @@ def delete_rule(rule_id: str):
         if not success:
             raise HTTPException(status_code=404, detail="Rule not found")
         return {"ok": True}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -160,6 +184,8 @@ def update_rule_endpoint(rule_id: str, rule: RuleCreate):
         return updated
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -171,105 +197,555 @@ def toggle_rule_status(rule_id: str, enabled: bool = Body(..., embed=True)):
         if not updated:
             raise HTTPException(status_code=404, detail="Rule not found")
         return updated
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rules/cache/stats")
+def get_rule_cache_stats():
+    """Hit/miss counters of the compiled-ruleset cache."""
+    import rule_compiler
+    return rule_compiler.cache_stats()
+
+@app.get("/pcap/cache/stats")
+def get_parse_cache_stats():
+    """Hit/miss counters and disk usage of the parsed-capture cache."""
+    import parse_cache
+    return parse_cache.cache_stats()
+
 # --- PCAP MANAGEMENT ---
 
 # Use /tmp/uploads for Vercel compatibility
 UPLOAD_DIR = "/tmp/uploads" 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-PERSISTENT_PCAP_PATH = os.path.join(UPLOAD_DIR, "current.pcap")
+
+# Uploaded captures by content hash, referenced per client (X-Client-Id header, else client address);
+# sized by HSAFE_CAPTURE_STORE_BYTES / HSAFE_CAPTURE_CLIENT_BYTES / HSAFE_CAPTURE_CLIENT_MAX
+captures = capture_store.CaptureStore(os.path.join(UPLOAD_DIR, "captures"))
+
+# Background jobs (?background=true) and their results, kept for HSAFE_JOB_TTL seconds
+job_results = job_store.JobStore(os.path.join(UPLOAD_DIR, "jobs"))
+
+# Analyses stored with store_result=true, per client like captures, queried page by page under /results
+RESULT_DB_PATH = os.path.join(UPLOAD_DIR, "results.sqlite3")
+result_db = result_store.ResultStore(RESULT_DB_PATH)
+
+def _client_id(request: Request) -> str:
+    """Owner of stored captures: the X-Client-Id header, else the client address."""
+    client_id = request.headers.get("x-client-id")
+    if client_id:
+        return client_id[:128]
+    return request.client.host if request.client else "anonymous"
+
+def _resolve_capture(client_id: str, capture_id: Optional[str] = None) -> str:
+    """The client's capture_id (404 if unknown), or its most recent capture (400 if none)."""
+    try:
+        return captures.resolve(client_id, capture_id)
+    except capture_store.CaptureNotFound:
+        if capture_id is not None:
+            raise HTTPException(status_code=404, detail="Unknown or evicted capture.")
+        raise HTTPException(status_code=400, detail="No PCAP file provided or found on server.")
+
+async def _store_capture(add, *args) -> Dict:
+    """Run a captures.add* call off the event loop; 413 past a quota."""
+    try:
+        return await run_in_threadpool(add, *args)
+    except capture_store.QuotaExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@app.post("/pcap")
+async def upload_pcap(request: Request, file: UploadFile = File(...)):
+    """
+    Store a capture for this client without analyzing it; analyze it later
+    by capture_id. Uploading the same bytes again only adds a reference.
+    """
+    return await _store_capture(captures.add_file, file.file, _client_id(request), file.filename)
 
 @app.get("/pcap/status")
-def get_pcap_status():
-    """Check if a persistent PCAP file exists."""
-    return {"exists": os.path.exists(PERSISTENT_PCAP_PATH)}
+def get_pcap_status(request: Request):
+    """Check if this client has a stored PCAP file (and which one is used by default)."""
+    stored = captures.list_captures(_client_id(request))
+    return {"exists": bool(stored), "capture_id": stored[0]["capture_id"] if stored else None}
+
+@app.get("/pcap/captures")
+def list_pcaps(request: Request):
+    """This client's stored captures, most recently used first."""
+    return {"captures": captures.list_captures(_client_id(request))}
+
+@app.get("/pcap/store/stats")
+def get_capture_store_stats():
+    """Capture store usage, deduplication and eviction counters."""
+    return captures.stats()
 
 @app.delete("/pcap")
-def delete_pcap():
-    """Remove stored PCAP file."""
-    if os.path.exists(PERSISTENT_PCAP_PATH):
-        os.remove(PERSISTENT_PCAP_PATH)
-    return {"ok": True}
+def delete_pcap(request: Request, capture_id: Optional[str] = None):
+    """Remove this client's stored PCAP files (or only capture_id); shared files stay for other clients."""
+    return {"ok": True, "released": captures.release(_client_id(request), capture_id)}
 
 # --- SIMULATION ---
 
+def _parse_rules_json(rules_json: Optional[str]) -> List[Dict]:
+    """Enabled client-provided rules, empty if none or unparseable."""
+    if not rules_json:
+        return [] # Default to empty if no client rules provided
+    try:
+        raw_rules = json.loads(rules_json)
+        return [r for r in raw_rules if r.get("enabled") is not False]
+    except json.JSONDecodeError:
+        return []
+
+def _save_upload(upload: UploadFile, path: str) -> None:
+    """Store an upload at path, replacing it atomically (jobs may be reading it)."""
+    partial = f"{path}.{os.getpid()}.{id(upload):x}.part"
+    try:
+        with open(partial, "wb") as buffer:
+            shutil.copyfileobj(upload.file, buffer)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+def _response_format(response_format: Optional[str], request: Request) -> str:
+    """Negotiated /analyze response format (query parameter, then Accept header)."""
+    try:
+        return result_encoding.negotiate_format(response_format, request.headers.get("accept"))
+    except result_encoding.EncodingUnavailable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _check_engine(engine: str) -> None:
+    """400 for a rule engine pcap_analysis does not have."""
+    if engine not in pcap_analysis.RULE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown rule engine: {engine}")
+
+def _check_chunk_size(chunk_size: int) -> None:
+    """400 for a chunk size that cannot hold a packet."""
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1.")
+
+def _check_report_options(bucket_seconds: float, aggregation: str) -> None:
+    """400 for report options post_attack_analysis would reject."""
+    import post_attack_analysis
+
+    if bucket_seconds <= 0:
+        raise HTTPException(status_code=400, detail="bucket_seconds must be positive.")
+    if aggregation not in post_attack_analysis.AGGREGATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation mode: {aggregation}")
+
+@contextmanager
+def _admitted(slots: int = 1):
+    """Hold analysis pool slots (yields the JobSlot); 429 when the pool is saturated."""
+    try:
+        slot = jobs.reserve(slots)
+    except job_pool.PoolSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+async def _run_job(fn, *args):
+    """Run a job_pool job in an admitted slot."""
+    with _admitted():
+        return await jobs.submit(fn, *args)
+
+def _encoded_response(encoded) -> Response:
+    body, media_type = encoded
+    return Response(content=body, media_type=media_type)
+
+def _job_error(e: Exception):
+    """(status_code, detail) of a failed background job, as the synchronous endpoint would answer."""
+    if isinstance(e, packet_filter_module.FilterSyntaxError):
+        return 400, f"Invalid packet filter: {e}"
+    if isinstance(e, job_pool.JobInputError):
+        return 400, str(e)
+    if isinstance(e, pcap_decoder.CaptureFormatError):
+        return 400, f"Invalid capture: {e}"
+    return 500, str(e)
+
+def _start_job(job: job_store.Job, slot: job_pool.JobSlot, fn, *args, on_result=None) -> JSONResponse:
+    """
+    Run fn(*args, progress_path) in the background, holding slot until it ends.
+    on_result(result) stores the result (default: job.finish(result)).
+    Returns 202 with the job status.
+    """
+    slot = slot.detach()
+
+    async def run():
+        try:
+            result = await jobs.submit(fn, *args, job.progress_path)
+            if on_result is not None:
+                on_result(result)
+            else:
+                job.finish(result)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            job.fail(*_job_error(e))
+        finally:
+            slot.release()
+
+    job.task = asyncio.create_task(run())
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+def _snapshot_capture(path: str, snapshot_path: str) -> str:
+    """Hard link (or copy) of a capture for a background job, so later uploads cannot replace it."""
+    try:
+        os.link(path, snapshot_path)
+    except OSError:
+        shutil.copyfile(path, snapshot_path)
+    return snapshot_path
+
 @app.post("/analyze/pcap")
 async def analyze_pcap_endpoint(
+    request: Request,
+    response_format: Optional[str] = Query(None),
+    background: bool = Query(False),
     file: Optional[UploadFile] = File(None),
-    rules_json: Optional[str] = Form(None)
+    rules_json: Optional[str] = Form(None),
+    streaming: bool = Form(False),
+    chunk_size: int = Form(pcap_analysis.DEFAULT_CHUNK_SIZE),
+    engine: str = Form("compiled"),
+    aggregate_flows: bool = Form(False),
+    workers: int = Form(1),
+    cached: Optional[bool] = Form(None),
+    packet_filter: Optional[str] = Form(None),
+    start_ts: Optional[float] = Form(None),
+    end_ts: Optional[float] = Form(None),
+    bucket_seconds: float = Form(1.0),
+    aggregation: str = Form("auto"),
+    compact_detections: bool = Form(False),
+    capture_id: Optional[str] = Form(None),
+    store_result: bool = Form(False),
+    include_timeline: bool = Form(True)
 ):
     """
-    1. Receive PCAP file (optional, otherwise use persistent).
+    1. Receive PCAP file (optional, otherwise capture_id or this client's
+       most recently used capture; the response names it in X-Capture-Id).
     2. Receive Rules (optional JSON string).
-    3. Run Simulation.
-    4. Return analysis.
+    3. Run Simulation (streaming=true evaluates the capture in chunks,
+       engine=vectorized|compiled selects a faster rule engine,
+       aggregate_flows=true evaluates once per flow and adds per-flow stats,
+       workers>1 parses and evaluates large captures in parallel processes
+         (capped at the job pool size; each process holds a pool slot),
+       cached=true reuses parsed packets of a capture analyzed before
+         (takes precedence over workers: one process, one pool slot);
+         unset, the parse cache is used unless workers>1 gets more than
+         one process, so workers>1 alone selects the parallel path,
+       packet_filter="tcp and dst port 3389" keeps only matching packets,
+       start_ts/end_ts limit the analysis to a capture-time window,
+       compact_detections=true returns detections as rule / timeline indices).
+    4. Return analysis (report.time_series buckets traffic by bucket_seconds;
+       aggregation=sketch|exact|auto sets how top talkers are counted).
+       ?response_format=columnar|msgpack|arrow (or the matching Accept
+       header) returns the simulation column-oriented; the report stays JSON.
+    Steps 3-4 run in the analysis job pool; 429 when it is saturated.
+    ?background=true returns 202 with a job id right away instead; poll
+    GET /jobs/{job_id} for progress and fetch GET /jobs/{job_id}/result.
+    store_result=true also keeps the result server-side for this client under
+    the id in the X-Result-Id header (page through it under /results/{result_id});
+    include_timeline=false then leaves timeline and detections out.
     """
-    try:
-        if file:
-            with open(PERSISTENT_PCAP_PATH, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            target_path = PERSISTENT_PCAP_PATH
-        elif os.path.exists(PERSISTENT_PCAP_PATH):
-            target_path = PERSISTENT_PCAP_PATH
-        else:
-            raise HTTPException(status_code=400, detail="No PCAP file provided or found on server.")
-
-        # 1. Load Rules (Prefer client-provided, fallback to empty)
-        if rules_json:
-            try:
-                raw_rules = json.loads(rules_json)
-                rules = [r for r in raw_rules if r.get("enabled") is not False]
-            except json.JSONDecodeError:
-                rules = []
-        else:
-            rules = [] # Default to empty if no client rules provided
-
-        # 2. Run Simulation on the persistent file
-        simulation_result = pcap_analysis.simulate_pcap_flow(target_path, rules)
-
-        # 3. Analyze Results
-        final_report = post_attack_analysis.analyze_firewall_run(simulation_result)
-
-        response = {
-            "report": final_report,
-            "simulation": simulation_result 
-        }
-        return response
-
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    response_format = _response_format(response_format, request)
+    _check_engine(engine)
+    _check_chunk_size(chunk_size)
+    _check_report_options(bucket_seconds, aggregation)
+    client_id = _client_id(request)
+    # Parallel parsing starts its own processes: one pool slot each.
+    # Cached runs read the parse cache in one process whatever workers says
+    if cached is None:
+        cached = jobs.job_workers(workers) == 1
+    workers = 1 if cached else jobs.job_workers(workers)
+    with _admitted(workers) as slot:
+        try:
+            if file:
+                stored = await _store_capture(captures.add_file, file.file, client_id, file.filename)
+                capture_id = stored["capture_id"]
+            capture_id = _resolve_capture(client_id, capture_id)
+
+            # 1. Load Rules (Prefer client-provided, fallback to empty)
+            rules = _parse_rules_json(rules_json)
+
+            # 2. Run Simulation on the persistent file and 3. Analyze Results, in the job pool
+            # (indexed: re-runs reuse the sidecar offset index instead of re-scanning)
+            options = {
+                "streaming": streaming,
+                "chunk_size": chunk_size,
+                "indexed": True,
+                "engine": engine,
+                "aggregate_flows": aggregate_flows,
+                "workers": workers,
+                "cached": cached,
+                "packet_filter": packet_filter,
+                "start_ts": start_ts,
+                "end_ts": end_ts,
+                "compact_detections": compact_detections or response_format != "json"
+            }
+            store = None
+            headers = {"X-Capture-Id": capture_id}
+            if store_result:
+                store = {
+                    "path": RESULT_DB_PATH,
+                    "client_id": client_id,
+                    "result_id": uuid.uuid4().hex,
+                    "source": file.filename if file else capture_id,
+                    "include_timeline": include_timeline
+                }
+                headers["X-Result-Id"] = store["result_id"]
+
+            # Leased: the capture cannot be evicted while the job reads it
+            with captures.lease(capture_id) as target_path:
+                if background:
+                    job = job_results.create("analyze/pcap")
+                    try:
+                        snapshot = _snapshot_capture(target_path, job.path("pcap"))
+                    except OSError as e:
+                        job.fail(500, str(e))
+                        raise
+                    accepted = _start_job(
+                        job, slot,
+                        job_pool.analyze_pcap_job, snapshot, rules, options, bucket_seconds, aggregation, response_format,
+                        store
+                    )
+                    accepted.headers.update(headers)
+                    return accepted
+
+                response = _encoded_response(await jobs.submit(
+                    job_pool.analyze_pcap_job, target_path, rules, options, bucket_seconds, aggregation, response_format,
+                    store
+                ))
+            response.headers.update(headers)
+            return response
+
+        except HTTPException:
+            raise
+        except capture_store.CaptureNotFound:
+            raise HTTPException(status_code=404, detail="Unknown or evicted capture.")
+        except packet_filter_module.FilterSyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid packet filter: {e}")
+        except pcap_decoder.CaptureFormatError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid capture: {e}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=str(e))
+
+# Request body bytes gathered before each hand-off to the decoding thread
+STREAM_FEED_BYTES = 1024 * 1024
+# Seconds a streamed upload may take in total before it is answered with 408
+STREAM_UPLOAD_TIMEOUT = 300.0
+
+async def _body_chunks(request: Request, deadline: float):
+    """Request body chunks; 408 once the upload runs past deadline (time.monotonic())."""
+    chunks = request.stream().__aiter__()
+    while True:
+        try:
+            data = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=408, detail=f"Upload took longer than {STREAM_UPLOAD_TIMEOUT:g} seconds."
+            )
+        yield data
+
+@app.post("/analyze/pcap/stream")
+async def analyze_pcap_stream_endpoint(
+    request: Request,
+    rules_json: Optional[str] = None,
+    chunk_size: int = pcap_analysis.DEFAULT_CHUNK_SIZE,
+    engine: str = "compiled",
+    aggregate_flows: bool = False,
+    packet_filter: Optional[str] = None,
+    bucket_seconds: float = 1.0,
+    aggregation: str = "auto",
+    compact_detections: bool = False,
+    response_format: Optional[str] = None
+):
+    """
+    Analyze a capture sent as the raw request body (application/octet-stream)
+    while it uploads. Options are query parameters.
+
+    Records are decoded and evaluated as bytes arrive and the body is also
+    stored in the client's captures (X-Capture-Id), so the result is ready
+    shortly after the last byte. Formats other than pcap / pcapng are analyzed once stored.
+    response_format works as for /analyze/pcap. The request takes an
+    analysis pool slot once the first STREAM_FEED_BYTES have arrived and
+    holds it while the rest uploads (429 when the pool is saturated).
+    Uploads running past STREAM_UPLOAD_TIMEOUT seconds are answered with 408.
+    """
+    response_format = _response_format(response_format, request)
+    compact_detections = compact_detections or response_format != "json"
+    _check_engine(engine)
+    _check_chunk_size(chunk_size)
+    _check_report_options(bucket_seconds, aggregation)
+    client_id = _client_id(request)
+    body = _body_chunks(request, time.monotonic() + STREAM_UPLOAD_TIMEOUT)
+
+    # Decoding starts at STREAM_FEED_BYTES (or the end of a smaller body):
+    # until then a slow client holds no pool slot
+    pending = bytearray()
+    async for data in body:
+        pending += data
+        if len(pending) >= STREAM_FEED_BYTES:
+            break
+
+    with _admitted():
+        try:
+            rules = _parse_rules_json(rules_json)
+            flow = pcap_analysis.IncrementalPcapFlow(
+                rules,
+                chunk_size=chunk_size,
+                engine=engine,
+                aggregate_flows=aggregate_flows,
+                packet_filter=packet_filter,
+                compact_detections=compact_detections
+            )
+
+            def consume(data: bytes) -> None:
+                # Decoding and rule evaluation run in a worker thread, off the event loop
+                nonlocal flow
+                buffer.write(data)
+                if flow is not None:
+                    try:
+                        flow.feed(data)
+                    except pcap_decoder.CaptureFormatError:
+                        flow = None # Not pcap / pcapng: fall back once stored
+
+            with captures.writer() as buffer:
+                if len(pending) >= STREAM_FEED_BYTES:
+                    await run_in_threadpool(consume, bytes(pending))
+                    pending.clear()
+                async for data in body:
+                    pending += data
+                    if len(pending) >= STREAM_FEED_BYTES:
+                        await run_in_threadpool(consume, bytes(pending))
+                        pending.clear()
+                if pending:
+                    await run_in_threadpool(consume, bytes(pending))
+
+                if not buffer.size:
+                    raise HTTPException(status_code=400, detail="Empty request body; expected a PCAP file.")
+                capture_id = (await _store_capture(captures.add, buffer, client_id))["capture_id"]
+
+            if flow is not None:
+                encoded = await jobs.submit(
+                    job_pool.finish_stream_job, flow, bucket_seconds, aggregation, response_format
+                )
+            else:
+                options = {
+                    "chunk_size": chunk_size,
+                    "engine": engine,
+                    "aggregate_flows": aggregate_flows,
+                    "packet_filter": packet_filter,
+                    "compact_detections": compact_detections
+                }
+                with captures.lease(capture_id) as target_path:
+                    encoded = await jobs.submit(
+                        job_pool.analyze_pcap_job, target_path, rules, options,
+                        bucket_seconds, aggregation, response_format
+                    )
+
+            response = _encoded_response(encoded)
+            response.headers["X-Capture-Id"] = capture_id
+            return response
+
+        except HTTPException:
+            raise
+        except packet_filter_module.FilterSyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid packet filter: {e}")
+        except pcap_decoder.CaptureFormatError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid capture: {e}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/pcap/batch")
+async def analyze_pcap_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    rules_json: Optional[str] = Form(None),
+    engine: str = Form("compiled"),
+    workers: Optional[int] = Form(None),
+    bucket_seconds: float = Form(1.0),
+    aggregation: str = Form("auto"),
+    compact_detections: bool = Form(False)
+):
+    """
+    Analyze several pcap / pcapng files (or zip / tar archives of them,
+    e.g. rotated tcpdump output) in one request.
+    Returns the combined report plus a summary per file
+    (analyzed in the job pool; 429 when it is saturated).
+    compact_detections=true returns detections as rule / timeline indices.
+    """
+    _check_engine(engine)
+    _check_report_options(bucket_seconds, aggregation)
+    workers = jobs.job_workers(workers)
+    with _admitted(workers):
+        batch_dir = tempfile.mkdtemp(prefix="batch_", dir=UPLOAD_DIR)
+        try:
+            inputs = []
+            for i, upload in enumerate(files):
+                path = os.path.join(batch_dir, f"upload_{i:05d}")
+                await run_in_threadpool(_save_upload, upload, path)
+                inputs.append((upload.filename or f"file_{i}", path))
+
+            rules = _parse_rules_json(rules_json)
+
+            return _encoded_response(await jobs.submit(
+                job_pool.analyze_batch_job, inputs, rules, batch_dir, workers, engine, bucket_seconds, aggregation,
+                compact_detections
+            ))
+
+        except job_pool.JobInputError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
 
 @app.post("/simulate/topology")
-def run_topology_simulation(req: TopologySimRequest):
+async def run_topology_simulation(req: TopologySimRequest, background: bool = False):
     """
-    Run simulation based on visual topology.
+    Run simulation based on visual topology (in the job pool).
+    ?background=true returns 202 with a job id (see GET /jobs/{job_id}).
     """
     try:
         topology_data = req.topology.copy()
         if "paths" in topology_data:
              topology_data["paths"] = [tuple(p) for p in topology_data["paths"]]
 
-        import topology_simulation
-
         # Get rules: Use request rules if provided (Topology H-Safe Rules), else global rules
         if req.rules:
              rules = req.rules
         else:
              rules = rule_addition.get_all_rules(include_disabled=False)
 
-        result = topology_simulation.simulate_attack(
-            topology=topology_data,
-            attacker_node=req.attacker_node,
-            target_node=req.target_node,
-            protocol=req.protocol,
-            dst_port=req.dst_port,
-            packet_count=req.packet_count,
-            rules=rules  # Pass rules to engine
+        args = (
+            topology_data,
+            req.attacker_node,
+            req.target_node,
+            req.protocol,
+            req.dst_port,
+            req.packet_count,
+            rules  # Pass rules to engine
         )
+
+        if background:
+            with _admitted() as slot:
+                job = job_results.create("simulate/topology")
+                return _start_job(
+                    job, slot, job_pool.topology_job, *args,
+                    on_result=lambda result: job.finish((
+                        job_pool.encode_json(jsonable_encoder(result)), "application/json"
+                    ))
+                )
+
+        result = await _run_job(job_pool.topology_job, *args)
         
         return result
 
@@ -279,6 +755,8 @@ def run_topology_simulation(req: TopologySimRequest):
         # Result is now a detailed dictionary, return it directly
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -287,12 +765,13 @@ def run_topology_simulation(req: TopologySimRequest):
 # --- REPORTING ---
 
 @app.post("/report/export")
-def export_report_endpoint(req: ExportRequest):
+async def export_report_endpoint(req: ExportRequest, background: bool = False):
     """
-    Export simulation report to specified format.
+    Export simulation report to specified format (rendered in the job pool).
+    ?background=true returns 202 with a job id; the file is then served
+    by GET /jobs/{job_id}/result.
     """
     try:
-        import report_generator
         from datetime import datetime
         import uuid
         
@@ -318,17 +797,22 @@ def export_report_endpoint(req: ExportRequest):
             "report_id": report_id
         }
         
-        if req.format.lower() == "pdf":
-            report_generator.export_pdf(req.report, output_path, req.timeline)
-            media_type = "application/pdf"
-        elif req.format.lower() == "csv":
-            report_generator.export_csv(req.report, output_path)
-            media_type = "text/csv"
-        elif req.format.lower() == "json":
-            report_generator.export_json(req.report, output_path)
-            media_type = "application/json"
-        else:
+        if req.format.lower() not in ("pdf", "csv", "json"):
             raise HTTPException(status_code=400, detail="Unsupported format. Use pdf, csv, or json.")
+
+        if background:
+            with _admitted() as slot:
+                job = job_results.create("report/export")
+                job_path = job.path(req.format.lower())
+                return _start_job(
+                    job, slot,
+                    job_pool.export_report_job, req.report, job_path, req.format.lower(), req.timeline,
+                    on_result=lambda media_type: job.finish((job_path, media_type), filename=filename)
+                )
+
+        media_type = await _run_job(
+            job_pool.export_report_job, req.report, output_path, req.format.lower(), req.timeline
+        )
             
         if not os.path.exists(output_path):
              raise HTTPException(status_code=500, detail="Failed to generate report file.")
@@ -339,7 +823,112 @@ def export_report_endpoint(req: ExportRequest):
             media_type=media_type
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- JOBS ---
+
+@app.get("/jobs/status")
+async def get_jobs_status():
+    """Analysis pool occupancy and background job store counters."""
+    return {"pool": jobs.stats(), "store": job_results.stats()}
+
+def _get_job(job_id: str) -> job_store.Job:
+    job = job_results.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Background job status: queued | running | done | failed, with progress
+    (stage; for pcap analysis also bytes_total, bytes_parsed, packets_evaluated).
+    """
+    return _get_job(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Result of a finished background job, as the synchronous endpoint would
+    have returned it (a failed job answers with its error). 409 while it runs.
+    """
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}.")
+
+    body, media_type = job.result
+    if job.filename is not None:
+        return FileResponse(path=body, filename=job.filename, media_type=media_type)
+    return Response(content=body, media_type=media_type)
+
+# --- RESULTS ---
+
+def _result_query(query, *args, **kwargs):
+    """Run a result_db query; 404 for an unknown or evicted result id."""
+    try:
+        return query(*args, **kwargs)
+    except result_store.ResultNotFound:
+        raise HTTPException(status_code=404, detail="Unknown or evicted result.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/results")
+def list_results(request: Request):
+    """This client's stored analyses (newest first), without their data."""
+    return {"results": result_db.list_results(_client_id(request))}
+
+@app.get("/results/{result_id}")
+def get_result(request: Request, result_id: str):
+    """Summary and report of a stored analysis."""
+    return _result_query(result_db.get, _client_id(request), result_id)
+
+@app.get("/results/{result_id}/timeline")
+def get_result_timeline(
+    request: Request,
+    result_id: str,
+    cursor: Optional[int] = None,
+    limit: int = Query(result_store.DEFAULT_PAGE_SIZE, ge=1, le=result_store.MAX_PAGE_SIZE),
+    src_ip: Optional[str] = None,
+    dst_ip: Optional[str] = None,
+    dst_port: Optional[int] = None,
+    protocol: Optional[str] = None,
+    lane: Optional[str] = None,
+    action: Optional[str] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None
+):
+    """
+    One page of a stored timeline in capture order, filtered by any of
+    src_ip, dst_ip, dst_port, protocol, lane, action and the capture-time
+    window [start_ts, end_ts). Pass the returned next_cursor as cursor for
+    the next page (null on the last one).
+    """
+    return _result_query(
+        result_db.timeline, _client_id(request), result_id, cursor, limit,
+        src_ip=src_ip, dst_ip=dst_ip, dst_port=dst_port, protocol=protocol,
+        lane=lane, action=action, start_ts=start_ts, end_ts=end_ts
+    )
+
+@app.get("/results/{result_id}/detections")
+def get_result_detections(
+    request: Request,
+    result_id: str,
+    cursor: Optional[int] = None,
+    limit: int = Query(result_store.DEFAULT_PAGE_SIZE, ge=1, le=result_store.MAX_PAGE_SIZE),
+    rule_id: Optional[str] = None
+):
+    """One page of a stored analysis' detections (optionally of one rule), cursor-paged like the timeline."""
+    return _result_query(result_db.detections, _client_id(request), result_id, cursor, limit, rule_id=rule_id)
+
+@app.delete("/results/{result_id}")
+def delete_result(request: Request, result_id: str):
+    """Drop one of this client's stored analyses."""
+    _result_query(result_db.delete, _client_id(request), result_id)
+    return {"ok": True}
@@ -0,0 +1,199 @@
+# conftest.py
+# Shared fixtures for the H-SAFE test suite: synthetic captures and a rule set
+#
+# Run from the repository root: python -m pytest -q tests
+
+import os
+import random
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR_DIR = os.path.join(ROOT_DIR, "Simulator")
+
+# Simulator modules import each other flat, as backend/main.py arranges
+sys.path.insert(0, SIMULATOR_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+
+# =========================
+# RULES
+# =========================
+
+RULES = [
+    {"rule_id": "r1", "name": "ssh alert", "description": "", "severity": "HIGH", "protocol": "TCP",
+     "conditions": {"dst_port": 22}, "action": "ALERT", "enabled": True, "position": 0},
+    {"rule_id": "r2", "name": "rdp deny", "description": "", "severity": "CRITICAL", "protocol": "TCP",
+     "conditions": {"dst_port": 3389}, "action": "DENY", "enabled": True, "position": 1},
+    {"rule_id": "r3", "name": "host allow", "description": "", "severity": "LOW", "protocol": None,
+     "conditions": {"dst_ip": "192.168.1.3"}, "action": "ALLOW", "enabled": True, "position": 2},
+    {"rule_id": "r4", "name": "big udp", "description": "", "severity": "MEDIUM", "protocol": "UDP",
+     "conditions": {"min_payload_size": 100}, "action": "DENY", "enabled": True, "position": 3},
+    {"rule_id": "r5", "name": "src alert", "description": "", "severity": "LOW", "protocol": None,
+     "conditions": {"src_ip": "10.0.1.5"}, "action": "ALERT", "enabled": True, "position": 4},
+    {"rule_id": "r6", "name": "ssh deny", "description": "", "severity": "HIGH", "protocol": "TCP",
+     "conditions": {"dst_port": 22, "max_payload_size": 200}, "action": "DENY", "enabled": True, "position": 5},
+    {"rule_id": "r7", "name": "icmp", "description": "", "severity": "LOW", "protocol": "ICMP",
+     "conditions": {}, "action": "ALERT", "enabled": True, "position": 6},
+    {"rule_id": "r8", "name": "disabled web deny", "description": "", "severity": "HIGH", "protocol": "TCP",
+     "conditions": {"dst_port": 80}, "action": "DENY", "enabled": False, "position": 7},
+]
+
+
+@pytest.fixture
+def rules():
+    return [dict(rule, conditions=dict(rule["conditions"])) for rule in RULES]
+
+
+# =========================
+# CAPTURES
+# =========================
+
+PACKET_COUNT = 600
+
+
+def _packets(seed: int, count: int = PACKET_COUNT):
+    """
+    Deterministic mix of TCP / UDP / ICMP over IPv4 plus ARP and IPv6
+    frames the analysis skips. Timestamps carry sub-microsecond parts.
+    """
+    from scapy.all import ARP, ICMP, IP, IPv6, TCP, UDP, Ether, Raw
+
+    rng = random.Random(seed)
+    packets = []
+    timestamp = 1700000000.0
+    for _ in range(count):
+        timestamp += rng.random() * 0.01
+        src = f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 20)}"
+        dst = f"192.168.1.{rng.randint(1, 10)}"
+        kind = rng.random()
+        if kind < 0.5:
+            packet = Ether() / IP(src=src, dst=dst) / TCP(
+                sport=rng.randint(1024, 1100), dport=rng.choice([22, 80, 443, 3389, 8080])
+            ) / Raw(b"x" * rng.randint(0, 300))
+        elif kind < 0.8:
+            packet = Ether() / IP(src=src, dst=dst) / UDP(
+                sport=rng.randint(1024, 1100), dport=rng.choice([53, 123, 161])
+            ) / Raw(b"y" * rng.randint(0, 150))
+        elif kind < 0.9:
+            packet = Ether() / IP(src=src, dst=dst) / ICMP()
+        elif kind < 0.95:
+            packet = Ether() / ARP()
+        else:
+            packet = Ether() / IPv6() / UDP()
+        packet.time = timestamp
+        packets.append(packet)
+    return packets
+
+
+@pytest.fixture(scope="session")
+def captures(tmp_path_factory):
+    """
+    {name: path} of the same traffic as pcap (micro- and nanosecond),
+    pcapng, and a pcap whose records are out of time order.
+    """
+    from scapy.utils import PcapNgWriter, wrpcap
+
+    directory = tmp_path_factory.mktemp("captures")
+    packets = _packets(seed=1)
+    shuffled = list(packets)
+    random.Random(2).shuffle(shuffled)
+
+    paths = {name: str(directory / name) for name in ("us.pcap", "ns.pcap", "capture.pcapng", "shuffled.pcap")}
+    wrpcap(paths["us.pcap"], packets)
+    wrpcap(paths["ns.pcap"], packets, nano=True)
+    wrpcap(paths["shuffled.pcap"], shuffled)
+    writer = PcapNgWriter(paths["capture.pcapng"])
+    for packet in packets:
+        writer.write(packet)
+    writer.close()
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def parse_cache_dir(tmp_path, monkeypatch):
+    """
+    Keep the parse cache of each test in its own directory.
+    """
+    import parse_cache
+
+    monkeypatch.setattr(parse_cache, "PARSE_CACHE_DIR", str(tmp_path / "parse_cache"))
+    parse_cache.clear_cache()
+    return parse_cache.PARSE_CACHE_DIR
+
+
+# =========================
+# API
+# =========================
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+    TestClient of backend.main with its capture, job and result stores
+    under tmp_path and a thread-mode job pool (replace main.jobs to test
+    process mode or admission limits).
+    """
+    from fastapi.testclient import TestClient
+
+    import capture_store
+    import job_pool
+    import job_store
+    import result_store
+    from backend import main
+
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(main, "captures", capture_store.CaptureStore(str(upload_dir / "captures")))
+    monkeypatch.setattr(main, "job_results", job_store.JobStore(str(upload_dir / "jobs")))
+    monkeypatch.setattr(main, "RESULT_DB_PATH", str(upload_dir / "results.sqlite3"))
+    monkeypatch.setattr(main, "result_db", result_store.ResultStore(main.RESULT_DB_PATH))
+    monkeypatch.setattr(main, "jobs", job_pool.JobPool(max_workers=0, max_queued=8))
+
+    with TestClient(main.app, headers={"X-Client-Id": "tester"}) as client:
+        yield client
+
+
+@pytest.fixture
+def wait_for_job(api):
+    """
+    job_id -> its status once the background job finished (or after timeout seconds).
+    """
+    import time
+
+    def wait(job_id: str, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            status = api.get(f"/jobs/{job_id}").json()
+            if status["status"] in ("done", "failed") or time.monotonic() > deadline:
+                return status
+            time.sleep(0.02)
+
+    return wait
+
+
+# =========================
+# COMPARISON
+# =========================
+
+def _stable_detection(detection):
+    # detection_id is random and timestamp is the time of the analysis
+    return {key: value for key, value in detection.items() if key not in ("detection_id", "timestamp")}
+
+
+@pytest.fixture
+def comparable():
+    """
+    simulate_pcap_flow result -> form that compares equal across runs
+    (Detection dicts without their per-run fields).
+    """
+    from detection_records import DetectionRecords
+
+    def convert(result):
+        detections = result["detections"]
+        if isinstance(detections, DetectionRecords):
+            detections = detections.materialize()
+        return {**result, "detections": [_stable_detection(d) for d in detections]}
+
+    return convert
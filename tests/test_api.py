@@ -0,0 +1,139 @@
+# test_api.py
+# Endpoints outside the capture analysis: rules, topology simulation and report export
+
+import json
+
+import pytest
+
+
+def _without_time(result):
+    # The simulated packet is stamped with the time of the run
+    return {**result, "packet": {**result["packet"], "timestamp": None}}
+
+
+@pytest.fixture
+def topology_request(api):
+    topology = api.post("/simulate/topology/generate", json={"prompt": "small office"}).json()
+    return {
+        "topology": topology,
+        "attacker_node": topology["nodes"][0]["id"],
+        "target_node": topology["nodes"][2]["id"],
+        "dst_port": 22,
+        "packet_count": 2,
+        "rules": []
+    }
+
+
+@pytest.fixture
+def report(api, captures, rules):
+    with open(captures["us.pcap"], "rb") as f:
+        response = api.post("/analyze/pcap", files={"file": ("us.pcap", f)}, data={"rules_json": json.dumps(rules)})
+    return response.json()
+
+
+@pytest.fixture
+def rule_store(tmp_path, monkeypatch):
+    """
+    Server-side rules in an empty store under tmp_path.
+    """
+    import rule_addition
+
+    monkeypatch.setattr(rule_addition, "RULE_STORE_PATH", str(tmp_path / "rules.json"))
+    monkeypatch.setattr(rule_addition, "BUNDLED_RULES_PATH", str(tmp_path / "missing.json"))
+
+
+def _rule(name: str, dst_port: int):
+    return {"name": name, "description": "", "severity": "HIGH", "action": "DENY", "protocol": "TCP",
+            "conditions": {"dst_port": dst_port}}
+
+
+# =========================
+# RULES
+# =========================
+
+def test_root(api):
+    assert api.get("/").json() == {"message": "H-Safe Simulator API is running"}
+
+
+def test_rule_lifecycle(api, rule_store):
+    assert api.get("/rules").json() == []
+    ssh = api.post("/rules", json=_rule("ssh", 22)).json()
+    rdp = api.post("/rules", json=_rule("rdp", 3389)).json()
+    assert [rule["rule_id"] for rule in api.get("/rules").json()] == [ssh["rule_id"], rdp["rule_id"]]
+
+    assert api.post(f"/rules/{rdp['rule_id']}/move", json={"new_position": 0}).json() == {"ok": True}
+    assert [rule["name"] for rule in api.get("/rules").json()] == ["rdp", "ssh"]
+
+    updated = api.put(f"/rules/{ssh['rule_id']}", json=_rule("ssh", 2222)).json()
+    assert updated["rule_id"] == ssh["rule_id"] and updated["conditions"] == {"dst_port": 2222}
+    assert api.patch(f"/rules/{ssh['rule_id']}/status", json={"enabled": False}).json()["enabled"] is False
+
+    assert api.delete(f"/rules/{rdp['rule_id']}").json() == {"ok": True}
+    assert [rule["name"] for rule in api.get("/rules").json()] == ["ssh"]
+
+
+def test_invalid_and_unknown_rules(api, rule_store):
+    assert api.post("/rules", json={**_rule("bad", 22), "severity": "EXTREME"}).status_code == 400
+    assert api.post("/rules/nope/move", json={"new_position": 0}).status_code == 404
+    assert api.put("/rules/nope", json=_rule("ssh", 22)).status_code == 404
+    assert api.patch("/rules/nope/status", json={"enabled": True}).status_code == 404
+    assert api.delete("/rules/nope").status_code == 404
+
+
+# =========================
+# TOPOLOGY
+# =========================
+
+def test_generated_topology_links_its_nodes(topology_request):
+    topology = topology_request["topology"]
+    node_ids = {node["id"] for node in topology["nodes"]}
+    assert len(node_ids) >= 3
+    assert {link["source_node_id"] for link in topology["links"]} <= node_ids
+
+
+def test_topology_simulation_runs_in_the_pool(api, topology_request):
+    import topology_simulation
+
+    response = api.post("/simulate/topology", json=topology_request)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["path"][0] == topology_request["attacker_node"]
+    assert result["path"][-1] == topology_request["target_node"]
+    assert _without_time(result) == _without_time(json.loads(json.dumps(topology_simulation.simulate_attack(
+        topology_request["topology"], topology_request["attacker_node"], topology_request["target_node"],
+        dst_port=22, packet_count=2, rules=[]
+    ))))
+    assert api.get("/jobs/status").json()["pool"]["running"] == 0
+
+
+def test_background_topology_simulation(api, wait_for_job, topology_request):
+    accepted = api.post("/simulate/topology", params={"background": "true"}, json=topology_request)
+    assert accepted.status_code == 202 and accepted.json()["kind"] == "simulate/topology"
+    assert wait_for_job(accepted.json()["job_id"])["status"] == "done"
+
+    result = api.get(f"/jobs/{accepted.json()['job_id']}/result").json()
+    assert _without_time(result) == _without_time(api.post("/simulate/topology", json=topology_request).json())
+
+
+# =========================
+# REPORT EXPORT
+# =========================
+
+@pytest.mark.parametrize("export_format, media_type", (("csv", "text/csv"), ("json", "application/json")))
+def test_report_export(api, report, export_format, media_type):
+    response = api.post("/report/export", json={
+        "report": report["report"],
+        "timeline": report["simulation"]["timeline"][:10],
+        "format": export_format,
+        "original_filename": "us.pcap"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    disposition = response.headers["content-disposition"]
+    assert 'filename="us' in disposition and disposition.endswith(f'.{export_format}"')
+    assert response.content
+
+
+def test_report_export_rejects_unknown_formats(api, report):
+    response = api.post("/report/export", json={"report": report["report"], "format": "docx"})
+    assert response.status_code == 400
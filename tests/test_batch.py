@@ -0,0 +1,120 @@
+# test_batch.py
+# Batch analysis of several captures: input expansion, the merged result and the batch endpoint
+
+import json
+import zipfile
+from itertools import groupby
+from pathlib import Path
+
+import pytest
+
+import pcap_analysis
+import pcap_batch
+
+
+@pytest.fixture
+def inputs(captures, tmp_path):
+    """
+    A capture, a file that is not one, an archive of two captures
+    (one out of time order) and another capture, in that order.
+    """
+    junk = tmp_path / "notes.txt"
+    junk.write_text("not a capture")
+    archive = tmp_path / "rotated.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.write(captures["shuffled.pcap"], "a/shuffled.pcap")
+        zf.write(captures["ns.pcap"], "b/ns.pcap")
+    return [
+        ("us.pcap", captures["us.pcap"]),
+        ("notes.txt", str(junk)),
+        ("rotated.zip", str(archive)),
+        ("capture.pcapng", captures["capture.pcapng"]),
+    ]
+
+
+@pytest.mark.parametrize("workers", (1, 2))
+def test_files_are_listed_in_input_order(inputs, rules, tmp_path, workers):
+    batch = pcap_batch.simulate_pcap_batch(inputs, rules, str(tmp_path / "work"), workers=workers)
+
+    assert [entry["file"] for entry in batch["files"]] == [
+        "us.pcap", "notes.txt", "rotated.zip/a/shuffled.pcap", "rotated.zip/b/ns.pcap", "capture.pcapng"
+    ]
+    assert "error" in batch["files"][1]
+    assert [entry.get("format") for entry in batch["files"]] == ["pcap", None, "pcap", "pcap", "pcapng"]
+
+
+def test_merged_timeline_is_in_time_order(inputs, rules, tmp_path):
+    batch = pcap_batch.simulate_pcap_batch(
+        inputs, rules, str(tmp_path / "work"), workers=1, compact_detections=True
+    )
+    combined = batch["combined"]
+    timeline = combined["timeline"]
+    timestamps = [entry["timestamp"] for entry in timeline]
+
+    assert timestamps == sorted(timestamps)
+    assert [entry["index"] for entry in timeline] == list(range(len(timeline)))
+    assert combined["summary"]["total_packets"] == len(timeline) == sum(
+        entry["summary"]["total_packets"] for entry in batch["files"] if "summary" in entry
+    )
+    assert combined["summary"]["duration"] == timestamps[-1] - timestamps[0]
+
+    # Detections follow their packets to the merged positions, in timeline order
+    detections = combined["detections"]
+    assert len(detections.packet_index) > 0
+    assert list(detections.packet_index) == sorted(detections.packet_index)
+    for packet_index, packet in zip(detections.packet_index, detections.packets):
+        entry = timeline[packet_index]
+        assert (entry["timestamp"], entry["src_ip"], entry["dst_ip"]) == (
+            packet["timestamp"], packet["src_ip"], packet["dst_ip"]
+        )
+
+
+def test_merge_sorts_out_of_order_captures(captures, rules, comparable):
+    ordered = pcap_batch._analyze_capture(captures["us.pcap"], rules, "python", 256)
+    shuffled = pcap_batch._analyze_capture(captures["shuffled.pcap"], rules, "python", 256)
+    assert not pcap_batch._in_time_order(shuffled["timeline"])
+
+    # The same traffic in time order and shuffled: every packet pairs with its copy
+    merged = pcap_batch.merge_results(["ordered", "shuffled"], [ordered, shuffled])
+    timeline = merged["timeline"]
+    assert [entry["file"] for entry in timeline] == ["ordered", "shuffled"] * (len(timeline) // 2)
+    for first, second in zip(timeline[::2], timeline[1::2]):
+        assert {**first, "index": 0, "file": ""} == {**second, "index": 0, "file": ""}
+
+    # Each packet's detections (in rule order) come from the ordered copy, then the shuffled one
+    serial = comparable(pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules))["detections"]
+    expected = []
+    for _, group in groupby(serial, key=lambda detection: detection["packet"]["timestamp"]):
+        group = list(group)
+        expected += [dict(detection, file="ordered") for detection in group]
+        expected += [dict(detection, file="shuffled") for detection in group]
+    assert comparable(merged)["detections"] == expected
+
+
+# =========================
+# API
+# =========================
+
+def _uploads(inputs):
+    return [("files", (label, Path(path).read_bytes())) for label, path in inputs]
+
+
+def test_batch_endpoint_reports_every_file(api, inputs, rules):
+    response = api.post(
+        "/analyze/pcap/batch", files=_uploads(inputs), data={"rules_json": json.dumps(rules), "workers": "1"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert [entry["file"] for entry in result["files"]] == [
+        "us.pcap", "notes.txt", "rotated.zip/a/shuffled.pcap", "rotated.zip/b/ns.pcap", "capture.pcapng"
+    ]
+    total = result["simulation"]["summary"]["total_packets"]
+    assert total == sum(entry["summary"]["total_packets"] for entry in result["files"] if "summary" in entry)
+    assert result["report"]["overview"]["total_packets"] == total
+    assert api.get("/jobs/status").json()["pool"]["running"] == 0
+
+
+def test_batch_without_captures_answers_400(api, inputs):
+    response = api.post("/analyze/pcap/batch", files=_uploads(inputs[1:2]))
+    assert response.status_code == 400
+    assert "No analyzable" in response.json()["detail"]
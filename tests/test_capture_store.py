@@ -0,0 +1,168 @@
+# test_capture_store.py
+# Content-addressed captures: deduplication, per-client references, quotas, eviction and leases
+
+import hashlib
+import io
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import capture_store
+from capture_store import CaptureNotFound, CaptureStore, QuotaExceeded
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Strictly increasing store time, so least-recently-used order never ties.
+    """
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(capture_store, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return CaptureStore(str(tmp_path / "captures"))
+
+
+def _add(store, client_id, data: bytes, name=None):
+    return store.add_file(io.BytesIO(data), client_id, name)
+
+
+def _files(store):
+    return sorted(name for name in os.listdir(store.directory) if name.endswith(".pcap"))
+
+
+# =========================
+# STORE
+# =========================
+
+def test_capture_id_is_the_content_hash(store):
+    stored = _add(store, "alice", b"abc" * 100, "a.pcap")
+    assert stored == {
+        "capture_id": hashlib.sha256(b"abc" * 100).hexdigest(), "size": 300, "name": "a.pcap", "deduplicated": False
+    }
+    with open(store.path(stored["capture_id"]), "rb") as f:
+        assert f.read() == b"abc" * 100
+    assert not [name for name in os.listdir(store.directory) if name.endswith(".part")]
+
+
+def test_same_bytes_are_stored_once(store):
+    first = _add(store, "alice", b"same", "a.pcap")
+    second = _add(store, "bob", b"same")
+    assert second["capture_id"] == first["capture_id"] and second["deduplicated"]
+    assert len(_files(store)) == 1
+    assert store.stats()["deduplicated"] == 1 and store.stats()["clients"] == 2
+
+    # The file goes with its last reference
+    assert store.release("alice", first["capture_id"]) == 1
+    assert len(_files(store)) == 1
+    assert store.release("bob") == 1
+    assert _files(store) == []
+
+
+def test_resolve_is_scoped_per_client(store):
+    older = _add(store, "alice", b"older")["capture_id"]
+    newer = _add(store, "alice", b"newer")["capture_id"]
+    assert store.resolve("alice") == newer
+    assert store.resolve("alice", older) == older
+    assert store.resolve("alice") == older  # Resolving marks it used
+
+    with pytest.raises(CaptureNotFound):
+        store.resolve("bob", older)
+    with pytest.raises(CaptureNotFound):
+        store.resolve("bob")
+
+
+def test_re_adding_without_a_name_keeps_it(store):
+    capture_id = _add(store, "alice", b"named", "first.pcap")["capture_id"]
+    _add(store, "alice", b"named")
+    assert [(c["capture_id"], c["name"]) for c in store.list_captures("alice")] == [(capture_id, "first.pcap")]
+
+
+def test_client_capture_count_drops_the_least_recently_used(tmp_path, clock):
+    store = CaptureStore(str(tmp_path / "captures"), client_max_captures=2)
+    ids = [_add(store, "alice", bytes([i]) * 10)["capture_id"] for i in range(3)]
+    assert [c["capture_id"] for c in store.list_captures("alice")] == [ids[2], ids[1]]
+    assert not os.path.exists(store.path(ids[0]))
+
+
+def test_client_byte_quota(tmp_path, clock):
+    store = CaptureStore(str(tmp_path / "captures"), client_quota_bytes=100)
+    first = _add(store, "alice", b"a" * 60)["capture_id"]
+    second = _add(store, "alice", b"b" * 60)["capture_id"]
+    assert [c["capture_id"] for c in store.list_captures("alice")] == [second]
+    assert not os.path.exists(store.path(first))
+
+    with pytest.raises(QuotaExceeded):
+        _add(store, "alice", b"c" * 101)
+    assert [name for name in os.listdir(store.directory) if name.endswith(".part")] == []
+
+
+def test_store_cap_spares_leased_captures(tmp_path, clock):
+    store = CaptureStore(str(tmp_path / "captures"), max_bytes=100)
+    leased = _add(store, "alice", b"a" * 60)["capture_id"]
+    with store.lease(leased) as path:
+        newest = _add(store, "bob", b"b" * 60)["capture_id"]
+        assert os.path.exists(path)
+
+        # Neither the leased capture nor the one being added is evicted
+        assert store.stats()["evicted"] == 0
+        assert store.stats()["leased"] == 1
+
+    _add(store, "carol", b"c" * 60)
+    assert not os.path.exists(store.path(leased)) and not os.path.exists(store.path(newest))
+    assert store.stats()["evicted"] == 2
+
+
+def test_released_capture_outlives_its_lease(store):
+    capture_id = _add(store, "alice", b"leased")["capture_id"]
+    with store.lease(capture_id) as path:
+        store.release("alice", capture_id)
+        assert os.path.exists(path)
+    # Collected by the next eviction pass
+    _add(store, "alice", b"other")
+    assert not os.path.exists(store.path(capture_id))
+
+    with pytest.raises(CaptureNotFound):
+        with store.lease(capture_id):
+            pass
+
+
+# =========================
+# API
+# =========================
+
+def test_pcap_endpoints_are_scoped_per_client(api, captures):
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    assert api.get("/pcap/status").json() == {"exists": False, "capture_id": None}
+    assert api.post("/analyze/pcap").status_code == 400
+
+    stored = api.post("/pcap", files={"file": ("us.pcap", body)}).json()
+    assert not stored["deduplicated"]
+    assert api.post("/pcap", files={"file": ("again.pcap", body)}).json()["deduplicated"]
+    assert api.get("/pcap/status").json() == {"exists": True, "capture_id": stored["capture_id"]}
+    assert [c["name"] for c in api.get("/pcap/captures").json()["captures"]] == ["again.pcap"]
+
+    # The latest capture is analyzed by default
+    response = api.post("/analyze/pcap")
+    assert response.status_code == 200 and response.headers["X-Capture-Id"] == stored["capture_id"]
+
+    other = {"X-Client-Id": "someone-else"}
+    assert api.post("/analyze/pcap", data={"capture_id": stored["capture_id"]}, headers=other).status_code == 404
+    assert api.get("/pcap/captures", headers=other).json() == {"captures": []}
+    assert api.delete("/pcap", headers=other).json() == {"ok": True, "released": 0}
+
+    assert api.get("/pcap/store/stats").json()["captures"] == 1
+    assert api.delete("/pcap", params={"capture_id": stored["capture_id"]}).json() == {"ok": True, "released": 1}
+    assert api.get("/pcap/store/stats").json()["captures"] == 0
+
+
+def test_upload_over_quota_answers_413(api, monkeypatch):
+    from backend import main
+
+    monkeypatch.setattr(main.captures, "client_quota_bytes", 10)
+    assert api.post("/pcap", files={"file": ("big.pcap", b"x" * 11)}).status_code == 413
@@ -0,0 +1,57 @@
+# test_detection_records.py
+# Compact detection records: stable ids, rule tables and the JSON form
+
+import pytest
+
+import pcap_analysis
+from detection_records import DetectionRecords
+
+
+@pytest.fixture
+def records(captures, rules):
+    result = pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules, engine="compiled", compact_detections=True)
+    assert isinstance(result["detections"], DetectionRecords)
+    return result["detections"]
+
+
+def test_detection_ids_are_stable_across_reads(records):
+    ids = [detection["detection_id"] for detection in records]
+    assert len(ids) > 1
+    assert len(set(ids)) == len(ids)
+    assert [detection["detection_id"] for detection in records.materialize()] == ids
+    assert [records[i]["detection_id"] for i in range(len(records))] == ids
+
+
+def test_detection_ids_differ_between_analyses(captures, rules, records):
+    again = pcap_analysis.simulate_pcap_flow(
+        captures["us.pcap"], rules, engine="compiled", compact_detections=True
+    )["detections"]
+    again.timestamp = records.timestamp + 1
+    assert {detection["detection_id"] for detection in again}.isdisjoint(
+        detection["detection_id"] for detection in records
+    )
+
+
+def test_records_read_like_detection_dicts(records):
+    detection = records[0]
+    rule = records.rules[records.rule_index[0]]
+    assert detection["rule_id"] == rule["rule_id"]
+    assert detection["packet"] is records.packets[0]
+    assert detection["timestamp"] == records.timestamp
+    assert set(detection["matched_fields"]) <= set(rule["conditions"]) | {"src_ip", "dst_ip", "src_port", "dst_port"}
+
+
+def test_extend_appends_a_different_rule_table(rules):
+    packets = [{"src_ip": "10.0.0.1", "dst_ip": "10.0.0.2", "protocol": "TCP", "src_port": 1, "dst_port": 22,
+                "payload_size": 10, "timestamp": float(i)} for i in range(3)]
+    first = DetectionRecords.from_pairs(rules[:2], packets, [0, 2], [0, 1])
+    second = DetectionRecords.from_pairs(rules[2:4], packets, [1], [1])
+
+    first.extend(second, offset=3)
+    assert first.packet_index == [0, 2, 4]
+    assert [first.rules[i]["rule_id"] for i in first.rule_index] == ["r1", "r2", "r4"]
+
+    first.shift(10)
+    compact = first.to_dict()
+    assert compact["packet_index"] == [10, 12, 14]
+    assert [compact["rules"][i]["rule_id"] for i in compact["rule_index"]] == ["r1", "r2", "r4"]
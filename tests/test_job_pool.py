@@ -0,0 +1,109 @@
+# test_job_pool.py
+# Job pool admission: slot accounting, saturation and the API's 429 answers
+
+import asyncio
+
+import pytest
+
+import job_pool
+from backend import main
+
+
+# =========================
+# POOL
+# =========================
+
+def test_reserve_counts_slots_up_to_capacity():
+    pool = job_pool.JobPool(max_workers=2, max_queued=1)
+    assert pool.capacity == 3
+
+    wide = pool.reserve(2)
+    narrow = pool.reserve()
+    with pytest.raises(job_pool.PoolSaturated):
+        pool.reserve()
+    assert pool.stats()["running"] == 2 and pool.stats()["queued"] == 1
+
+    wide.release()
+    wide.release()  # Idempotent
+    with pytest.raises(job_pool.PoolSaturated):
+        pool.reserve(3)
+    pool.reserve(2).release()
+    narrow.release()
+    assert pool.stats()["running"] == 0
+
+
+def test_detached_slot_is_released_by_its_new_owner():
+    pool = job_pool.JobPool(max_workers=1, max_queued=0)
+    slot = pool.reserve()
+    owner = slot.detach()
+    slot.release()
+    with pytest.raises(job_pool.PoolSaturated):
+        pool.reserve()
+    owner.release()
+    pool.reserve().release()
+    with pytest.raises(RuntimeError):
+        slot.detach()
+
+
+def test_job_workers_are_capped_at_the_pool_size():
+    pool = job_pool.JobPool(max_workers=4, max_queued=0)
+    assert pool.job_workers(2) == 2
+    assert pool.job_workers(64) == 4
+    assert 1 <= pool.job_workers(None) <= 4
+    assert job_pool.JobPool(max_workers=0).job_workers(8) == 1
+
+
+def test_run_admits_and_releases():
+    pool = job_pool.JobPool(max_workers=0, max_queued=0)
+    assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+    pool.reserve().release()
+    pool.shutdown()
+
+
+# =========================
+# API ADMISSION
+# =========================
+
+@pytest.fixture
+def process_pool(api, monkeypatch):
+    """
+    Four worker processes, nothing queued: capacity of four slots.
+    """
+    pool = job_pool.JobPool(max_workers=4, max_queued=0)
+    monkeypatch.setattr(main, "jobs", pool)
+    return pool
+
+
+def test_saturated_pool_answers_429(api, process_pool, captures):
+    held = process_pool.reserve(4)
+    with open(captures["us.pcap"], "rb") as f:
+        response = api.post("/analyze/pcap", files={"file": ("us.pcap", f)})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"]
+    assert api.get("/jobs/status").json()["pool"]["running"] == 4
+    held.release()
+
+
+def test_parallel_request_holds_a_slot_per_worker(api, process_pool, captures):
+    with open(captures["us.pcap"], "rb") as f:
+        stored = api.post("/pcap", files={"file": ("us.pcap", f)}).json()
+
+    held = process_pool.reserve(1)
+    data = {"capture_id": stored["capture_id"], "workers": "4", "cached": "false"}
+    assert api.post("/analyze/pcap", data=data).status_code == 429
+    held.release()
+    assert api.post("/analyze/pcap", data=data).status_code == 200
+    assert api.get("/jobs/status").json()["pool"]["running"] == 0
+
+
+def test_cached_request_holds_one_slot(api, process_pool, captures):
+    with open(captures["us.pcap"], "rb") as f:
+        stored = api.post("/pcap", files={"file": ("us.pcap", f)}).json()
+
+    # Cached runs are serial, so workers=4 must not need four slots
+    held = process_pool.reserve(3)
+    data = {"capture_id": stored["capture_id"], "workers": "4", "cached": "true"}
+    response = api.post("/analyze/pcap", data=data)
+    assert response.status_code == 200
+    assert response.json()["simulation"]["summary"]["total_packets"] > 0
+    held.release()
@@ -0,0 +1,140 @@
+# test_job_store.py
+# Background jobs: progress files, job lifecycle, TTL / size eviction and the /jobs endpoints
+
+import json
+import os
+
+import pytest
+
+import job_store
+from job_store import Job, JobStore, ProgressFile
+
+
+# =========================
+# PROGRESS / JOBS
+# =========================
+
+def test_progress_writes_are_throttled_within_a_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "PROGRESS_INTERVAL", 3600)
+    path = str(tmp_path / "progress.json")
+    writer = ProgressFile(path)
+
+    writer.write({"stage": "parsing", "packets": 1})
+    writer.write({"stage": "parsing", "packets": 2})
+    assert job_store.read_progress(path) == {"stage": "parsing", "packets": 1}
+    writer.write({"stage": "reporting"})
+    assert job_store.read_progress(path) == {"stage": "reporting"}
+
+    ProgressFile(None).write({"stage": "parsing"})
+    assert job_store.read_progress(str(tmp_path / "missing.json")) is None
+
+
+def test_job_picks_up_progress_and_keeps_only_its_result(tmp_path):
+    job = Job("analyze/pcap", str(tmp_path))
+    assert job.to_dict()["status"] == "queued" and job.to_dict()["expires_at"] is None
+
+    ProgressFile(job.progress_path).write({"stage": "parsing", "bytes_parsed": 10})
+    job.refresh()
+    assert job.status == "running" and job.progress["bytes_parsed"] == 10
+
+    result_path = job.path("csv")
+    for path in (result_path, job.path("pcap")):
+        with open(path, "w") as f:
+            f.write("x")
+    job.finish((result_path, "text/csv"), filename="report.csv")
+    assert job.status == "done" and job.progress["stage"] == "done" and job.result_bytes == 1
+    assert os.listdir(tmp_path) == [os.path.basename(result_path)]
+    assert job.to_dict()["expires_at"] == job.finished_at + job.ttl
+
+    job.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_job_keeps_its_error(tmp_path):
+    job = Job("simulate/topology", str(tmp_path))
+    job.fail(400, "bad input")
+    assert (job.status, job.error_status, job.error) == ("failed", 400, "bad input")
+    assert job.to_dict()["progress"]["stage"] == "failed"
+
+
+def test_finished_jobs_expire_after_their_ttl(tmp_path):
+    store = JobStore(str(tmp_path), ttl=0)
+    running, finished = store.create("a"), store.create("b")
+    finished.finish((b"result", "application/json"))
+
+    assert store.get(finished.job_id) is None
+    assert store.get(running.job_id) is running
+    assert store.stats()["expired"] == 1 and store.stats()["queued"] == 1
+
+
+def test_oldest_finished_jobs_are_evicted_first(tmp_path):
+    store = JobStore(str(tmp_path), max_jobs=2, max_result_bytes=10)
+    unfinished = store.create("running")
+    jobs = [store.create("done") for _ in range(3)]
+    for job in jobs:
+        job.finish((b"12345", "application/json"))
+    store.evict()
+    # Two results of 5 bytes fit; the unfinished job is never evicted
+    assert [store.get(job.job_id) is not None for job in jobs] == [False, True, True]
+    assert store.get(unfinished.job_id) is unfinished
+
+    big = store.create("big")
+    big.finish((b"x" * 50, "application/json"))
+    store.evict()
+    # The newest result stays even when it alone is over the byte limit
+    assert store.get(big.job_id) is big
+    assert store.stats()["done"] == 1 and store.stats()["evicted"] == 3
+
+
+# =========================
+# API
+# =========================
+
+def test_background_analysis_matches_the_synchronous_one(api, wait_for_job, captures, rules, comparable):
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    data = {"rules_json": json.dumps(rules)}
+
+    accepted = api.post("/analyze/pcap", params={"background": "true"}, files={"file": ("us.pcap", body)}, data=data)
+    assert accepted.status_code == 202 and accepted.headers["X-Capture-Id"]
+    status = wait_for_job(accepted.json()["job_id"])
+    assert status["status"] == "done" and status["progress"]["stage"] == "done"
+
+    result = api.get(f"/jobs/{status['job_id']}/result").json()
+    expected = api.post("/analyze/pcap", files={"file": ("us.pcap", body)}, data=data).json()
+    assert comparable(result["simulation"]) == comparable(expected["simulation"])
+    assert api.get("/jobs/status").json()["store"]["done"] == 1
+
+
+def test_failed_background_job_answers_like_the_synchronous_endpoint(api, wait_for_job):
+    capture = b"\x0a\x0d\x0d\x0a" + bytes(24)
+    accepted = api.post("/analyze/pcap", params={"background": "true"}, files={"file": ("bad.pcapng", capture)})
+    status = wait_for_job(accepted.json()["job_id"])
+    assert status["status"] == "failed"
+
+    synchronous = api.post("/analyze/pcap", files={"file": ("bad.pcapng", capture)})
+    result = api.get(f"/jobs/{status['job_id']}/result")
+    assert (result.status_code, result.json()) == (synchronous.status_code, synchronous.json())
+    assert result.status_code == 400
+
+
+def test_background_export_serves_the_file(api, wait_for_job):
+    report = {"overview": {"total_packets": 3}}
+    accepted = api.post("/report/export", params={"background": "true"}, json={"report": report, "format": "json"})
+    assert accepted.status_code == 202
+    assert wait_for_job(accepted.json()["job_id"])["status"] == "done"
+
+    result = api.get(f"/jobs/{accepted.json()['job_id']}/result")
+    assert result.status_code == 200 and result.headers["content-type"] == "application/json"
+    assert result.json()["overview"] == report["overview"]
+    assert "attachment" in result.headers["content-disposition"]
+
+
+def test_unknown_and_unfinished_jobs(api):
+    from backend import main
+
+    assert api.get("/jobs/0123").status_code == 404
+    assert api.get("/jobs/0123/result").status_code == 404
+    job = main.job_results.create("analyze/pcap")
+    assert api.get(f"/jobs/{job.job_id}").json()["status"] == "queued"
+    assert api.get(f"/jobs/{job.job_id}/result").status_code == 409
@@ -0,0 +1,128 @@
+# test_packet_filter.py
+# BPF-style filter compilation and its error handling
+
+import pytest
+
+import parse_cache
+import pcap_analysis
+from packet_batch import PacketBatch
+from packet_filter import (
+    MAX_FILTER_DEPTH,
+    MAX_FILTER_LENGTH,
+    FilterSyntaxError,
+    compile_filter,
+    resolve_filter
+)
+
+# (src_ip, dst_ip, protocol, src_port, dst_port, length)
+SSH = ("10.0.0.5", "192.168.1.2", "TCP", 40000, 22, 120)
+DNS = ("10.0.1.7", "8.8.8.8", "UDP", 5353, 53, 80)
+PING = ("10.0.0.5", "192.168.1.9", "ICMP", None, None, 64)
+
+FIELDS = ("src_ip", "dst_ip", "protocol", "src_port", "dst_port", "payload_size")
+
+
+@pytest.mark.parametrize(
+    "expression, matching",
+    (
+        ("tcp", (SSH,)),
+        ("tcp and dst port 22", (SSH,)),
+        ("port 53 or 22", (SSH, DNS)),
+        ("src net 10.0.0.0/24 and not icmp", (SSH,)),
+        ("host 192.168.1.9", (PING,)),
+        ("!(udp || icmp)", (SSH,)),
+        ("udp portrange 50-60", (DNS,)),
+        ("less 100", (DNS, PING)),
+        ("greater 100", (SSH,)),
+    )
+)
+def test_compiled_filters_match(expression, matching):
+    packet_filter = compile_filter(expression)
+    for fields in (SSH, DNS, PING):
+        assert packet_filter.matches(*fields) == (fields in matching), (expression, fields)
+
+    # The column form agrees row by row
+    batch = PacketBatch.from_packets([dict(zip(FIELDS, fields), timestamp=0.0) for fields in (SSH, DNS, PING)])
+    assert packet_filter.mask(batch).tolist() == [fields in matching for fields in (SSH, DNS, PING)]
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ("tcp and dst port 22", "not udp and src net 10.0.0.0/23", "portrange 1000-1050 or icmp", "ip and greater 200")
+)
+def test_cached_filter_drops_rows_before_building_packets(captures, monkeypatch, expression):
+    path = captures["us.pcap"]
+    expected = pcap_analysis.parse_pcap(path, packet_filter=expression)
+    assert expected
+
+    # First run fills the cache; the second reads its columns
+    assert pcap_analysis.parse_pcap(path, cached=True, packet_filter=expression) == expected
+    built = []
+    to_packets = PacketBatch.to_packets
+
+    def counted(batch):
+        packets = to_packets(batch)
+        built.extend(packets)
+        return packets
+
+    monkeypatch.setattr(PacketBatch, "to_packets", counted)
+    assert pcap_analysis.parse_pcap(path, cached=True, packet_filter=expression) == expected
+    assert parse_cache.cache_stats()["hits"] == 1
+    assert built == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    (
+        "",
+        "tcp and",
+        "(tcp",
+        "tcp)",
+        "port 99999",
+        "host 300.1.1.1",
+        "net 10.0.0.0/99",
+        "portrange 10",
+        "src",
+        "less x",
+        "tcp; import os",
+        "80",
+    )
+)
+def test_invalid_filters_raise_filter_syntax_error(expression):
+    with pytest.raises(FilterSyntaxError):
+        compile_filter(expression)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    (
+        "(" * 1000 + "tcp" + ")" * 1000,
+        "not " * 1000 + "tcp",
+        "!" * (MAX_FILTER_DEPTH + 1) + "tcp",
+        "(" * (MAX_FILTER_DEPTH + 1) + "tcp" + ")" * (MAX_FILTER_DEPTH + 1),
+        " or ".join(["port 80"] * 1000),
+        "(" * MAX_FILTER_LENGTH,
+    )
+)
+def test_oversized_filters_raise_filter_syntax_error(expression):
+    with pytest.raises(FilterSyntaxError):
+        compile_filter(expression)
+
+
+def test_filters_at_the_limits_compile():
+    nested = "(" * MAX_FILTER_DEPTH + "tcp" + ")" * MAX_FILTER_DEPTH
+    assert compile_filter(nested).matches(*SSH)
+    assert compile_filter("!" * MAX_FILTER_DEPTH + "tcp").matches(*SSH)
+
+    terms = (MAX_FILTER_LENGTH + 4) // len("port 1 or ")
+    flat = " or ".join(["port 1"] * terms)
+    assert len(flat) <= MAX_FILTER_LENGTH
+    assert not compile_filter(flat).matches(*SSH)
+
+
+def test_resolve_filter():
+    assert resolve_filter(None) is None
+    assert resolve_filter("   ") is None
+    packet_filter = compile_filter("tcp")
+    assert resolve_filter(packet_filter) is packet_filter
+    assert resolve_filter(" tcp ").expression == "tcp"
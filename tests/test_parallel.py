@@ -0,0 +1,100 @@
+# test_parallel.py
+# Multi-process range analysis against the sequential run
+
+import json
+
+import pytest
+
+import job_pool
+import parse_cache
+import pcap_analysis
+import pcap_parallel
+from backend import main
+
+
+def _window(path):
+    timestamps = [packet["timestamp"] for packet in pcap_analysis.parse_pcap(path)]
+    return timestamps[len(timestamps) // 4], timestamps[3 * len(timestamps) // 4]
+
+
+@pytest.mark.parametrize("name", ("us.pcap", "capture.pcapng", "shuffled.pcap"))
+@pytest.mark.parametrize(
+    "options",
+    (
+        {},
+        {"engine": "compiled", "aggregate_flows": True},
+        {"compact_detections": True, "packet_filter": "tcp or udp"},
+    ),
+    ids=("python", "compiled-flows", "compact-filtered")
+)
+def test_parallel_matches_serial(captures, rules, comparable, name, options):
+    path = captures[name]
+    serial = pcap_analysis.simulate_pcap_flow(path, rules, **options)
+    parallel = pcap_parallel.simulate_pcap_flow_parallel(path, rules, workers=2, min_packets=1, **options)
+    assert parallel is not None
+    assert comparable(parallel) == comparable(serial)
+
+
+@pytest.mark.parametrize("name", ("us.pcap", "ns.pcap", "capture.pcapng", "shuffled.pcap"))
+def test_parallel_window_matches_serial(captures, rules, comparable, name):
+    path = captures[name]
+    start_ts, end_ts = _window(path)
+    serial = pcap_analysis.simulate_pcap_flow(path, rules, start_ts=start_ts, end_ts=end_ts)
+    parallel = pcap_parallel.simulate_pcap_flow_parallel(
+        path, rules, workers=2, min_packets=1, start_ts=start_ts, end_ts=end_ts
+    )
+    assert serial["timeline"]
+    assert comparable(parallel) == comparable(serial)
+
+
+def test_small_captures_run_serially(captures, rules):
+    assert pcap_parallel.simulate_pcap_flow_parallel(captures["us.pcap"], rules, workers=2) is None
+    assert pcap_parallel.simulate_pcap_flow_parallel(captures["us.pcap"], rules, workers=1, min_packets=1) is None
+
+
+def test_plan_ranges_cover_every_record():
+    for count in (1, 7, 100):
+        for parts in (1, 3, 8, 200):
+            ranges = pcap_parallel.plan_ranges(count, parts)
+            assert ranges[0][0] == 0 and ranges[-1][1] == count
+            assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+            assert len(ranges) == min(parts, count)
+
+
+@pytest.mark.parametrize(
+    "data, parallel",
+    (
+        ({}, False),
+        ({"workers": "2"}, True),
+        ({"workers": "2", "cached": "true"}, False),
+        ({"workers": "1", "cached": "false"}, False),
+    ),
+    ids=("default-cached", "workers", "cached-wins", "serial-uncached")
+)
+def test_api_reaches_the_parallel_path(api, captures, rules, comparable, monkeypatch, tmp_path, data, parallel):
+    # Set before the pool forks its workers, so they analyze small captures
+    # in parallel too and leave a mark when they do
+    marker = tmp_path / "parallel-run"
+    run_parallel = pcap_parallel.simulate_pcap_flow_parallel
+
+    def marked(*args, **kwargs):
+        result = run_parallel(*args, **kwargs)
+        if result is not None:
+            marker.touch()
+        return result
+
+    monkeypatch.setattr(pcap_parallel, "PARALLEL_MIN_PACKETS", 1)
+    monkeypatch.setattr(pcap_parallel, "simulate_pcap_flow_parallel", marked)
+    monkeypatch.setattr(main, "jobs", job_pool.JobPool(max_workers=2, max_queued=2))
+
+    with open(captures["us.pcap"], "rb") as f:
+        response = api.post(
+            "/analyze/pcap", files={"file": ("us.pcap", f)}, data={"rules_json": json.dumps(rules), **data}
+        )
+    assert response.status_code == 200
+    serial = pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules, engine="compiled")
+    assert comparable(response.json()["simulation"]) == comparable(json.loads(json.dumps(serial)))
+
+    assert marker.exists() == parallel
+    # Only serial runs with the cache on leave a parse cache entry behind
+    assert parse_cache.cache_stats()["entries"] == (0 if parallel or data.get("cached") == "false" else 1)
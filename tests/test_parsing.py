@@ -0,0 +1,66 @@
+# test_parsing.py
+# Native, indexed and cached capture parsing against the scapy reference
+
+import pytest
+
+import pcap_analysis
+import parse_cache
+
+CAPTURES = ("us.pcap", "ns.pcap", "capture.pcapng", "shuffled.pcap")
+
+
+@pytest.fixture(scope="module")
+def reference(captures):
+    """
+    Packets of each capture as parsed by scapy.
+    """
+    return {name: pcap_analysis.parse_pcap(path, native=False) for name, path in captures.items()}
+
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_native_matches_scapy(captures, reference, name):
+    packets = pcap_analysis.parse_pcap(captures[name])
+    assert packets == reference[name]
+    assert packets
+
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_indexed_matches_scapy(captures, reference, name):
+    # Twice: building the sidecar index, then reading through it
+    assert pcap_analysis.parse_pcap(captures[name], indexed=True) == reference[name]
+    assert pcap_analysis.parse_pcap(captures[name], indexed=True) == reference[name]
+
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_cached_matches_scapy(captures, reference, name):
+    assert pcap_analysis.parse_pcap(captures[name], cached=True) == reference[name]
+    assert pcap_analysis.parse_pcap(captures[name], cached=True) == reference[name]
+    assert parse_cache.cache_stats()["hits"] == 1
+
+
+def test_cache_skips_captures_over_the_size_cap(captures, reference, monkeypatch):
+    monkeypatch.setattr(parse_cache, "PARSE_CACHE_MAX_BYTES", 1024)
+    assert pcap_analysis.parse_pcap(captures["us.pcap"], cached=True) == reference["us.pcap"]
+    assert parse_cache.cache_stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("name", CAPTURES)
+@pytest.mark.parametrize("indexed", (False, True))
+def test_time_window_matches_scapy(captures, reference, name, indexed):
+    timestamps = sorted(packet["timestamp"] for packet in reference[name])
+    start_ts, end_ts = timestamps[len(timestamps) // 3], timestamps[2 * len(timestamps) // 3]
+    expected = [packet for packet in reference[name] if start_ts <= packet["timestamp"] < end_ts]
+
+    packets = pcap_analysis.parse_pcap(captures[name], indexed=indexed, start_ts=start_ts, end_ts=end_ts)
+    assert packets == expected
+
+
+def test_parse_cache_stats_endpoint(api, captures):
+    with open(captures["us.pcap"], "rb") as f:
+        capture_id = api.post("/pcap", files={"file": ("us.pcap", f)}).json()["capture_id"]
+    for _ in range(2):
+        assert api.post("/analyze/pcap", data={"capture_id": capture_id, "cached": "true"}).status_code == 200
+
+    stats = api.get("/pcap/cache/stats").json()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 1, 1)
+    assert 0 < stats["bytes"] <= stats["max_bytes"]
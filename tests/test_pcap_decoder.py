@@ -0,0 +1,101 @@
+# test_pcap_decoder.py
+# Malformed pcapng blocks: rejected as CaptureFormatError, answered with 400
+
+import io
+import struct
+
+import pytest
+
+import pcap_decoder
+from pcap_decoder import CaptureFormatError, CaptureParser
+
+FRAME = bytes(60)
+
+
+def _block(block_type: int, body: bytes) -> bytes:
+    body += bytes(-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def _shb() -> bytes:
+    return _block(pcap_decoder.PCAPNG_SHB, struct.pack("<IHHq", pcap_decoder.PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1))
+
+
+def _idb(linktype: int = 1) -> bytes:
+    return _block(pcap_decoder.PCAPNG_IDB, struct.pack("<HHI", linktype, 0, 0))
+
+
+def _epb(iface: int = 0, frame: bytes = FRAME, caplen: int = None) -> bytes:
+    caplen = len(frame) if caplen is None else caplen
+    return _block(pcap_decoder.PCAPNG_EPB, struct.pack("<IIIII", iface, 0, 1000, caplen, len(frame)) + frame)
+
+
+def _opb(iface: int = 0, frame: bytes = FRAME) -> bytes:
+    return _block(pcap_decoder.PCAPNG_OPB, struct.pack("<HHIIII", iface, 0, 0, 1000, len(frame), len(frame)) + frame)
+
+
+def _spb(frame: bytes = FRAME) -> bytes:
+    return _block(pcap_decoder.PCAPNG_SPB, struct.pack("<I", len(frame)) + frame)
+
+
+def _records(capture: bytes):
+    return list(pcap_decoder.iter_records(io.BytesIO(capture)))
+
+
+# =========================
+# DECODER
+# =========================
+
+def test_well_formed_blocks_decode():
+    records = _records(_shb() + _idb() + _epb() + _opb() + _spb())
+    assert [(linktype, frame) for _, _, linktype, frame in records] == [(1, FRAME)] * 3
+
+
+@pytest.mark.parametrize(
+    "blocks",
+    (
+        pytest.param(_idb() + _epb(iface=1), id="epb-unknown-interface"),
+        pytest.param(_idb() + _opb(iface=3), id="opb-unknown-interface"),
+        pytest.param(_spb(), id="spb-before-any-interface"),
+        pytest.param(_idb() + _epb(caplen=len(FRAME) + 64) + _epb(), id="epb-caplen-past-block"),
+    )
+)
+def test_malformed_blocks_raise_capture_format_error(blocks):
+    with pytest.raises(CaptureFormatError):
+        _records(_shb() + blocks)
+
+
+def test_indexed_lookups_raise_capture_format_error():
+    capture = _shb() + _idb() + _epb()
+    offset = len(_shb() + _idb())
+    parser = CaptureParser()
+    parser.parse_header(capture)
+    pos = 0
+    while pos < len(capture):
+        pos, _ = parser.next_record(capture, pos, len(capture))
+    assert parser.data_span(capture, offset) == (offset + 28, offset + 28 + len(FRAME))
+
+    other_interface = capture[:offset] + _epb(iface=2)
+    with pytest.raises(CaptureFormatError):
+        parser.interface_at(other_interface, offset)
+    overrun = capture[:offset] + _epb(caplen=len(FRAME) + 64)
+    with pytest.raises(CaptureFormatError):
+        parser.data_span(overrun, offset)
+    with pytest.raises(CaptureFormatError):
+        parser.timestamp_at(capture[:offset + 8], offset, 10 ** 6, 0)
+
+
+# =========================
+# API
+# =========================
+
+@pytest.mark.parametrize("endpoint", ("/analyze/pcap", "/analyze/pcap/stream"))
+def test_api_answers_400_for_malformed_captures(api, endpoint):
+    capture = _shb() + _idb() + _epb() + _epb(iface=5)
+    if endpoint.endswith("stream"):
+        response = api.post(endpoint, content=capture, headers={"Content-Type": "application/octet-stream"})
+    else:
+        response = api.post(endpoint, files={"file": ("bad.pcapng", capture)})
+    assert response.status_code == 400
+    assert "interface 5" in response.json()["detail"]
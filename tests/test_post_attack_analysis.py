@@ -0,0 +1,146 @@
+# test_post_attack_analysis.py
+# Report aggregation: merged reports against one pass, critical timeline bounds
+
+import pytest
+
+import pcap_analysis
+import post_attack_analysis
+from post_attack_analysis import ReportAggregator
+
+
+@pytest.fixture(scope="module")
+def simulation(captures):
+    rules = [
+        {"rule_id": "rdp", "name": "rdp", "description": "", "severity": "CRITICAL", "protocol": "TCP",
+         "conditions": {"dst_port": 3389}, "action": "DENY", "enabled": True, "position": 0},
+        {"rule_id": "ssh", "name": "ssh", "description": "", "severity": "HIGH", "protocol": "TCP",
+         "conditions": {"dst_port": 22}, "action": "ALERT", "enabled": True, "position": 1},
+    ]
+    return pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules)
+
+
+def _chunks(result, size):
+    """
+    Consecutive chunks of size packets with the detections of those packets.
+    """
+    timeline, detections = result["timeline"], result["detections"]
+    for start in range(0, len(timeline), size):
+        part = timeline[start:start + size]
+        first, last = part[0]["timestamp"], part[-1]["timestamp"]
+        yield {
+            "timeline": part,
+            "detections": [d for d in detections if first <= d["packet"]["timestamp"] <= last]
+        }
+
+
+def _events(detections):
+    return [
+        {"timestamp": d["packet"]["timestamp"], "rule_id": d["rule_id"], "action": d["action"],
+         "dst_ip": d["packet"]["dst_ip"]}
+        for d in detections
+        if d["severity"] == "CRITICAL"
+    ]
+
+
+def _merged(simulation, aggregation, size=37, reverse=False):
+    parts = []
+    for chunk in _chunks(simulation, size):
+        part = ReportAggregator(aggregation=aggregation)
+        part.update(chunk)
+        parts.append(part)
+    merged = ReportAggregator(aggregation=aggregation)
+    for part in reversed(parts) if reverse else parts:
+        merged.merge(part)
+    return merged
+
+
+# =========================
+# MERGING
+# =========================
+
+def test_merged_exact_report_equals_one_pass(simulation):
+    merged = _merged(simulation, "exact").finalize(simulation["summary"])
+    assert merged == post_attack_analysis.analyze_firewall_run(simulation, aggregation="exact")
+
+
+def test_merge_order_only_changes_the_critical_order(simulation):
+    expected = post_attack_analysis.analyze_firewall_run(simulation, aggregation="exact")
+    report = _merged(simulation, "exact", reverse=True).finalize(simulation["summary"])
+
+    for section in ("overview", "traffic_profile", "time_series", "critical_events_total", "assessment"):
+        assert report[section] == expected[section]
+    for key in ("rule_hit_count", "severity_distribution"):
+        assert report["security_findings"][key] == expected["security_findings"][key]
+    assert sorted(report["critical_timeline"], key=lambda e: e["timestamp"]) == expected["critical_timeline"]
+
+
+def test_merged_sketch_report_stays_within_its_bounds(simulation):
+    exact = post_attack_analysis.analyze_firewall_run(simulation, aggregation="exact")
+    report = _merged(simulation, "sketch").finalize(simulation["summary"])
+    assert report["aggregation"]["mode"] == "sketch"
+    assert report["overview"] == exact["overview"]
+    assert report["time_series"] == exact["time_series"]
+
+    true_hits = {}
+    for entry in simulation["timeline"]:
+        true_hits[entry["dst_ip"]] = true_hits.get(entry["dst_ip"], 0) + 1
+    for entry in report["security_findings"]["top_targeted_assets"]:
+        assert true_hits[entry["ip"]] <= entry["hits"] <= true_hits[entry["ip"]] + entry["max_overestimate"]
+    for name, count in exact["traffic_profile"]["distinct"].items():
+        assert abs(report["traffic_profile"]["distinct"][name] - count) <= max(0.05 * count, 1)
+
+
+def test_exact_part_merged_into_sketches(simulation):
+    merged = ReportAggregator(aggregation="sketch")
+    part = ReportAggregator(aggregation="exact")
+    part.update(simulation)
+    merged.merge(part)
+    report = merged.finalize(simulation["summary"])
+    assert report["aggregation"]["mode"] == "sketch"
+    assert report["overview"]["total_packets"] == len(simulation["timeline"])
+
+    with pytest.raises(ValueError):
+        merged.merge(ReportAggregator(aggregation="sketch", top_error=0.1))
+
+
+# =========================
+# CRITICAL TIMELINE
+# =========================
+
+def test_exact_mode_keeps_every_critical_event(simulation, monkeypatch):
+    monkeypatch.setattr(post_attack_analysis, "CRITICAL_EVENTS_KEPT", 10)
+    events = _events(simulation["detections"])
+    assert len(events) > 20
+
+    report = post_attack_analysis.analyze_firewall_run(simulation, aggregation="exact")
+    assert report["critical_timeline"] == events
+    assert report["critical_events_total"] == len(events)
+
+
+def test_sketch_mode_keeps_first_and_last_critical_events(simulation, monkeypatch):
+    monkeypatch.setattr(post_attack_analysis, "CRITICAL_EVENTS_KEPT", 10)
+    events = _events(simulation["detections"])
+
+    report = post_attack_analysis.analyze_firewall_run(simulation, aggregation="sketch")
+    assert report["critical_timeline"] == events[:10] + events[-10:]
+    assert report["critical_events_total"] == len(events)
+
+
+@pytest.mark.parametrize("aggregation", ("sketch", "auto"))
+def test_merged_critical_timeline_is_bounded(simulation, monkeypatch, aggregation):
+    monkeypatch.setattr(post_attack_analysis, "CRITICAL_EVENTS_KEPT", 10)
+    # auto converts to sketches after 50 packets, part way through the merge
+    monkeypatch.setattr(post_attack_analysis, "EXACT_MAX_PACKETS", 50)
+    events = _events(simulation["detections"])
+
+    merged = ReportAggregator(aggregation=aggregation)
+    for chunk in _chunks(simulation, 37):
+        part = ReportAggregator(aggregation=aggregation)
+        part.update(chunk)
+        merged.merge(part)
+        assert len(merged.critical_events) + len(merged.critical_tail) <= 20 or merged.mode == "exact"
+
+    report = merged.finalize()
+    assert merged.mode == "sketch"
+    assert report["critical_timeline"] == events[:10] + events[-10:]
+    assert report["critical_events_total"] == len(events)
@@ -0,0 +1,168 @@
+# test_result_encoding.py
+# Response formats: negotiation, columnar / msgpack / Arrow round trips and the API's format selection
+
+import json
+
+import pytest
+
+import pcap_analysis
+import result_encoding
+from result_encoding import EncodingUnavailable, columnar_rows, dictionary_encode, negotiate_format
+
+
+def _rows(table):
+    """columnar_rows() output back to a list of dicts."""
+    columns = {
+        name: [column["dictionary"][code] for code in column["codes"]] if isinstance(column, dict) else column
+        for name, column in table["columns"].items()
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())] if columns else []
+
+
+@pytest.fixture
+def simulation(captures, rules):
+    return pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules, compact_detections=True)
+
+
+def _without_detection_time(document):
+    document["simulation"]["detections"].pop("timestamp")
+    return document
+
+
+# =========================
+# NEGOTIATION
+# =========================
+
+def test_explicit_format_wins_over_accept():
+    assert negotiate_format("COLUMNAR", "application/msgpack") == "columnar"
+    assert negotiate_format(None, None) == "json"
+    with pytest.raises(ValueError):
+        negotiate_format("xml")
+
+
+def test_accept_picks_the_first_available_format(monkeypatch):
+    accept = "text/html, application/vnd.apache.arrow.stream;q=0.9, application/msgpack"
+    monkeypatch.setattr(result_encoding, "format_available", lambda name: name != "arrow")
+    assert negotiate_format(None, accept) == "msgpack"
+    assert negotiate_format(None, "text/html") == "json"
+
+
+def test_missing_package_is_reported(monkeypatch):
+    monkeypatch.setitem(result_encoding._FORMAT_PACKAGES, "msgpack", "hsafe_no_such_package")
+    assert not result_encoding.format_available("msgpack")
+    assert negotiate_format(None, "application/msgpack") == "json"
+    with pytest.raises(EncodingUnavailable):
+        negotiate_format("msgpack")
+    with pytest.raises(EncodingUnavailable):
+        result_encoding.encode_analysis({}, {"timeline": [], "detections": []}, "msgpack")
+
+
+# =========================
+# COLUMNAR LAYOUT
+# =========================
+
+def test_dictionary_encoding_keeps_first_seen_order():
+    assert dictionary_encode(["b", "a", "b", None]) == {"dictionary": ["b", "a", None], "codes": [0, 1, 0, 2]}
+
+
+def test_columnar_rows_round_trip(simulation):
+    table = columnar_rows(simulation["timeline"])
+    assert table["length"] == len(simulation["timeline"])
+    assert isinstance(table["columns"]["src_ip"], dict) and isinstance(table["columns"]["timestamp"], list)
+    assert _rows(table) == simulation["timeline"]
+    assert columnar_rows([]) == {"length": 0, "columns": {}}
+
+
+def test_detection_dicts_are_flattened(captures, rules):
+    result = pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules)
+    rows = _rows(result_encoding.columnar_detections(result["detections"]))
+    assert len(rows) == len(result["detections"])
+    first, detection = rows[0], result["detections"][0]
+    assert first["rule_id"] == detection["rule_id"]
+    assert first["packet_dst_port"] == detection["packet"]["dst_port"]
+
+
+# =========================
+# ENCODERS
+# =========================
+
+def test_columnar_and_msgpack_carry_the_same_document(simulation):
+    msgpack = pytest.importorskip("msgpack")
+    report = {"overview": {"total_packets": len(simulation["timeline"])}}
+
+    body, media_type = result_encoding.encode_analysis(report, simulation, "columnar")
+    assert media_type == result_encoding.MEDIA_TYPES["columnar"]
+    columnar = json.loads(body)
+    assert columnar["report"] == report
+    assert _rows(columnar["simulation"]["timeline"]) == simulation["timeline"]
+    assert columnar["simulation"]["detections"] == simulation["detections"].to_dict()
+    assert columnar["simulation"]["summary"] == simulation["summary"]
+
+    body, media_type = result_encoding.encode_analysis(report, simulation, "msgpack")
+    assert media_type == "application/msgpack"
+    assert msgpack.unpackb(body, raw=False) == columnar
+
+
+def test_arrow_stream_holds_the_timeline_table(simulation):
+    pa = pytest.importorskip("pyarrow")
+    report = {"overview": {}}
+
+    body, _ = result_encoding.encode_analysis(report, simulation, "arrow")
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.to_pylist() == simulation["timeline"]
+    assert json.loads(table.schema.metadata[b"report"]) == report
+    rest = json.loads(table.schema.metadata[b"simulation"])
+    assert "timeline" not in rest and rest["summary"] == simulation["summary"]
+
+
+# =========================
+# API
+# =========================
+
+@pytest.mark.parametrize(
+    "params, headers, response_format",
+    (
+        ({"response_format": "columnar"}, {}, "columnar"),
+        ({}, {"Accept": "application/msgpack"}, "msgpack"),
+        ({}, {"Accept": "application/vnd.apache.arrow.stream"}, "arrow"),
+    )
+)
+def test_api_negotiates_the_response_format(api, captures, rules, params, headers, response_format):
+    pytest.importorskip("msgpack")
+    pytest.importorskip("pyarrow")
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    data = {"rules_json": json.dumps(rules)}
+
+    response = api.post("/analyze/pcap", params=params, headers=headers, files={"file": ("us.pcap", body)}, data=data)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == result_encoding.MEDIA_TYPES[response_format]
+
+    expected = api.post(
+        "/analyze/pcap", files={"file": ("us.pcap", body)}, data={**data, "compact_detections": "true"}
+    ).json()
+    if response_format == "arrow":
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.to_pylist() == expected["simulation"]["timeline"]
+        return
+    if response_format == "msgpack":
+        import msgpack
+
+        document = msgpack.unpackb(response.content, raw=False)
+    else:
+        document = response.json()
+    assert _rows(document["simulation"].pop("timeline")) == expected["simulation"].pop("timeline")
+    assert _without_detection_time(document) == _without_detection_time(expected)
+
+
+def test_api_rejects_unknown_or_unavailable_formats(api, captures, monkeypatch):
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    response = api.post("/analyze/pcap", params={"response_format": "xml"}, files={"file": ("us.pcap", body)})
+    assert response.status_code == 400
+
+    monkeypatch.setitem(result_encoding._FORMAT_PACKAGES, "msgpack", "hsafe_no_such_package")
+    response = api.post("/analyze/pcap", params={"response_format": "msgpack"}, files={"file": ("us.pcap", body)})
+    assert response.status_code == 406
@@ -0,0 +1,166 @@
+# test_result_store.py
+# Stored analyses: per-client scoping, cursor paging, timeline filters and eviction
+
+import json
+import sqlite3
+
+import pytest
+
+import pcap_analysis
+import result_store
+from result_store import ResultNotFound, ResultStore
+
+
+@pytest.fixture
+def simulation(captures, rules):
+    return pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules, engine="compiled", compact_detections=True)
+
+
+@pytest.fixture
+def store(tmp_path, simulation):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    store.save("alice", "r1", simulation, {"overview": {"total_packets": len(simulation["timeline"])}}, "us.pcap")
+    return store
+
+
+def _pages(query, *args, **kwargs):
+    """Every page of a cursor-paged query, followed to the end."""
+    pages, cursor = [], None
+    while True:
+        page = query(*args, cursor=cursor, **kwargs)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+# =========================
+# STORE
+# =========================
+
+def test_saved_result_reads_back(store, simulation):
+    listed = store.list_results("alice")
+    assert [entry["result_id"] for entry in listed] == ["r1"]
+    assert listed[0]["packet_count"] == len(simulation["timeline"])
+    assert listed[0]["detection_count"] == len(simulation["detections"])
+
+    stored = store.get("alice", "r1")
+    assert stored["summary"] == simulation["summary"]
+    assert stored["source"] == "us.pcap"
+
+
+def test_results_are_scoped_per_client(store):
+    assert store.list_results("bob") == []
+    for query in (store.get, store.timeline, store.detections, store.delete):
+        with pytest.raises(ResultNotFound):
+            query("bob", "r1")
+    store.delete("alice", "r1")
+    with pytest.raises(ResultNotFound):
+        store.get("alice", "r1")
+
+
+def test_timeline_pages_cover_the_timeline(store, simulation):
+    pages = _pages(store.timeline, "alice", "r1", limit=100)
+    entries = [entry for page in pages for entry in page["entries"]]
+    assert len(pages) == -(-len(simulation["timeline"]) // 100)
+    assert entries == simulation["timeline"]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    ({"protocol": "tcp"}, {"dst_port": 22, "action": "deny"}, {"src_ip": "10.0.1.5"}, {"lane": "ssh"})
+)
+def test_timeline_filters(store, simulation, filters):
+    def matches(entry):
+        return all(
+            entry[name] == (value.upper() if name in result_store._UPPER_FILTERS else value)
+            for name, value in filters.items()
+        )
+
+    entries = [entry for page in _pages(store.timeline, "alice", "r1", limit=7, **filters) for entry in page["entries"]]
+    assert entries == [entry for entry in simulation["timeline"] if matches(entry)]
+
+
+def test_timeline_time_window(store, simulation):
+    timestamps = [entry["timestamp"] for entry in simulation["timeline"]]
+    start_ts, end_ts = timestamps[100], timestamps[200]
+    page = store.timeline("alice", "r1", limit=500, start_ts=start_ts, end_ts=end_ts)
+    assert page["entries"] == simulation["timeline"][100:200]
+
+    with pytest.raises(ValueError):
+        store.timeline("alice", "r1", bogus=1)
+
+
+def test_detection_pages_join_rules_and_packets(store, simulation):
+    records = simulation["detections"]
+    detections = [d for page in _pages(store.detections, "alice", "r1", limit=25) for d in page["detections"]]
+    assert [d["seq"] for d in detections] == list(range(len(records)))
+    for detection, packet_index, rule_index in zip(detections, records.packet_index, records.rule_index):
+        assert detection["rule_id"] == records.rules[rule_index]["rule_id"]
+        assert detection["packet"] == simulation["timeline"][packet_index]
+
+    only_r2 = store.detections("alice", "r1", limit=5000, rule_id="r2")["detections"]
+    assert only_r2 and {d["rule_id"] for d in only_r2} == {"r2"}
+
+
+def test_oldest_results_are_evicted(tmp_path, simulation):
+    store = ResultStore(str(tmp_path / "capped.sqlite3"), max_results=2)
+    for result_id in ("a", "b", "c"):
+        store.save("alice", result_id, simulation, {})
+    assert [entry["result_id"] for entry in store.list_results("alice")] == ["c", "b"]
+
+
+def test_save_needs_detection_records(store, captures, rules):
+    result = pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules)
+    with pytest.raises(TypeError):
+        store.save("alice", "r2", result, {})
+
+
+def test_stores_without_client_column_are_migrated(tmp_path, simulation):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE results (rid INTEGER PRIMARY KEY, result_id TEXT NOT NULL UNIQUE, created_at REAL NOT NULL,"
+            " source TEXT, packet_count INTEGER NOT NULL, detection_count INTEGER NOT NULL,"
+            " summary TEXT NOT NULL, report TEXT NOT NULL)"
+        )
+        db.execute("INSERT INTO results VALUES (1, 'legacy', 0, NULL, 0, 0, '{}', '{}')")
+    db.close()
+
+    store = ResultStore(path)
+    store.save("alice", "new", simulation, {})
+    assert [entry["result_id"] for entry in store.list_results("alice")] == ["new"]
+    with pytest.raises(ResultNotFound):
+        store.get("alice", "legacy")
+
+
+# =========================
+# API
+# =========================
+
+def test_results_endpoints_are_scoped_per_client(api, captures, rules):
+    with open(captures["us.pcap"], "rb") as f:
+        response = api.post(
+            "/analyze/pcap",
+            files={"file": ("us.pcap", f)},
+            data={"rules_json": json.dumps(rules), "store_result": "true", "include_timeline": "false"}
+        )
+    assert response.status_code == 200
+    result_id = response.headers["X-Result-Id"]
+    assert response.json()["simulation"]["timeline"] == []
+
+    assert [entry["result_id"] for entry in api.get("/results").json()["results"]] == [result_id]
+    assert api.get(f"/results/{result_id}").json()["source"] == "us.pcap"
+    page = api.get(f"/results/{result_id}/timeline", params={"limit": 10, "protocol": "udp"}).json()
+    assert len(page["entries"]) == 10 and {entry["protocol"] for entry in page["entries"]} == {"UDP"}
+    assert api.get(f"/results/{result_id}/detections", params={"rule_id": "r1"}).json()["detections"]
+    assert api.get(f"/results/{result_id}/timeline", params={"limit": 0}).status_code == 422
+
+    other = {"X-Client-Id": "someone-else"}
+    assert api.get("/results", headers=other).json() == {"results": []}
+    for path in ("", "/timeline", "/detections"):
+        assert api.get(f"/results/{result_id}{path}", headers=other).status_code == 404
+    assert api.delete(f"/results/{result_id}", headers=other).status_code == 404
+
+    assert api.delete(f"/results/{result_id}").json() == {"ok": True}
+    assert api.get(f"/results/{result_id}").status_code == 404
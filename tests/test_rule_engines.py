@@ -0,0 +1,98 @@
+# test_rule_engines.py
+# The compiled and vectorized rule engines against the reference python engine, and the ruleset cache
+
+import json
+
+import pytest
+
+import pcap_analysis
+
+ENGINES = ("compiled", "vectorized")
+
+
+@pytest.fixture(scope="module")
+def packets(captures):
+    return pcap_analysis.parse_pcap(captures["us.pcap"])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("compact", (False, True))
+def test_evaluate_packets_matches_python(packets, rules, comparable, engine, compact):
+    expected_detections, expected_verdicts, _ = pcap_analysis.evaluate_packets(packets, rules, "python")
+    detections, verdicts, _ = pcap_analysis.evaluate_packets(packets, rules, engine, compact=compact)
+
+    assert verdicts == expected_verdicts
+    assert comparable({"detections": detections}) == comparable({"detections": expected_detections})
+    assert {"ALLOW", "DENY", "ALERT"} <= set(verdicts)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "options",
+    (
+        {},
+        {"streaming": True, "chunk_size": 64},
+        {"aggregate_flows": True},
+        {"streaming": True, "chunk_size": 64, "aggregate_flows": True, "compact_detections": True},
+    ),
+    ids=("batch", "streaming", "flows", "streaming-flows-compact")
+)
+def test_simulation_matches_python(captures, rules, comparable, engine, options):
+    path = captures["us.pcap"]
+    expected = pcap_analysis.simulate_pcap_flow(path, rules, engine="python", **options)
+    result = pcap_analysis.simulate_pcap_flow(path, rules, engine=engine, **options)
+    assert comparable(result) == comparable(expected)
+
+
+def test_unknown_engine_is_rejected(packets, rules):
+    with pytest.raises(ValueError):
+        pcap_analysis.evaluate_packets(packets, rules, "bogus")
+
+
+# =========================
+# RULESET CACHE
+# =========================
+
+@pytest.fixture
+def ruleset_cache(monkeypatch):
+    import rule_compiler
+
+    monkeypatch.setattr(rule_compiler, "RULESET_CACHE_SIZE", 2)
+    rule_compiler.clear_cache()
+    yield rule_compiler
+    rule_compiler.clear_cache()
+
+
+def test_ruleset_is_compiled_once_per_content(ruleset_cache, rules):
+    compiled = ruleset_cache.get_compiled_ruleset(rules)
+    # Equal content in fresh dicts, and a disabled rule added, hit the same entry
+    copy = [dict(rule, conditions=dict(rule["conditions"])) for rule in rules]
+    assert ruleset_cache.get_compiled_ruleset(copy) is compiled
+    assert ruleset_cache.get_compiled_ruleset(rules + [dict(rules[0], rule_id="off", enabled=False)]) is compiled
+    assert ruleset_cache.get_compiled_ruleset(rules[::-1]) is not compiled
+    assert ruleset_cache.cache_stats() == {"hits": 2, "misses": 2, "evictions": 0, "size": 2, "max_size": 2}
+
+
+def test_ruleset_cache_is_lru_and_private(ruleset_cache, rules):
+    first = ruleset_cache.get_compiled_ruleset(rules[:1])
+    ruleset_cache.get_compiled_ruleset(rules[:2])
+    assert ruleset_cache.get_compiled_ruleset(rules[:1]) is first  # Now most recently used
+    ruleset_cache.get_compiled_ruleset(rules[:3])
+    assert ruleset_cache.cache_stats()["evictions"] == 1
+    assert ruleset_cache.get_compiled_ruleset(rules[:1]) is first
+
+    # Mutating the caller's rules does not change the cached copy
+    rules[0]["conditions"]["dst_port"] = 2222
+    assert first.rules[0]["conditions"]["dst_port"] == 22
+
+
+def test_rule_cache_stats_endpoint(api, ruleset_cache, captures, rules):
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    for _ in range(2):
+        response = api.post(
+            "/analyze/pcap", files={"file": ("us.pcap", body)}, data={"rules_json": json.dumps(rules)}
+        )
+        assert response.status_code == 200
+    stats = api.get("/rules/cache/stats").json()
+    assert stats["misses"] == 1 and stats["hits"] >= 1 and stats["size"] == 1
@@ -0,0 +1,101 @@
+# test_sketches.py
+# Space-Saving and HyperLogLog error bounds, alone and merged
+
+import random
+from collections import Counter
+
+import pytest
+
+from sketches import HyperLogLog, SpaceSaving, hash_values
+
+
+def _zipf_stream(seed: int, count: int, keys: int = 5000):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices([f"10.0.{k // 256}.{k % 256}" for k in range(keys)], weights, k=count)
+
+
+def _assert_within_bounds(sketch: SpaceSaving, truth: Counter):
+    total = sum(truth.values())
+    assert sketch.total == total
+    for key, estimate, error in sketch.top(len(sketch)):
+        assert truth[key] <= estimate <= truth[key] + error
+        assert error <= total / sketch.capacity
+    # Every key above total / capacity is tracked
+    for key, hits in truth.items():
+        if hits > total / sketch.capacity:
+            assert key in sketch.counts
+
+
+# =========================
+# SPACE-SAVING
+# =========================
+
+def test_space_saving_is_exact_below_capacity():
+    stream = ["a"] * 5 + ["b"] * 3 + ["c"]
+    sketch = SpaceSaving(10)
+    sketch.update(stream)
+    assert sketch.top(2) == [("a", 5, 0), ("b", 3, 0)]
+
+
+def test_space_saving_bounds_on_a_skewed_stream():
+    stream = _zipf_stream(1, 50000)
+    sketch = SpaceSaving.for_error(0.01)
+    sketch.update(stream)
+
+    assert len(sketch) == sketch.capacity == 100
+    _assert_within_bounds(sketch, Counter(stream))
+    assert [key for key, _, _ in sketch.top(3)] == [key for key, _ in Counter(stream).most_common(3)]
+
+
+def test_merged_space_saving_keeps_its_bounds():
+    first, second = _zipf_stream(2, 30000), _zipf_stream(3, 20000)
+    merged = SpaceSaving(200)
+    merged.update(first)
+    other = SpaceSaving(200)
+    other.update(second)
+    merged.merge(other)
+
+    assert len(merged) <= merged.capacity
+    _assert_within_bounds(merged, Counter(first) + Counter(second))
+
+
+def test_space_saving_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+    with pytest.raises(ValueError):
+        SpaceSaving.for_error(1.5)
+
+
+# =========================
+# HYPERLOGLOG
+# =========================
+
+def test_hash_values_are_stable_64_bit():
+    hashes = hash_values(["10.0.0.1", "10.0.0.1", 443])
+    assert hashes.dtype.name == "uint64"
+    assert hashes[0] == hash_values(["10.0.0.1"])[0] != hashes[2]
+
+
+@pytest.mark.parametrize("distinct", (10, 1000, 200000))
+def test_hyperloglog_counts_within_its_error(distinct):
+    counter = HyperLogLog.for_error(0.01)
+    values = [f"key-{i}" for i in range(distinct)]
+    counter.update(values)
+    counter.update(values[:distinct // 2])  # Repeats do not count
+
+    assert abs(counter.count() - distinct) <= max(3 * counter.relative_error * distinct, 1)
+
+
+def test_merged_hyperloglog_counts_the_union():
+    left, right, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    left.update(range(0, 60000))
+    right.update(range(40000, 100000))
+    union.update(range(0, 100000))
+
+    left.merge(right)
+    assert (left.registers == union.registers).all()
+    assert abs(left.count() - 100000) <= 3 * left.relative_error * 100000
+
+    with pytest.raises(ValueError):
+        left.merge(HyperLogLog(10))
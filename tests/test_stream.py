@@ -0,0 +1,71 @@
+# test_stream.py
+# Streamed uploads: results match a stored upload, admission waits for data, uploads time out
+
+import json
+
+import pytest
+
+from backend import main
+
+
+def _stream(api, body: bytes, **params):
+    return api.post(
+        "/analyze/pcap/stream", content=body, params=params, headers={"Content-Type": "application/octet-stream"}
+    )
+
+
+@pytest.mark.parametrize("name", ("us.pcap", "capture.pcapng"))
+@pytest.mark.parametrize("feed_bytes", (main.STREAM_FEED_BYTES, 4096))
+def test_stream_matches_a_stored_upload(api, captures, rules, comparable, monkeypatch, name, feed_bytes):
+    monkeypatch.setattr(main, "STREAM_FEED_BYTES", feed_bytes)
+    with open(captures[name], "rb") as f:
+        body = f.read()
+    rules_json = json.dumps(rules)
+
+    streamed = _stream(api, body, rules_json=rules_json)
+    assert streamed.status_code == 200
+    uploaded = api.post("/analyze/pcap", files={"file": (name, body)}, data={"rules_json": rules_json})
+    assert comparable(streamed.json()["simulation"]) == comparable(uploaded.json()["simulation"])
+
+    listed = api.get("/pcap/captures").json()
+    assert streamed.headers["X-Capture-Id"] in json.dumps(listed)
+
+
+def test_stream_of_another_format_is_analyzed_once_stored(api):
+    body = b"not a capture at all"
+    streamed = _stream(api, body)
+    uploaded = api.post("/analyze/pcap", files={"file": ("other.cap", body)})
+    assert (streamed.status_code, streamed.json()) == (uploaded.status_code, uploaded.json())
+    assert _stream(api, b"").status_code == 400
+
+
+def test_stream_reads_data_before_taking_a_slot(api, captures, monkeypatch):
+    events = []
+    body_chunks, reserve = main._body_chunks, main.jobs.reserve
+
+    async def recorded_chunks(request, deadline):
+        async for data in body_chunks(request, deadline):
+            events.append(("data", len(data)))
+            yield data
+
+    def recorded_reserve(*args, **kwargs):
+        events.append(("reserve",))
+        return reserve(*args, **kwargs)
+
+    monkeypatch.setattr(main, "_body_chunks", recorded_chunks)
+    monkeypatch.setattr(main.jobs, "reserve", recorded_reserve)
+    with open(captures["us.pcap"], "rb") as f:
+        assert _stream(api, f.read()).status_code == 200
+
+    assert events[0][0] == "data" and events[0][1] > 0
+    assert events.count(("reserve",)) == 1
+
+
+def test_slow_upload_is_cut_off_without_holding_a_slot(api, captures, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_UPLOAD_TIMEOUT", 0)
+    held = main.jobs.reserve(main.jobs.capacity)
+    with open(captures["us.pcap"], "rb") as f:
+        response = _stream(api, f.read())
+    # 408 rather than 429: the saturated pool is never asked for a slot
+    assert response.status_code == 408
+    held.release()
@@ -0,0 +1,117 @@
+# test_time_series.py
+# Traffic time series: capture timestamps, bucket counts, widening past MAX_BUCKETS and merging
+
+import math
+from collections import Counter
+
+import pytest
+
+import pcap_analysis
+import post_attack_analysis
+from post_attack_analysis import _TimeSeries, build_time_series
+
+
+@pytest.fixture(scope="module")
+def timeline(captures):
+    rules = [
+        {"rule_id": "ssh", "name": "ssh", "description": "", "severity": "HIGH", "protocol": "TCP",
+         "conditions": {"dst_port": 22}, "action": "DENY", "enabled": True, "position": 0},
+    ]
+    return pcap_analysis.simulate_pcap_flow(captures["us.pcap"], rules)["timeline"]
+
+
+def _expected(timeline, width, key=None):
+    """Per-bucket packets / bytes / actions computed entry by entry."""
+    packets, sizes, actions = Counter(), Counter(), Counter()
+    for entry in timeline:
+        if key is not None and (entry[key[0]] != key[1]):
+            continue
+        bucket = math.floor(entry["timestamp"] / width)
+        packets[bucket] += 1
+        sizes[bucket] += entry["payload_size"]
+        actions[bucket, entry["action"]] += 1
+    return packets, sizes, actions
+
+
+def _assert_series(series, timestamps, timeline, width, key=None):
+    packets, sizes, actions = _expected(timeline, width, key)
+    buckets = [round(start / width) for start in timestamps]
+    assert [packets[b] for b in buckets] == series["packets"]
+    assert [sizes[b] for b in buckets] == series["bytes"]
+    for action, counts in series["actions"].items():
+        assert [actions[b, action] for b in buckets] == counts
+    assert sum(series["packets"]) == sum(packets.values())
+
+
+# =========================
+# TIME SERIES
+# =========================
+
+def test_timeline_carries_capture_timestamps(captures, timeline):
+    from scapy.utils import rdpcap
+
+    assert [entry["timestamp"] for entry in timeline] == [float(packet.time) for packet in rdpcap(captures["us.pcap"])
+                                                          if packet.haslayer("IP")]
+
+
+@pytest.mark.parametrize("bucket_seconds", (0.05, 1.0))
+def test_buckets_count_packets_bytes_and_actions(timeline, bucket_seconds):
+    result = build_time_series(timeline, bucket_seconds)
+    assert result["bucket_seconds"] == bucket_seconds
+    assert result["start"] == result["timestamps"][0]
+    timestamps = result["timestamps"]
+    _assert_series(result, timestamps, timeline, bucket_seconds)
+    for lane, series in result["by_lane"].items():
+        _assert_series(series, timestamps, timeline, bucket_seconds, ("lane", lane))
+    for protocol, series in result["by_protocol"].items():
+        _assert_series(series, timestamps, timeline, bucket_seconds, ("protocol", protocol))
+    assert set(result["by_protocol"]) == {entry["protocol"] for entry in timeline}
+
+
+def test_buckets_widen_past_max_buckets(timeline, monkeypatch):
+    monkeypatch.setattr(post_attack_analysis, "MAX_BUCKETS", 10)
+    result = build_time_series(timeline, 0.01)
+
+    assert len(result["timestamps"]) <= 10
+    width = result["bucket_seconds"]
+    assert width > 0.01 and math.isclose(width / 0.01, round(width / 0.01))
+    _assert_series(result, result["timestamps"], timeline, width)
+
+
+@pytest.mark.parametrize("max_buckets", (10, post_attack_analysis.MAX_BUCKETS))
+def test_merged_series_equal_one_pass(timeline, monkeypatch, max_buckets):
+    monkeypatch.setattr(post_attack_analysis, "MAX_BUCKETS", max_buckets)
+    # Later chunks first, so merging extends the series on both sides; with
+    # 10 buckets the chunks pick different widths of their own
+    merged = _TimeSeries(0.01)
+    for start in reversed(range(0, len(timeline), 97)):
+        part = _TimeSeries(0.01)
+        part.update(timeline[start:start + 97])
+        merged.merge(part)
+
+    assert merged.result() == build_time_series(timeline, 0.01)
+    with pytest.raises(ValueError):
+        merged.merge(_TimeSeries(0.02))
+
+
+def test_empty_and_invalid_series(timeline):
+    empty = build_time_series([], 2.0)
+    assert empty["timestamps"] == [] and empty["start"] is None and empty["bucket_seconds"] == 2.0
+    with pytest.raises(ValueError):
+        _TimeSeries(0)
+
+
+# =========================
+# API
+# =========================
+
+def test_report_time_series_follows_bucket_seconds(api, captures):
+    with open(captures["us.pcap"], "rb") as f:
+        body = f.read()
+    response = api.post("/analyze/pcap", files={"file": ("us.pcap", body)}, data={"bucket_seconds": "0.5"})
+    series = response.json()["report"]["time_series"]
+    assert series["bucket_seconds"] == 0.5
+    assert sum(series["packets"]) == response.json()["simulation"]["summary"]["total_packets"]
+
+    response = api.post("/analyze/pcap", files={"file": ("us.pcap", body)}, data={"bucket_seconds": "0"})
+    assert response.status_code == 400